@@ -15,6 +15,8 @@ import asyncio
 import os
 from dotenv import load_dotenv
 
+from context_packer import ContextPacker, get_token_counter
+
 #-----------------------------------------------------------------------
 #Configure the MCP Server Connection
 #-----------------------------------------------------------------------
@@ -65,6 +67,26 @@ model = ChatOpenAI(
 #    api_key="sk-..."
 #)
 
+#-----------------------------------------------------------------------
+#Setup the client side retrieval step
+#Only the chunks most relevant to the query are sent to the model,
+#up to COC_CONTEXT_TOKEN_BUDGET tokens, instead of the whole document.
+#Chunk embeddings are cached in chapter2/.coc_cache
+#-----------------------------------------------------------------------
+EMBEDDING_MODEL_NAME = "sentence-transformers/all-MiniLM-L6-v2"
+CONTEXT_TOKEN_BUDGET = int(os.getenv("COC_CONTEXT_TOKEN_BUDGET", "1000"))
+
+def create_context_packer():
+    from langchain_huggingface import HuggingFaceEmbeddings
+
+    return ContextPacker(
+        HuggingFaceEmbeddings(model_name=EMBEDDING_MODEL_NAME),
+        EMBEDDING_MODEL_NAME,
+        cache_dir=os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                               ".coc_cache"),
+        count_tokens=get_token_counter("gpt-4.1"),
+    )
+
 #-----------------------------------------------------------------------
 #Asynchronous function to fetch content from MCP resource
 #Boilerplate code to run MCP and fetch resources
@@ -101,13 +123,24 @@ if __name__ == "__main__":
     retrieved_content = asyncio.run(fetch_resource_content())
     print("\nContent retrieved: ", retrieved_content)
 
+    #Split and embed the document once (cached across runs)
+    context_packer = create_context_packer()
+    context_packer.index(retrieved_content)
+
     #Simulated User query
     user_query = "What are the data privacy policies of the company?"
     print("\nUser query: ", user_query)
 
+    #Pack only the most relevant chunks into the token budget
+    context, stats = context_packer.pack(user_query, CONTEXT_TOKEN_BUDGET)
+    print(f"\nContext: {stats['chunks_used']}/{stats['chunks_total']} chunks, "
+          f"{stats['context_tokens']} of {stats['document_tokens']} tokens "
+          f"(saved {stats['saved_tokens']} prompt tokens, "
+          f"{stats['saved_percent']}%)")
+
     #Use the retrieved content to answer the user query
     prompt = f"""Answer the query based on the following context provided.\n
-                Context: {retrieved_content} \n
+                Context: {context} \n
                 query: {user_query}
                 """
     #Invoke the model with the prompt
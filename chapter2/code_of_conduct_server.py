@@ -7,7 +7,8 @@ import os
 from dotenv import load_dotenv
 # https://gofastmcp.com/
 from fastmcp import FastMCP
-import PyPDF2
+
+from pdf_ingestion import CachedPdfPages
 
 #-----------------------------------------------------------------------
 #Setup the MCP Server
@@ -22,6 +23,10 @@ pdf_filename = "code_of_conduct.pdf"
 pdf_full_path = os.path.abspath(os.path.join(os.path.dirname(__file__), pdf_filename))
 pdf_uri = f"file:///{pdf_full_path.replace(os.sep, '/')}"
 
+#Extracted page texts are cached and only re-extracted when the PDF
+#content changes (keyed on the file's mtime and content hash)
+coc_pages = CachedPdfPages(pdf_full_path)
+
 #Decorator to register the resource with the MCP server
 @hr_coc_mcp.resource(
     uri=pdf_uri,
@@ -33,13 +38,35 @@ pdf_uri = f"file:///{pdf_full_path.replace(os.sep, '/')}"
 def get_code_of_conduct() -> str:
     """Returns the text content of the code of conduct PDF file."""
 
-    #Open the file and read its contents
-    with open(pdf_full_path, "rb") as code_of_conduct:
-        reader = PyPDF2.PdfReader(code_of_conduct)
-        text = ""
-        for page in reader.pages:
-            text += page.extract_text() or ""
-        return text
+    #Join the cached page texts
+    return coc_pages.text()
+
+#Resource templates so clients can fetch only the pages they need.
+#Pages are numbered from 1, and ranges include both ends.
+@hr_coc_mcp.resource(
+    uri="coc://page/{n}",
+    name="Code of Conduct page",
+    description="Provides one page of the code of conduct",
+    mime_type="text/plain",
+)
+def get_code_of_conduct_page(n: int) -> str:
+    """Returns the text of page n of the code of conduct PDF file."""
+    return get_code_of_conduct_range(n, n)
+
+@hr_coc_mcp.resource(
+    uri="coc://range/{start}-{end}",
+    name="Code of Conduct page range",
+    description="Provides pages start to end of the code of conduct",
+    mime_type="text/plain",
+)
+def get_code_of_conduct_range(start: int, end: int) -> str:
+    """Returns the text of pages start to end of the code of conduct PDF file."""
+    start, end = int(start), int(end)
+    page_count = len(coc_pages.pages())
+    if not 1 <= start <= end <= page_count:
+        raise ValueError(
+            f"Invalid page range {start}-{end}, the document has {page_count} pages")
+    return coc_pages.text(start - 1, end)
 
 #Code to test the server standalone
 #print(get_code_of_conduct())
@@ -0,0 +1,117 @@
+#-----------------------------------------------------------------------
+# Client side retrieval step for the code of conduct client.
+#
+# Instead of putting the whole document into every prompt, the resource
+# text is split into chunks once, the chunk embeddings are cached on
+# disk, and for each query only the most relevant chunks are packed
+# into the prompt, up to a token budget.
+#-----------------------------------------------------------------------
+
+import hashlib
+import json
+import os
+
+import numpy as np
+
+
+def get_token_counter(model_name="gpt-4.1"):
+    """Returns a function that counts tokens the way the LLM does, or
+    an estimate of ~4 characters per token if tiktoken is not installed."""
+    try:
+        import tiktoken
+    except ImportError:
+        return lambda text: (len(text) + 3) // 4
+
+    try:
+        encoding = tiktoken.encoding_for_model(model_name)
+    except KeyError:
+        # Models newer than the installed tiktoken use the gpt-4o encoding
+        encoding = tiktoken.get_encoding("o200k_base")
+    return lambda text: len(encoding.encode(text))
+
+
+class ContextPacker:
+    """Chunks a document, caches the chunk embeddings and packs the
+    chunks most relevant to a query into a token budget."""
+
+    def __init__(self, embedding_model, embedding_model_name, cache_dir,
+                 count_tokens, chunk_size=800, chunk_overlap=100):
+        self.embedding_model = embedding_model
+        self.embedding_model_name = embedding_model_name
+        self.cache_dir = cache_dir
+        self.count_tokens = count_tokens
+        self.chunk_size = chunk_size
+        self.chunk_overlap = chunk_overlap
+        self.document_tokens = 0
+        self.chunks = []
+        self.chunk_tokens = []
+        self.embeddings = None
+
+    def _cache_key(self, text):
+        key = json.dumps([self.embedding_model_name, self.chunk_size,
+                          self.chunk_overlap,
+                          hashlib.sha256(text.encode()).hexdigest()])
+        return hashlib.sha256(key.encode()).hexdigest()[:32]
+
+    def index(self, text):
+        """Splits and embeds the document, reusing cached embeddings
+        if this exact text was indexed before with the same settings."""
+        cache_path = os.path.join(self.cache_dir, self._cache_key(text))
+        try:
+            with open(cache_path + ".json") as chunks_file:
+                self.chunks = json.load(chunks_file)
+            self.embeddings = np.load(cache_path + ".npy")
+            print("Loaded cached chunk embeddings")
+        except (OSError, ValueError):
+            from langchain_text_splitters import RecursiveCharacterTextSplitter
+
+            splitter = RecursiveCharacterTextSplitter(
+                chunk_size=self.chunk_size, chunk_overlap=self.chunk_overlap)
+            self.chunks = splitter.split_text(text)
+            vectors = np.asarray(
+                self.embedding_model.embed_documents(self.chunks),
+                dtype=np.float32).reshape(len(self.chunks), -1)
+            norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+            norms[norms == 0] = 1.0
+            self.embeddings = vectors / norms
+
+            os.makedirs(self.cache_dir, exist_ok=True)
+            np.save(cache_path + ".npy", self.embeddings)
+            with open(cache_path + ".json", "w") as chunks_file:
+                json.dump(self.chunks, chunks_file)
+            print(f"Embedded and cached {len(self.chunks)} chunks")
+
+        self.document_tokens = self.count_tokens(text)
+        self.chunk_tokens = [self.count_tokens(chunk) for chunk in self.chunks]
+
+    def pack(self, query, token_budget):
+        """Returns (context, stats) with the most relevant chunks that fit
+        in token_budget, kept in document order so the context reads
+        naturally. stats reports the prompt tokens saved versus sending
+        the whole document."""
+        query_vector = np.asarray(self.embedding_model.embed_query(query),
+                                  dtype=np.float32)
+        query_vector /= np.linalg.norm(query_vector) or 1.0
+        ranking = np.argsort(-(self.embeddings @ query_vector))
+
+        selected = []
+        used_tokens = 0
+        for chunk_id in ranking:
+            tokens = self.chunk_tokens[chunk_id]
+            if used_tokens + tokens <= token_budget:
+                selected.append(int(chunk_id))
+                used_tokens += tokens
+
+        context = "\n...\n".join(self.chunks[i] for i in sorted(selected))
+        context_tokens = self.count_tokens(context)
+        saved_tokens = self.document_tokens - context_tokens
+        stats = {
+            "document_tokens": self.document_tokens,
+            "context_tokens": context_tokens,
+            "saved_tokens": saved_tokens,
+            "saved_percent": round(100.0 * saved_tokens / self.document_tokens, 1)
+            if self.document_tokens else 0.0,
+            "chunks_used": len(selected),
+            "chunks_total": len(self.chunks),
+        }
+        return context, stats
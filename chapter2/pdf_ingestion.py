@@ -0,0 +1,232 @@
+#-----------------------------------------------------------------------
+# Shared PDF ingestion stage for the code of conduct and HR policy
+# servers.
+#
+# Page text extraction and chunking are fanned out over a process pool
+# (text extraction is CPU bound, so threads would not help), and the
+# chunks are streamed back in batches so the caller can embed one batch
+# while the workers are still extracting the next ones.
+#
+# The workers are always started with "spawn", the default on macOS,
+# Windows and newer Pythons: a forked worker would inherit whatever the
+# caller has loaded (e.g. torch and its threads). Spawned workers import
+# the caller's main script again, so a server that ingests PDFs must do
+# so from its if __name__ == "__main__" block, not at import time.
+#
+# Chunks are split per page with the same RecursiveCharacterTextSplitter
+# defaults that PyPDFLoader.load_and_split() uses.
+#-----------------------------------------------------------------------
+
+import hashlib
+import multiprocessing
+import os
+import sys
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+from pypdf import PdfReader
+
+
+def file_sha256(path, block_size=1 << 20):
+    """Returns the hex sha256 digest of a file's content."""
+    digest = hashlib.sha256()
+    with open(path, "rb") as source_file:
+        for block in iter(lambda: source_file.read(block_size), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+class IngestionStats:
+    """Throughput counters for one ingestion run."""
+
+    def __init__(self):
+        self.files = 0
+        self.pages = 0
+        self.chunks = 0
+        self.started = time.perf_counter()
+        self.finished = None
+
+    @property
+    def elapsed(self):
+        return (self.finished or time.perf_counter()) - self.started
+
+    @property
+    def pages_per_sec(self):
+        return self.pages / self.elapsed if self.elapsed else 0.0
+
+    @property
+    def chunks_per_sec(self):
+        return self.chunks / self.elapsed if self.elapsed else 0.0
+
+    def report(self):
+        return (f"Ingested {self.files} files, {self.pages} pages, "
+                f"{self.chunks} chunks in {self.elapsed:.2f}s "
+                f"({self.pages_per_sec:.1f} pages/sec, "
+                f"{self.chunks_per_sec:.1f} chunks/sec)")
+
+
+#-----------------------------------------------------------------------
+# Worker functions (module level so the process pool can pickle them)
+#-----------------------------------------------------------------------
+def count_pages(pdf_path):
+    return len(PdfReader(pdf_path).pages)
+
+
+def extract_pages(pdf_path, start, end):
+    """Returns [(page number, text)] for pages start..end-1."""
+    reader = PdfReader(pdf_path)
+    return [(page_number, reader.pages[page_number].extract_text() or "")
+            for page_number in range(start, end)]
+
+
+def extract_and_split_pages(pdf_path, start, end, total_pages):
+    """Extracts pages start..end-1 and splits each page into chunks."""
+    from langchain_text_splitters import RecursiveCharacterTextSplitter
+
+    splitter = RecursiveCharacterTextSplitter()
+    chunks = []
+    for page_number, text in extract_pages(pdf_path, start, end):
+        metadata = {"source": pdf_path, "page": page_number,
+                    "total_pages": total_pages}
+        chunks.extend({"page_content": chunk, "metadata": metadata}
+                      for chunk in splitter.split_text(text))
+    return end - start, chunks
+
+
+def _page_ranges(total_pages, pages_per_task):
+    for start in range(0, total_pages, pages_per_task):
+        yield start, min(start + pages_per_task, total_pages)
+
+
+def _process_pool(workers):
+    return ProcessPoolExecutor(max_workers=workers,
+                               mp_context=multiprocessing.get_context("spawn"))
+
+
+def _split_inline(pdf_paths, pages_per_task, stats):
+    for pdf_path in pdf_paths:
+        total_pages = count_pages(pdf_path)
+        stats.files += 1
+        for start, end in _page_ranges(total_pages, pages_per_task):
+            yield extract_and_split_pages(pdf_path, start, end, total_pages)
+
+
+def _split_in_pool(pdf_paths, workers, pages_per_task, stats):
+    with _process_pool(workers) as pool:
+        # Count pages in the pool too, so opening thousands of files is
+        # not a serial step before the real work starts.
+        page_counts = pool.map(count_pages, pdf_paths,
+                               chunksize=max(1, len(pdf_paths) // 64))
+        futures = []
+        for pdf_path, total_pages in zip(pdf_paths, page_counts):
+            stats.files += 1
+            futures.extend(
+                pool.submit(extract_and_split_pages, pdf_path, start, end,
+                            total_pages)
+                for start, end in _page_ranges(total_pages, pages_per_task))
+
+        for future in as_completed(futures):
+            yield future.result()
+
+
+#-----------------------------------------------------------------------
+# Public API
+#-----------------------------------------------------------------------
+def extract_page_texts(pdf_path, workers=None, pages_per_task=16):
+    """Returns the text of every page of one PDF, in page order.
+
+    Small documents are extracted inline; only documents with more than
+    pages_per_task pages are spread over a process pool."""
+    total_pages = count_pages(pdf_path)
+    if total_pages <= pages_per_task or workers == 1:
+        return [text for _, text in extract_pages(pdf_path, 0, total_pages)]
+
+    page_texts = [""] * total_pages
+    with _process_pool(workers) as pool:
+        futures = [pool.submit(extract_pages, pdf_path, start, end)
+                   for start, end in _page_ranges(total_pages, pages_per_task)]
+        for future in as_completed(futures):
+            for page_number, text in future.result():
+                page_texts[page_number] = text
+    return page_texts
+
+
+def ingest_pdfs(pdf_paths, workers=None, pages_per_task=16, batch_size=64,
+                stats=None):
+    """Extracts and chunks many PDFs in parallel, yielding chunk batches.
+
+    Each chunk is {"page_content": str, "metadata": {"source", "page",
+    "total_pages"}}. Batches are yielded as soon as batch_size chunks are
+    ready, in completion order (not document order). A single file (or
+    workers=1) is processed in this process, as starting the workers
+    would cost more than it saves. Pass an IngestionStats to read
+    pages/sec and chunks/sec afterwards."""
+    stats = stats if stats is not None else IngestionStats()
+    pdf_paths = list(pdf_paths)
+    if not pdf_paths:
+        stats.finished = time.perf_counter()
+        return
+
+    if len(pdf_paths) == 1 or workers == 1:
+        results = _split_inline(pdf_paths, pages_per_task, stats)
+    else:
+        results = _split_in_pool(pdf_paths, workers, pages_per_task, stats)
+
+    batch = []
+    for page_count, chunks in results:
+        stats.pages += page_count
+        stats.chunks += len(chunks)
+        batch.extend(chunks)
+        while len(batch) >= batch_size:
+            yield batch[:batch_size]
+            batch = batch[batch_size:]
+
+    if batch:
+        yield batch
+    stats.finished = time.perf_counter()
+    print(stats.report(), file=sys.stderr)
+
+
+class CachedPdfPages:
+    """Page texts of one PDF, extracted once and reused until it changes.
+
+    The cache is keyed on the file's mtime/size and its content hash: a
+    new mtime only costs a hash, and the pages are only re-extracted when
+    the content actually changed."""
+
+    def __init__(self, pdf_path):
+        self.pdf_path = pdf_path
+        self._stat_key = None
+        self._sha256 = None
+        self._pages = None
+        self._lock = threading.Lock()
+
+    def pages(self):
+        stat = os.stat(self.pdf_path)
+        stat_key = (stat.st_mtime_ns, stat.st_size)
+        with self._lock:
+            if stat_key != self._stat_key:
+                sha256 = file_sha256(self.pdf_path)
+                if sha256 != self._sha256:
+                    self._pages = extract_page_texts(self.pdf_path)
+                    self._sha256 = sha256
+                self._stat_key = stat_key
+            return self._pages
+
+    def text(self, start=0, end=None):
+        """Joined text of pages start..end-1 (0-based)."""
+        return "".join(self.pages()[start:end])
+
+
+if __name__ == "__main__":
+    # Usage: python chapter2/pdf_ingestion.py <pdf or directory> ...
+    paths = []
+    for arg in sys.argv[1:] or [os.path.dirname(os.path.abspath(__file__))]:
+        if os.path.isdir(arg):
+            paths.extend(os.path.join(arg, name) for name in sorted(os.listdir(arg))
+                         if name.lower().endswith(".pdf"))
+        else:
+            paths.append(arg)
+    for _ in ingest_pdfs(paths):
+        pass
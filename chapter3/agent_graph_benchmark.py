@@ -0,0 +1,98 @@
+import argparse
+import contextlib
+import os
+import time
+
+from langchain_core.tools import StructuredTool
+
+# -----------------------------------------------------------------------
+# Per-request agent graph construction overhead.
+#
+# Compares building the ReAct agent graph on every request
+# (create_react_agent(model, tools), what run_hr_policy_agent and
+# run_timeoff_agent used to do) with getting it from an AgentGraphCache.
+# The model is the HR policy agent's (including the StateGraph.add_node
+# patch applied by hr_policy_agent.py) and is never invoked, so no API
+# calls are made. The tools are stand-ins with the signatures of the
+# timeoff server tools.
+#
+# Usage: python chapter3/agent_graph_benchmark.py --requests 200
+# -----------------------------------------------------------------------
+
+# The model is created at import time and needs a key, but is not called
+os.environ.setdefault("OPENAI_API_KEY", "sk-benchmark")
+
+with open(os.devnull, "w") as devnull, contextlib.redirect_stdout(devnull):
+    from hr_policy_agent import model
+from agent_graph_cache import AgentGraphCache
+from langgraph.prebuilt import create_react_agent
+
+
+async def get_timeoff_balance(employee_name: str, as_of_day: str = "") -> str:
+    """Get the timeoff balance for the employee, given their name."""
+
+
+async def request_timeoff(employee_name: str, start_day: str, days: int) -> str:
+    """File a timeoff request for the employee."""
+
+
+async def get_timeoff_history(employee_name: str, start_day: str = "",
+                              end_day: str = "", cursor: str = "",
+                              limit: int = 20) -> str:
+    """Get the timeoff requests filed by the employee."""
+
+
+async def get_balance_ledger(employee_name: str, cursor: str = "",
+                             limit: int = 20) -> str:
+    """Get the changes to the employee's timeoff balance."""
+
+
+async def list_timeoff_in_range(start_day: str, end_day: str,
+                                cursor: str = "", limit: int = 50) -> str:
+    """List the timeoff requests of all employees in a date range."""
+
+
+async def check_coverage(start_day: str, end_day: str, department: str = "",
+                         employee_name: str = "") -> str:
+    """Find who is out in a date range."""
+
+
+async def import_timeoff_requests(csv_data: str) -> str:
+    """Import timeoff requests from CSV."""
+
+
+def make_tools():
+    return [StructuredTool.from_function(coroutine=function)
+            for function in (get_timeoff_balance, request_timeoff,
+                             get_timeoff_history, get_balance_ledger,
+                             list_timeoff_in_range, check_coverage,
+                             import_timeoff_requests)]
+
+
+def time_per_request(get_graph, requests):
+    start = time.perf_counter()
+    for _ in range(requests):
+        get_graph()
+    return (time.perf_counter() - start) * 1000 / requests
+
+
+def run(requests):
+    tools = make_tools()
+    create_react_agent(model, tools)  # warm up imports
+
+    uncached_ms = time_per_request(
+        lambda: create_react_agent(model, tools), requests)
+    cache = AgentGraphCache(model)
+    cached_ms = time_per_request(lambda: cache.get(tools), requests)
+
+    print(f"{len(tools)} tools, {requests} requests")
+    print(f"create_react_agent per request: {uncached_ms:10.3f} ms/request")
+    print(f"AgentGraphCache               : {cached_ms:10.3f} ms/request "
+          f"({cache.builds} build)")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--requests", type=int, default=200)
+    args = parser.parse_args()
+    run(args.requests)
@@ -0,0 +1,32 @@
+from langgraph.prebuilt import create_react_agent
+
+# -----------------------------------------------------------------------
+# Cache of the compiled ReAct agent graph of an agent.
+#
+# create_react_agent builds and compiles a LangGraph StateGraph, which
+# takes milliseconds, although the model and the tools are the same for
+# every request. The graph holds no per-request state (the prompt is
+# passed to ainvoke), so it is built once per tool set and reused by
+# every request, including concurrent ones.
+#
+# The tools must not be bound to one MCP session: use the get_tools() of
+# an MCPSessionHolder (chapter4) or a PooledToolSession. Both return the
+# same list until the tool set changes, so a new list means a new graph.
+# -----------------------------------------------------------------------
+
+
+class AgentGraphCache:
+    """Compiled create_react_agent graph for the current tool list."""
+
+    def __init__(self, model):
+        self.model = model
+        self.builds = 0
+        self._tools = None
+        self._graph = None
+
+    def get(self, tools):
+        if tools is not self._tools:
+            self._graph = create_react_agent(self.model, tools)
+            self._tools = tools
+            self.builds += 1
+        return self._graph
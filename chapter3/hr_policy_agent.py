@@ -1,15 +1,15 @@
-from mcp import ClientSession, StdioServerParameters
-from mcp.client.stdio import stdio_client
+from mcp import StdioServerParameters
 
-from langchain_mcp_adapters.tools import load_mcp_tools
 from langchain_mcp_adapters.prompts import load_mcp_prompt
-from langgraph.prebuilt import create_react_agent
 from langchain_openai import ChatOpenAI # previously was: from langchain_openai import AzureChatOpenAI
 
 import asyncio
 import os
 from dotenv import load_dotenv
 
+from agent_graph_cache import AgentGraphCache
+from mcp_session_pool import MCPSessionPool, PooledToolSession
+
 # -----------------------------------------------------------------------
 # Setup the LLM for the HR Policy Agent
 # This uses the Azure OpenAI service with a specific deployment
@@ -59,6 +59,33 @@ except Exception as _e:
     # If patching fails, continue and let the original error surface later.
     print('Could not patch StateGraph.add_node:', _e)
 
+# -----------------------------------------------------------------------
+# Process wide pool of warm sessions to the HR policy MCP server.
+# Each question borrows an already initialized session, so its latency
+# only covers the tool call and the LLM, not starting the server.
+# -----------------------------------------------------------------------
+
+# Make sure the right path to the server file is passed.
+hr_mcp_server_path = os.path.abspath(
+    os.path.join(os.path.dirname(__file__),
+                 "hr_policy_server.py"))
+print("HR MCP server path: ", hr_mcp_server_path)
+
+# Create the server parameters for the MCP server
+server_params = StdioServerParameters(
+    command="python",
+    args=[hr_mcp_server_path],
+)
+
+hr_policy_session_pool = MCPSessionPool(
+    server_params,
+    max_size=int(os.getenv("HR_POLICY_POOL_SIZE", "4")))
+
+# The tools borrow a pooled session for each call, so they and the agent
+# graph compiled from them are built once and reused by every question.
+hr_policy_tool_session = PooledToolSession(hr_policy_session_pool)
+hr_policy_agents = AgentGraphCache(model)
+
 # -----------------------------------------------------------------------
 # Define the HR policy agent that will use the MCP server
 # to answer queries about HR policies.
@@ -67,48 +94,36 @@ except Exception as _e:
 
 async def run_hr_policy_agent(prompt: str) -> str:
 
-    # Make sure the right path to the server file is passed.
-    hr_mcp_server_path = os.path.abspath(
-        os.path.join(os.path.dirname(__file__),
-                     "hr_policy_server.py"))
-    print("HR MCP server path: ", hr_mcp_server_path)
+    # Every MCP call below borrows a session from the pool
+    print("\nloading tools & prompt")
+    hr_policy_tools = await hr_policy_tool_session.get_tools()
+    hr_policy_prompt = await load_mcp_prompt(hr_policy_tool_session,
+                                             "get_llm_prompt",
+                                             arguments={"query": prompt})
 
-    # Create the server parameters for the MCP server
-    server_params = StdioServerParameters(
-        command="python",
-        args=[hr_mcp_server_path],
-    )
+    print("\nTools loaded :", hr_policy_tools[0].name)
+    print("\nPrompt loaded :", hr_policy_prompt)
 
-    # Create a client session to connect to the MCP server
-    async with stdio_client(server_params) as (read, write):
-        async with ClientSession(read, write) as session:
-            print("initializing session")
-            await session.initialize()
+    agent = hr_policy_agents.get(hr_policy_tools)
 
-            print("\nloading tools & prompt")
-            hr_policy_tools = await load_mcp_tools(session)
-            hr_policy_prompt = await load_mcp_prompt(session,
-                                                     "get_llm_prompt",
-                                                     arguments={"query": prompt})
+    print("\nAnswering prompt : ", prompt)
+    agent_response = await agent.ainvoke(
+        {"messages": hr_policy_prompt})
 
-            print("\nTools loaded :", hr_policy_tools[0].name)
-            print("\nPrompt loaded :", hr_policy_prompt)
+    return agent_response["messages"][-1].content
 
-            print("\nCreating agent")
-            agent = create_react_agent(model, hr_policy_tools)
 
-            print("\nAnswering prompt : ", prompt)
-            agent_response = await agent.ainvoke(
-                {"messages": hr_policy_prompt})
-
-            return agent_response["messages"][-1].content
-
-    return "Error"
+async def main():
+    try:
+        # Run the HR policy agent with sample queries; the second one
+        # reuses the warm session started for the first.
+        for query in ["What is the policy on remote work?",
+                      "What is the policy on sick leave?"]:
+            response = await run_hr_policy_agent(query)
+            print("\nResponse: ", response)
+    finally:
+        await hr_policy_session_pool.close()
 
 if __name__ == "__main__":
-    # Run the HR policy agent with a sample query
     print("\nRunning HR Policy Agent...")
-    response = asyncio.run(
-        run_hr_policy_agent("What is the policy on remote work?"))
-
-    print("\nResponse: ", response)
+    asyncio.run(main())
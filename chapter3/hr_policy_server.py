@@ -1,10 +1,12 @@
 import os
+import json
 from dotenv import load_dotenv
 from fastmcp import FastMCP
 
-from langchain_core.vectorstores import InMemoryVectorStore
-from langchain_community.document_loaders import PyPDFLoader
-from langchain_huggingface import HuggingFaceEmbeddings
+from policy_watcher import PolicyIndexManager
+from policy_ann import load_or_train_search_backend
+from policy_bm25 import load_or_build_keyword_index
+from policy_query_cache import QueryCache
 
 # -----------------------------------------------------------------------
 # Setup the MCP Server
@@ -14,24 +16,98 @@ hr_policies_mcp = FastMCP("HR-Policies-MCP-Server")
 
 # -----------------------------------------------------------------------
 # Setup the Vector Store for use in retrieving policies
-# This will use the hr_policy_document.pdf file as its source
+# This indexes every PDF in the policy directory (by default this
+# folder, which holds hr_policy_document.pdf)
+#
+# The embeddings are persisted to disk (see policy_index.py), so a
+# restart only memory-maps the saved index instead of re-embedding the
+# PDFs. A watcher re-embeds only the PDFs that were added or changed and
+# swaps the new index in while queries keep being served.
 # -----------------------------------------------------------------------
 
-pdf_filename = "hr_policy_document.pdf"
-pdf_full_path = os.path.abspath(os.path.join(
-    os.path.dirname(__file__), pdf_filename))
-
-# Load and split the PDF document
-loader = PyPDFLoader(pdf_full_path)
-policy_documents = loader.load_and_split()
-
-# Create embeddings
-policy_embeddings = HuggingFaceEmbeddings(
-    model_name="sentence-transformers/all-MiniLM-L6-v2")
-
-# Create In memory vector store
-policy_vector_store = InMemoryVectorStore.from_documents(
-    policy_documents, policy_embeddings)
+policy_dir = os.getenv("HR_POLICY_DIR",
+                       os.path.dirname(os.path.abspath(__file__)))
+
+embedding_model_name = "sentence-transformers/all-MiniLM-L6-v2"
+policy_index_dir = os.getenv(
+    "HR_POLICY_INDEX_DIR",
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), ".policy_index"))
+
+# The embedding model is only needed to embed queries (and to build a
+# stale index), so importing this module does not load it. When the
+# server runs it is loaded before serving (see the end of this file), so
+# a warm pooled session does not pay for it on its first query.
+_policy_embeddings = None
+
+
+def get_policy_embeddings():
+    global _policy_embeddings
+    if _policy_embeddings is None:
+        from langchain_huggingface import HuggingFaceEmbeddings
+        _policy_embeddings = HuggingFaceEmbeddings(
+            model_name=embedding_model_name)
+    return _policy_embeddings
+
+
+# Keyword index for hybrid retrieval: exact terms like "FMLA" or
+# "sabbatical" are found by BM25 and fused with the vector ranking.
+# Set HR_POLICY_RETRIEVAL=vector to use embeddings only.
+policy_retrieval_mode = os.getenv("HR_POLICY_RETRIEVAL", "hybrid")
+
+
+def prepare_policy_index(index):
+    # Exact search for small corpora, an approximate IVF index for large
+    # ones. HR_POLICY_IVF_NPROBE trades latency for recall (see policy_ann.py).
+    # HR_POLICY_VECTOR_STORAGE=float16|int8 scans a quantized copy of the
+    # embeddings to save memory, and HR_POLICY_RERANK=N re-scores the top
+    # N candidates exactly (see policy_quantization.py). int8 scans about
+    # as fast as float32; float16 only saves memory and scans ~10x slower.
+    index.search_backend = load_or_train_search_backend(
+        index,
+        index.path,
+        backend=os.getenv("HR_POLICY_SEARCH_BACKEND", "auto"),
+        exact_threshold=int(os.getenv("HR_POLICY_EXACT_THRESHOLD", "20000")),
+        nlist=int(os.getenv("HR_POLICY_IVF_NLIST", "0")) or None,
+        nprobe=int(os.getenv("HR_POLICY_IVF_NPROBE", "8")),
+        storage=os.getenv("HR_POLICY_VECTOR_STORAGE", "float32"),
+        rerank=int(os.getenv("HR_POLICY_RERANK", "0")))
+
+    if policy_retrieval_mode == "hybrid":
+        index.keyword_index = load_or_build_keyword_index(index, index.path)
+
+
+# Poll the policy directory for added, changed or removed PDFs.
+# HR_POLICY_WATCH_INTERVAL=0 disables watching.
+policy_watch_interval = float(os.getenv("HR_POLICY_WATCH_INTERVAL", "30"))
+
+# Set by start_policy_index() when the server runs. The index is not
+# loaded at import time, because the PDF ingestion workers are spawned
+# processes that import this module again (see pdf_ingestion.py).
+policy_index_manager = None
+
+
+def start_policy_index():
+    # Load the persisted index, or build it if the PDFs / model changed
+    global policy_index_manager
+    policy_index_manager = PolicyIndexManager(policy_dir,
+                                              policy_index_dir,
+                                              embedding_model_name,
+                                              get_policy_embeddings,
+                                              prepare_index=prepare_policy_index,
+                                              workers=int(os.getenv(
+                                                  "HR_POLICY_INGEST_WORKERS", "0")) or None)
+    if policy_watch_interval > 0:
+        policy_index_manager.start_watching(policy_watch_interval)
+    return policy_index_manager
+
+
+policy_top_k = int(os.getenv("HR_POLICY_TOP_K", "3"))
+
+# Cache of query embeddings and top-k results for repeated questions.
+# Results are invalidated automatically when the index changes.
+policy_query_cache = QueryCache(
+    max_entries=int(os.getenv("HR_POLICY_CACHE_SIZE", "1024")),
+    ttl_seconds=float(os.getenv("HR_POLICY_CACHE_TTL", "3600")))
 
 # -----------------------------------------------------------------------
 # Setup the MCP tool to query for policies, given a user query string
@@ -44,10 +120,38 @@ def query_policies(query: str):
     leave, timeoff, benefits, work hours, remote work and 
     workplace conduct policies"""
 
-    # Perform a similarity search in the vector store
-    results = policy_vector_store.similarity_search(query, k=3)
+    # Use one index for the whole call, even if a re-index swaps it
+    policy_index = policy_index_manager.index
+    index_fingerprint = policy_index.fingerprint()
+    results = policy_query_cache.get_results(
+        query, policy_top_k, index_fingerprint)
+    if results is not None:
+        return results
+
+    # Perform a hybrid (or plain similarity) search in the policy index
+    results = policy_index.hybrid_search(
+        query,
+        policy_query_cache.wrap(get_policy_embeddings()),
+        k=policy_top_k)
+    policy_query_cache.put_results(
+        query, policy_top_k, index_fingerprint, results)
     return results
 
+# -----------------------------------------------------------------------
+# Setup the MCP resource that exposes the query cache hit/miss counters
+# -----------------------------------------------------------------------
+
+
+@hr_policies_mcp.resource(
+    uri="hr-policies://cache/stats",
+    name="Policy query cache stats",
+    description="Hit/miss counters of the query_policies cache",
+    mime_type="application/json",
+)
+def get_query_cache_stats() -> str:
+    """Returns the query embedding and result cache counters."""
+    return json.dumps(policy_query_cache.stats())
+
 # -----------------------------------------------------------------------
 # Setup the MCP prompt to dynamically generate the prompt for the LLM
 # using the input query.
@@ -70,8 +174,13 @@ def get_llm_prompt(query: str) -> str:
 # -----------------------------------------------------------------------
 
 # test *** commnet remove @hr_policies_mcp.tool() decorator to run this test ***
+#start_policy_index()
 #print("Test Query Result:")
 #print(query_policies("What is the policy on remote work?"))
 
 if __name__ == "__main__":
+    start_policy_index()
+    # The session is initialized only once the model is loaded, so the
+    # first query of a warm pooled session is as fast as the next ones
+    get_policy_embeddings().embed_query("warm up")
     hr_policies_mcp.run(transport="stdio")
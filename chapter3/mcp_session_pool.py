@@ -0,0 +1,220 @@
+import asyncio
+import time
+from collections import deque
+from contextlib import asynccontextmanager
+
+from mcp import ClientSession
+from mcp.client.stdio import stdio_client
+
+from langchain_mcp_adapters.tools import load_mcp_tools
+
+# -----------------------------------------------------------------------
+# Process wide pool of warm, initialized MCP client sessions.
+#
+# Starting a stdio MCP server is expensive (the HR policy server imports
+# langchain and loads its index), so instead of spawning one subprocess
+# per question the agent borrows an already initialized session from
+# this pool and returns it when done.
+# -----------------------------------------------------------------------
+
+
+class PooledSession:
+    """A stdio server subprocess and its initialized ClientSession.
+
+    stdio_client and ClientSession are anyio context managers that must be
+    entered and exited in the same task, so each pooled session is owned by
+    a background task that opens them, waits until it is asked to close,
+    and then tears them down."""
+
+    def __init__(self, server_params):
+        self.server_params = server_params
+        self.session = None
+        self.last_used = time.monotonic()
+        self._ready = asyncio.Event()
+        self._closing = asyncio.Event()
+        self._error = None
+        self._task = None
+
+    async def start(self):
+        self._task = asyncio.create_task(self._run())
+        await self._ready.wait()
+        if self._error is not None:
+            raise self._error
+
+    async def _run(self):
+        try:
+            async with stdio_client(self.server_params) as (read, write):
+                async with ClientSession(read, write) as session:
+                    await session.initialize()
+                    self.session = session
+                    self._ready.set()
+                    await self._closing.wait()
+        except Exception as e:
+            self._error = e
+        finally:
+            self.session = None
+            self._ready.set()
+
+    @property
+    def alive(self):
+        return self.session is not None and not self._task.done()
+
+    async def is_healthy(self, timeout):
+        """Pings the server; False if the subprocess died or does not answer."""
+        if not self.alive:
+            return False
+        try:
+            await asyncio.wait_for(self.session.send_ping(), timeout)
+            return True
+        except Exception:
+            return False
+
+    async def close(self, timeout=5.0):
+        self._closing.set()
+        if self._task is None:
+            return
+        try:
+            await asyncio.wait_for(asyncio.shield(self._task), timeout)
+        except Exception:
+            self._task.cancel()
+
+
+class MCPSessionPool:
+    """Bounded pool of PooledSession objects for one MCP server.
+
+    - At most max_size sessions exist; borrowers wait when all are in use.
+    - A session idle for longer than health_check_interval is pinged before
+      it is handed out, and replaced if its subprocess has died.
+    - A session whose borrower failed is checked before being put back.
+    - close() shuts down every idle session and any session returned later.
+    """
+
+    def __init__(self, server_params, max_size=4,
+                 health_check_interval=30.0, ping_timeout=5.0):
+        self.server_params = server_params
+        self.max_size = max_size
+        self.health_check_interval = health_check_interval
+        self.ping_timeout = ping_timeout
+        self._idle = deque()
+        self._borrowed = 0
+        self._slots = None
+        self._loop = None
+        self._closed = False
+
+    def _bind_to_running_loop(self):
+        # Sessions belong to the event loop that started them and can
+        # only be closed from it. A pool without sessions can move to a new
+        # loop (e.g. a second asyncio.run); one that still holds sessions
+        # refuses, rather than dropping them and leaking their server
+        # subprocesses.
+        loop = asyncio.get_running_loop()
+        if loop is self._loop:
+            return
+        if self._idle or self._borrowed:
+            raise RuntimeError("MCP session pool is in use by another event "
+                               "loop; close() it on that loop first")
+        self._loop = loop
+        self._slots = asyncio.Semaphore(self.max_size)
+
+    async def _new_session(self):
+        print("Starting pooled MCP session: ", self.server_params.args)
+        pooled = PooledSession(self.server_params)
+        await pooled.start()
+        return pooled
+
+    async def acquire(self):
+        """Borrows a healthy session, starting a new one if none is idle."""
+        if self._closed:
+            raise RuntimeError("MCP session pool is closed")
+        self._bind_to_running_loop()
+        await self._slots.acquire()
+        try:
+            while self._idle:
+                pooled = self._idle.pop()
+                idle_for = time.monotonic() - pooled.last_used
+                if pooled.alive and (idle_for < self.health_check_interval
+                                     or await pooled.is_healthy(self.ping_timeout)):
+                    self._borrowed += 1
+                    return pooled
+                print("Discarding dead pooled MCP session")
+                await pooled.close()
+            pooled = await self._new_session()
+            self._borrowed += 1
+            return pooled
+        except BaseException:
+            self._slots.release()
+            raise
+
+    async def release(self, pooled, check_health=False):
+        """Returns a borrowed session to the pool."""
+        self._borrowed -= 1
+        keep = (not self._closed and pooled.alive
+                and (not check_health
+                     or await pooled.is_healthy(self.ping_timeout)))
+        if keep:
+            pooled.last_used = time.monotonic()
+            self._idle.append(pooled)
+        else:
+            await pooled.close()
+        self._slots.release()
+
+    @asynccontextmanager
+    async def session(self):
+        """async with pool.session() as session: borrows an initialized
+        ClientSession for the duration of the block."""
+        pooled = await self.acquire()
+        try:
+            yield pooled.session
+        except BaseException:
+            # The failure may have been caused by a dead server, so verify
+            # the session before anyone else gets it.
+            await self.release(pooled, check_health=True)
+            raise
+        else:
+            await self.release(pooled)
+
+    async def warm_up(self, count=1):
+        """Starts sessions ahead of the first request."""
+        self._bind_to_running_loop()
+        borrowed = [await self.acquire()
+                    for _ in range(min(count, self.max_size))]
+        for pooled in borrowed:
+            await self.release(pooled)
+
+    async def close(self):
+        """Gracefully shuts down all idle sessions and their subprocesses."""
+        self._closed = True
+        while self._idle:
+            await self._idle.pop().close()
+
+
+class PooledToolSession:
+    """Session stand-in that borrows a pooled session for every call.
+
+    Tools loaded with load_mcp_tools(PooledToolSession(pool)) are not bound
+    to one session, so they (and an agent graph built from them) can be
+    reused across requests, and a session is only held for the duration of
+    a tool call rather than for a whole agent run."""
+
+    def __init__(self, pool):
+        self.pool = pool
+        self._tools = None
+
+    async def list_tools(self, *args, **kwargs):
+        async with self.pool.session() as session:
+            return await session.list_tools(*args, **kwargs)
+
+    async def call_tool(self, *args, **kwargs):
+        async with self.pool.session() as session:
+            return await session.call_tool(*args, **kwargs)
+
+    async def get_prompt(self, *args, **kwargs):
+        async with self.pool.session() as session:
+            return await session.get_prompt(*args, **kwargs)
+
+    async def get_tools(self):
+        """The server's tools as LangChain tools, loaded once (the tools
+        of a stdio server do not change while it runs)."""
+        if self._tools is None:
+            self._tools = await load_mcp_tools(self)
+        return self._tools
@@ -0,0 +1,208 @@
+import os
+import sys
+
+import numpy as np
+
+from policy_quantization import RerankedSearch, load_or_quantize
+
+# -----------------------------------------------------------------------
+# Search backends for the policy index.
+#
+# ExactSearch scans every chunk embedding (what InMemoryVectorStore
+# does). IVFFlatIndex is an approximate nearest-neighbour index: the
+# embeddings are clustered into nlist lists with k-means, and a query
+# only scans the nprobe lists whose centroids are closest to it. Raising
+# nprobe trades latency for recall.
+#
+# Both expect unit-length rows and a unit-length query vector, so the
+# dot product is the cosine similarity.
+# -----------------------------------------------------------------------
+
+IVF_FILE = "ivf.npz"
+
+# Below this many chunks a full scan is fast enough and always exact
+DEFAULT_EXACT_THRESHOLD = 20000
+DEFAULT_NPROBE = 8
+
+
+def _top_k(scores, k):
+    k = min(k, scores.shape[0])
+    if k == 0:
+        return np.empty(0, dtype=np.int64)
+    top = np.argpartition(-scores, k - 1)[:k]
+    return top[np.argsort(-scores[top])]
+
+
+class ExactSearch:
+    """Brute force scan over every embedding."""
+
+    name = "exact"
+
+    def __init__(self, embeddings):
+        self.embeddings = embeddings
+
+    def search(self, query_vector, k):
+        scores = self.embeddings @ query_vector
+        top = _top_k(scores, k)
+        return top, scores[top]
+
+
+def _assign_to_centroids(vectors, centroids, batch_size=8192):
+    assignments = np.empty(vectors.shape[0], dtype=np.int64)
+    for start in range(0, vectors.shape[0], batch_size):
+        batch = np.asarray(vectors[start:start + batch_size])
+        assignments[start:start + batch_size] = np.argmax(
+            batch @ centroids.T, axis=1)
+    return assignments
+
+
+def _spherical_kmeans(vectors, nlist, iterations, rng):
+    centroids = np.array(
+        vectors[np.sort(rng.choice(vectors.shape[0], nlist, replace=False))],
+        dtype=np.float32)
+    for _ in range(iterations):
+        assignments = _assign_to_centroids(vectors, centroids)
+        counts = np.bincount(assignments, minlength=nlist)
+        order = np.argsort(assignments, kind="stable")
+        starts = np.concatenate(([0], np.cumsum(counts)[:-1]))
+        sums = np.zeros_like(centroids)
+        non_empty = counts > 0
+        sums[non_empty] = np.add.reduceat(
+            np.asarray(vectors)[order], starts[non_empty], axis=0)
+        # Re-seed empty lists with random vectors so no list is wasted
+        empty = np.flatnonzero(~non_empty)
+        if empty.size:
+            sums[empty] = vectors[rng.choice(vectors.shape[0], empty.size)]
+        norms = np.linalg.norm(sums, axis=1, keepdims=True)
+        norms[norms == 0] = 1.0
+        centroids = (sums / norms).astype(np.float32)
+    return centroids
+
+
+class IVFFlatIndex:
+    """Inverted file index with flat (uncompressed) lists.
+
+    The lists are stored CSR style: the chunk ids of list i are
+    list_ids[list_offsets[i]:list_offsets[i + 1]]."""
+
+    name = "ivf"
+
+    def __init__(self, embeddings, centroids, list_offsets, list_ids,
+                 nprobe=DEFAULT_NPROBE):
+        self.embeddings = embeddings
+        self.centroids = centroids
+        self.list_offsets = list_offsets
+        self.list_ids = list_ids
+        self.nprobe = nprobe
+
+    @property
+    def nlist(self):
+        return self.centroids.shape[0]
+
+    @classmethod
+    def train(cls, embeddings, nlist=None, nprobe=DEFAULT_NPROBE,
+              iterations=10, max_training_points=256, seed=0):
+        """Clusters the embeddings and builds the inverted lists.
+
+        nlist defaults to sqrt(number of chunks). k-means runs on a sample
+        of at most max_training_points per list; every chunk is then
+        assigned to its closest centroid."""
+        count = embeddings.shape[0]
+        nlist = min(nlist or max(1, int(np.sqrt(count))), count)
+        rng = np.random.default_rng(seed)
+
+        sample_size = min(count, nlist * max_training_points)
+        sample_ids = np.sort(rng.choice(count, sample_size, replace=False))
+        centroids = _spherical_kmeans(np.asarray(embeddings[sample_ids]),
+                                      nlist, iterations, rng)
+
+        assignments = _assign_to_centroids(embeddings, centroids)
+        list_ids = np.argsort(assignments, kind="stable")
+        list_offsets = np.concatenate(
+            ([0], np.cumsum(np.bincount(assignments, minlength=nlist))))
+        return cls(embeddings, centroids, list_offsets, list_ids, nprobe)
+
+    def search(self, query_vector, k):
+        probe = _top_k(self.centroids @ query_vector,
+                       max(1, min(self.nprobe, self.nlist)))
+        candidates = np.concatenate(
+            [self.list_ids[self.list_offsets[i]:self.list_offsets[i + 1]]
+             for i in probe])
+        if candidates.size == 0:
+            return candidates, np.empty(0, dtype=np.float32)
+        candidates.sort()  # sequential reads from the memory-mapped array
+        scores = self.embeddings[candidates] @ query_vector
+        top = _top_k(scores, k)
+        return candidates[top], scores[top]
+
+    def save(self, path, fingerprint):
+        tmp_path = f"{path}.tmp-{os.getpid()}.npz"
+        np.savez(tmp_path,
+                 centroids=self.centroids,
+                 list_offsets=self.list_offsets,
+                 list_ids=self.list_ids,
+                 fingerprint=np.array(fingerprint))
+        os.replace(tmp_path, path)
+
+    @classmethod
+    def load(cls, path, embeddings, fingerprint, nprobe=DEFAULT_NPROBE):
+        """Returns the saved index, or None if it was built for other data."""
+        if not os.path.exists(path):
+            return None
+        try:
+            with np.load(path, allow_pickle=False) as saved:
+                if str(saved["fingerprint"]) != fingerprint:
+                    return None
+                return cls(embeddings, saved["centroids"],
+                           saved["list_offsets"], saved["list_ids"], nprobe)
+        except (OSError, ValueError, KeyError) as e:
+            print("Could not read IVF index: ", e, file=sys.stderr)
+            return None
+
+
+def load_or_train_search_backend(index, index_dir, backend="auto",
+                                 exact_threshold=DEFAULT_EXACT_THRESHOLD,
+                                 nlist=None, nprobe=DEFAULT_NPROBE,
+                                 storage="float32", rerank=0):
+    """Returns the search backend for a PolicyIndex.
+
+    backend is "exact", "ivf" or "auto" (IVF only once the corpus has at
+    least exact_threshold chunks). A trained IVF index is saved next to
+    the embeddings and reused while they do not change.
+
+    storage "float16" or "int8" scans a quantized copy of the embeddings
+    instead (see policy_quantization.py); with rerank > 0 the top rerank
+    candidates are then re-scored with the exact float32 embeddings."""
+    count = index.embeddings.shape[0]
+    if count == 0:
+        return ExactSearch(index.embeddings)
+    if backend not in ("exact", "ivf", "auto"):
+        raise ValueError(f"Unknown search backend: {backend}")
+
+    vectors = load_or_quantize(index, index_dir, storage)
+    if backend == "exact" or (backend == "auto" and count < exact_threshold):
+        search_backend = ExactSearch(vectors)
+    else:
+        search_backend = _load_or_train_ivf(index, index_dir, nlist, nprobe)
+        search_backend.embeddings = vectors
+
+    if rerank > 0 and vectors is not index.embeddings:
+        search_backend = RerankedSearch(search_backend, index.embeddings, rerank)
+    return search_backend
+
+
+def _load_or_train_ivf(index, index_dir, nlist, nprobe):
+    # The lists are always trained on the float32 embeddings, whatever
+    # the storage the lists are scanned from.
+    ivf_path = os.path.join(index_dir, IVF_FILE)
+    fingerprint = index.fingerprint()
+    ivf = IVFFlatIndex.load(ivf_path, index.embeddings, fingerprint, nprobe)
+    if ivf is not None and (nlist is None or ivf.nlist == nlist):
+        print("Loaded IVF index from ", ivf_path, file=sys.stderr)
+        return ivf
+
+    print(f"Training IVF index over {index.embeddings.shape[0]} chunks",
+          file=sys.stderr)
+    ivf = IVFFlatIndex.train(index.embeddings, nlist=nlist, nprobe=nprobe)
+    ivf.save(ivf_path, fingerprint)
+    return ivf
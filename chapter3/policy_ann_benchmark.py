@@ -0,0 +1,79 @@
+import argparse
+import time
+
+import numpy as np
+
+from policy_ann import ExactSearch, IVFFlatIndex
+
+# -----------------------------------------------------------------------
+# Recall vs latency benchmark for the policy search backends.
+#
+# Uses synthetic, clustered unit vectors with the dimension of
+# all-MiniLM-L6-v2 (384), so it runs without the embedding model.
+# For each corpus size it reports the exact scan latency, the IVF
+# training time, and IVF latency and recall@k for a range of nprobe.
+#
+# Usage: python chapter3/policy_ann_benchmark.py --sizes 10000 100000
+# -----------------------------------------------------------------------
+
+
+def make_corpus(count, dim, rng, topics=500):
+    # Policy chunks cluster around topics, so generate clustered data
+    # rather than uniform noise (which no ANN index can do well on).
+    centers = rng.standard_normal((topics, dim)).astype(np.float32)
+    vectors = centers[rng.integers(0, topics, count)] \
+        + 0.35 * rng.standard_normal((count, dim)).astype(np.float32)
+    return vectors / np.linalg.norm(vectors, axis=1, keepdims=True)
+
+
+def make_queries(corpus, count, rng):
+    picks = corpus[rng.integers(0, corpus.shape[0], count)]
+    queries = picks + 0.2 * rng.standard_normal(picks.shape).astype(np.float32)
+    return queries / np.linalg.norm(queries, axis=1, keepdims=True)
+
+
+def time_queries(backend, queries, k):
+    results = []
+    start = time.perf_counter()
+    for query in queries:
+        ids, _ = backend.search(query, k)
+        results.append(set(ids.tolist()))
+    elapsed_ms = (time.perf_counter() - start) * 1000 / len(queries)
+    return results, elapsed_ms
+
+
+def run(sizes, dim, query_count, k, nprobes, seed):
+    rng = np.random.default_rng(seed)
+    for size in sizes:
+        corpus = make_corpus(size, dim, rng)
+        queries = make_queries(corpus, query_count, rng)
+        print(f"\n--- {size} chunks, dim {dim}, {query_count} queries, k={k}")
+
+        exact_results, exact_ms = time_queries(ExactSearch(corpus), queries, k)
+        print(f"exact scan          : {exact_ms:8.3f} ms/query  recall@{k} 1.000")
+
+        start = time.perf_counter()
+        ivf = IVFFlatIndex.train(corpus)
+        print(f"IVF training        : {time.perf_counter() - start:8.2f} s "
+              f"(nlist={ivf.nlist})")
+
+        for nprobe in nprobes:
+            ivf.nprobe = nprobe
+            ivf_results, ivf_ms = time_queries(ivf, queries, k)
+            recall = np.mean([len(a & e) / k for a, e in
+                              zip(ivf_results, exact_results)])
+            print(f"IVF nprobe={nprobe:<3}      : {ivf_ms:8.3f} ms/query  "
+                  f"recall@{k} {recall:.3f}  speedup {exact_ms / ivf_ms:5.1f}x")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--sizes", type=int, nargs="+", default=[10000, 100000])
+    parser.add_argument("--dim", type=int, default=384)
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--k", type=int, default=3)
+    parser.add_argument("--nprobe", type=int, nargs="+",
+                        default=[1, 2, 4, 8, 16, 32])
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+    run(args.sizes, args.dim, args.queries, args.k, args.nprobe, args.seed)
@@ -0,0 +1,154 @@
+import os
+import re
+import sys
+from collections import Counter
+
+import numpy as np
+
+# -----------------------------------------------------------------------
+# Keyword (BM25) retrieval for the policy index.
+#
+# Embeddings rank exact terms like "FMLA", "sabbatical" or "15 days"
+# poorly, so the server also keeps a compact inverted index over the
+# chunk text and fuses both rankings with reciprocal rank fusion (RRF).
+#
+# The postings are stored CSR style in flat numpy arrays: the chunks
+# containing term t are doc_ids[offsets[t]:offsets[t + 1]], with the
+# matching term frequencies in term_freqs.
+# -----------------------------------------------------------------------
+
+BM25_FILE = "bm25.npz"
+TOKEN_PATTERN = re.compile(r"[a-z0-9]+")
+
+# Constant used by reciprocal rank fusion; 60 is the usual default
+RRF_K = 60
+
+
+def tokenize(text):
+    return TOKEN_PATTERN.findall(text.lower())
+
+
+class BM25Index:
+    """Inverted index scored with Okapi BM25."""
+
+    def __init__(self, terms, offsets, doc_ids, term_freqs, doc_lengths,
+                 k1=1.5, b=0.75):
+        self.terms = terms
+        self.term_ids = {term: term_id for term_id, term in enumerate(terms)}
+        self.offsets = offsets
+        self.doc_ids = doc_ids
+        self.term_freqs = term_freqs
+        self.doc_lengths = doc_lengths
+        self.k1 = k1
+        self.b = b
+        self.avg_doc_length = max(float(doc_lengths.mean()), 1.0) \
+            if len(doc_lengths) else 1.0
+        self.length_norm = (k1 * (1 - b + b * doc_lengths
+                                  / self.avg_doc_length)).astype(np.float32)
+        doc_freqs = np.diff(offsets)
+        self.idf = np.log(1.0 + (len(doc_lengths) - doc_freqs + 0.5)
+                          / (doc_freqs + 0.5))
+
+    @classmethod
+    def build(cls, texts):
+        term_ids = {}
+        posting_terms, posting_docs, posting_freqs = [], [], []
+        doc_lengths = np.zeros(len(texts), dtype=np.int32)
+
+        for doc_id, text in enumerate(texts):
+            tokens = tokenize(text)
+            doc_lengths[doc_id] = len(tokens)
+            for term, freq in Counter(tokens).items():
+                posting_terms.append(term_ids.setdefault(term, len(term_ids)))
+                posting_docs.append(doc_id)
+                posting_freqs.append(freq)
+
+        posting_terms = np.array(posting_terms, dtype=np.int32)
+        order = np.argsort(posting_terms, kind="stable")
+        offsets = np.concatenate(
+            ([0], np.cumsum(np.bincount(posting_terms, minlength=len(term_ids)))))
+        terms = sorted(term_ids, key=term_ids.get)
+        return cls(terms,
+                   offsets.astype(np.int64),
+                   np.array(posting_docs, dtype=np.int32)[order],
+                   np.array(posting_freqs, dtype=np.int32)[order],
+                   doc_lengths)
+
+    def search(self, query, k):
+        """Returns the ids and BM25 scores of the k best matching chunks."""
+        scores = np.zeros(len(self.doc_lengths), dtype=np.float32)
+        for term in set(tokenize(query)):
+            term_id = self.term_ids.get(term)
+            if term_id is None:
+                continue
+            start, end = self.offsets[term_id], self.offsets[term_id + 1]
+            docs = self.doc_ids[start:end]
+            freqs = self.term_freqs[start:end]
+            # A chunk appears at most once per term, so += is safe here
+            scores[docs] += self.idf[term_id] * freqs * (self.k1 + 1) \
+                / (freqs + self.length_norm[docs])
+
+        matched = np.flatnonzero(scores)
+        if matched.size == 0:
+            return matched, scores[matched]
+        k = min(k, matched.size)
+        top = matched[np.argpartition(-scores[matched], k - 1)[:k]]
+        top = top[np.argsort(-scores[top])]
+        return top, scores[top]
+
+    def save(self, path, fingerprint):
+        tmp_path = f"{path}.tmp-{os.getpid()}.npz"
+        np.savez(tmp_path,
+                 terms=np.array(self.terms, dtype=str),
+                 offsets=self.offsets,
+                 doc_ids=self.doc_ids,
+                 term_freqs=self.term_freqs,
+                 doc_lengths=self.doc_lengths,
+                 fingerprint=np.array(fingerprint))
+        os.replace(tmp_path, path)
+
+    @classmethod
+    def load(cls, path, fingerprint):
+        """Returns the saved index, or None if it was built for other data."""
+        if not os.path.exists(path):
+            return None
+        try:
+            with np.load(path, allow_pickle=False) as saved:
+                if str(saved["fingerprint"]) != fingerprint:
+                    return None
+                return cls(saved["terms"].tolist(), saved["offsets"],
+                           saved["doc_ids"], saved["term_freqs"],
+                           saved["doc_lengths"])
+        except (OSError, ValueError, KeyError) as e:
+            print("Could not read BM25 index: ", e, file=sys.stderr)
+            return None
+
+
+def reciprocal_rank_fusion(rankings, rrf_k=RRF_K):
+    """Fuses several ranked lists of chunk ids into one ranked list.
+
+    Each chunk scores sum(1 / (rrf_k + rank)) over the lists it is in, so
+    chunks ranked well by both keyword and vector search come first."""
+    fused = {}
+    for ranking in rankings:
+        for rank, chunk_id in enumerate(ranking, start=1):
+            chunk_id = int(chunk_id)
+            fused[chunk_id] = fused.get(chunk_id, 0.0) + 1.0 / (rrf_k + rank)
+    return sorted(fused, key=fused.get, reverse=True)
+
+
+def load_or_build_keyword_index(index, index_dir):
+    """Returns the BM25 index for a PolicyIndex, reusing the saved one
+    while the chunks it was built from do not change."""
+    bm25_path = os.path.join(index_dir, BM25_FILE)
+    fingerprint = index.fingerprint()
+    keyword_index = BM25Index.load(bm25_path, fingerprint)
+    if keyword_index is not None:
+        print("Loaded BM25 index from ", bm25_path, file=sys.stderr)
+        return keyword_index
+
+    print(f"Building BM25 index over {len(index.chunks)} chunks", file=sys.stderr)
+    keyword_index = BM25Index.build(
+        [chunk["page_content"] for chunk in index.chunks])
+    keyword_index.save(bm25_path, fingerprint)
+    return keyword_index
@@ -0,0 +1,85 @@
+import argparse
+import time
+
+import numpy as np
+
+from policy_ann import ExactSearch
+from policy_bm25 import BM25Index, reciprocal_rank_fusion
+
+# -----------------------------------------------------------------------
+# Microbenchmark for the BM25 inverted index used by hybrid retrieval.
+#
+# Generates synthetic policy-like chunks (Zipf distributed words plus a
+# few rare domain terms such as "fmla" or "sabbatical") and reports the
+# index build time, the per-query BM25 latency, and the latency of the
+# full hybrid step (exact vector scan + BM25 + reciprocal rank fusion).
+#
+# Usage: python chapter3/policy_bm25_benchmark.py --sizes 10000 100000
+# -----------------------------------------------------------------------
+
+RARE_TERMS = ["fmla", "sabbatical", "bereavement", "jury", "tuition",
+              "relocation", "parental", "overtime"]
+
+
+def make_chunks(count, words_per_chunk, vocabulary_size, rng):
+    vocabulary = [f"w{i}" for i in range(vocabulary_size)]
+    word_ids = np.minimum(rng.zipf(1.3, (count, words_per_chunk)),
+                          vocabulary_size) - 1
+    chunks = []
+    for row in word_ids:
+        words = [vocabulary[i] for i in row]
+        # Roughly 1 in 50 chunks mentions a rare policy term
+        if rng.random() < 0.02:
+            words[rng.integers(words_per_chunk)] = RARE_TERMS[
+                rng.integers(len(RARE_TERMS))]
+        chunks.append(" ".join(words))
+    return chunks
+
+
+def run(sizes, words_per_chunk, query_count, k, candidates, seed):
+    rng = np.random.default_rng(seed)
+    for size in sizes:
+        chunks = make_chunks(size, words_per_chunk, 20000, rng)
+        queries = [f"what is the {RARE_TERMS[i % len(RARE_TERMS)]} policy "
+                   f"w{rng.integers(50)} w{rng.integers(2000)}"
+                   for i in range(query_count)]
+        print(f"\n--- {size} chunks, {words_per_chunk} words/chunk, "
+              f"{query_count} queries")
+
+        start = time.perf_counter()
+        bm25 = BM25Index.build(chunks)
+        print(f"BM25 build          : {time.perf_counter() - start:8.2f} s "
+              f"({len(bm25.terms)} terms, {len(bm25.doc_ids)} postings)")
+
+        start = time.perf_counter()
+        for query in queries:
+            bm25.search(query, candidates)
+        bm25_ms = (time.perf_counter() - start) * 1000 / query_count
+        print(f"BM25 query          : {bm25_ms:8.3f} ms/query")
+
+        # Random unit vectors stand in for the chunk/query embeddings
+        embeddings = rng.standard_normal((size, 384)).astype(np.float32)
+        embeddings /= np.linalg.norm(embeddings, axis=1, keepdims=True)
+        vector_search = ExactSearch(embeddings)
+        query_vectors = embeddings[rng.integers(0, size, query_count)]
+
+        start = time.perf_counter()
+        for query, query_vector in zip(queries, query_vectors):
+            vector_ids, _ = vector_search.search(query_vector, candidates)
+            keyword_ids, _ = bm25.search(query, candidates)
+            reciprocal_rank_fusion([vector_ids, keyword_ids])[:k]
+        hybrid_ms = (time.perf_counter() - start) * 1000 / query_count
+        print(f"hybrid query (RRF)  : {hybrid_ms:8.3f} ms/query")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--sizes", type=int, nargs="+", default=[10000, 100000])
+    parser.add_argument("--words", type=int, default=150)
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--k", type=int, default=3)
+    parser.add_argument("--candidates", type=int, default=20)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+    run(args.sizes, args.words, args.queries, args.k, args.candidates,
+        args.seed)
@@ -0,0 +1,296 @@
+import hashlib
+import json
+import os
+import shutil
+import sys
+import time
+
+import numpy as np
+from langchain_core.documents import Document
+
+from policy_ann import ExactSearch
+from policy_bm25 import reciprocal_rank_fusion
+
+# The PDF ingestion stage is shared with the code of conduct server
+sys.path.append(os.path.abspath(os.path.join(
+    os.path.dirname(__file__), '../chapter2')))
+from pdf_ingestion import IngestionStats, file_sha256, ingest_pdfs
+
+# -----------------------------------------------------------------------
+# Persistent on-disk vector index for the HR policy server.
+#
+# The index covers every PDF in the policy directory. The chunk
+# embeddings are stored as a float32 .npy array that is memory-mapped on
+# load, and the chunk text/metadata is kept in a JSON sidecar together
+# with a manifest (content hash of every source PDF + embedding model).
+# The server loads this in milliseconds, and when PDFs are added, changed
+# or removed only the chunks of those files are re-embedded.
+#
+# Each rebuild is written to a new generation directory and published by
+# atomically rewriting the CURRENT pointer file, so a reader never sees
+# a half written index.
+#
+# Searching is delegated to a pluggable backend (see policy_ann.py):
+# an exact scan by default, or an approximate IVF index for large corpora.
+# An optional BM25 keyword index (see policy_bm25.py) enables hybrid
+# keyword + vector retrieval.
+# -----------------------------------------------------------------------
+
+INDEX_FORMAT_VERSION = 2
+EMBEDDINGS_FILE = "embeddings.npy"
+CHUNKS_FILE = "chunks.json"
+CURRENT_FILE = "CURRENT"
+
+# Generations younger than this are never pruned, in case another server
+# process is still writing or has just loaded them.
+GENERATION_GRACE_SECONDS = 600
+
+
+class PolicySourceScanner:
+    """Finds the PDFs in the policy directory and their content hashes.
+
+    A file is only re-hashed when its size or mtime changed since the
+    previous scan, so polling a large directory stays cheap."""
+
+    def __init__(self, policy_dir):
+        self.policy_dir = policy_dir
+        self._stats = {}
+
+    def scan(self):
+        """Returns {file name: sha256} for every PDF in the directory."""
+        sources = {}
+        stats = {}
+        for entry in sorted(os.scandir(self.policy_dir), key=lambda e: e.name):
+            if not (entry.is_file() and entry.name.lower().endswith(".pdf")):
+                continue
+            stat = entry.stat()
+            key = (stat.st_mtime_ns, stat.st_size)
+            known = self._stats.get(entry.name)
+            if known and known[0] == key:
+                sha256 = known[1]
+            else:
+                sha256 = file_sha256(entry.path)
+            stats[entry.name] = (key, sha256)
+            sources[entry.name] = sha256
+        self._stats = stats
+        return sources
+
+
+def normalize_rows(vectors):
+    """Scales each row to unit length so a dot product is a cosine similarity."""
+    vectors = np.asarray(vectors, dtype=np.float32)
+    norms = np.linalg.norm(vectors, axis=-1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return vectors / norms
+
+
+def _write_atomically(path, write_fn, mode="wb"):
+    # Write to a temp file next to the target and rename it into place,
+    # so a crash never leaves a half written file behind.
+    tmp_path = f"{path}.tmp-{os.getpid()}"
+    with open(tmp_path, mode) as tmp_file:
+        write_fn(tmp_file)
+    os.replace(tmp_path, path)
+
+
+class PolicyIndex:
+    """Chunk embeddings (one unit-length row per chunk) plus chunk metadata."""
+
+    def __init__(self, embeddings, chunks, manifest, path=None):
+        self.embeddings = embeddings
+        self.chunks = chunks
+        self.manifest = manifest
+        # Generation directory the index was loaded from; derived indexes
+        # (IVF lists, BM25 postings) are saved next to the embeddings.
+        self.path = path
+        self.search_backend = ExactSearch(embeddings)
+        self.keyword_index = None
+
+    @classmethod
+    def build(cls, policy_dir, sources, get_embedding_model, model_name,
+              previous=None, workers=None, batch_size=64):
+        """Builds the index for the given {file name: sha256} sources.
+
+        Chunks of files that are unchanged in the previous index are
+        reused as they are; only added or changed files are embedded, so
+        the embedding model is not even loaded when files were only removed.
+        New files are extracted and chunked by a process pool and embedded
+        batch by batch as the chunks arrive."""
+        reusable = set()
+        if previous is not None and previous.manifest.get("model_name") == model_name:
+            old_sources = previous.manifest.get("sources", {})
+            reusable = {name for name, sha256 in sources.items()
+                        if old_sources.get(name) == sha256}
+
+        keep_rows = []
+        if reusable:
+            keep_rows = [row for row, chunk in enumerate(previous.chunks)
+                         if chunk["source"] in reusable]
+        chunks = [previous.chunks[row] for row in keep_rows]
+        blocks = [np.asarray(previous.embeddings[keep_rows], dtype=np.float32)] \
+            if keep_rows else []
+
+        new_paths = [os.path.join(policy_dir, source_name)
+                     for source_name in sources if source_name not in reusable]
+        if new_paths:
+            print(f"Embedding {len(new_paths)} policy documents", file=sys.stderr)
+            embedding_model = get_embedding_model()
+            stats = IngestionStats()
+            for batch in ingest_pdfs(new_paths, workers=workers,
+                                     batch_size=batch_size, stats=stats):
+                vectors = embedding_model.embed_documents(
+                    [chunk["page_content"] for chunk in batch])
+                for chunk in batch:
+                    chunk["source"] = os.path.basename(chunk["metadata"]["source"])
+                chunks.extend(batch)
+                blocks.append(normalize_rows(vectors).reshape(len(batch), -1))
+
+        if blocks:
+            embeddings = np.concatenate(blocks)
+        else:
+            dim = previous.embeddings.shape[1] if previous is not None else 0
+            embeddings = np.zeros((0, dim), dtype=np.float32)
+        manifest = {
+            "version": INDEX_FORMAT_VERSION,
+            "model_name": model_name,
+            "sources": dict(sources),
+            "count": int(embeddings.shape[0]),
+            "dim": int(embeddings.shape[1]),
+        }
+        return cls(embeddings, chunks, manifest)
+
+    def save(self, index_dir):
+        """Writes the index as a new generation and makes it current.
+
+        The generation directory is fully written before the CURRENT
+        pointer is atomically replaced, so concurrent readers see either
+        the old or the new index, never a mix."""
+        os.makedirs(index_dir, exist_ok=True)
+        generation = f"gen-{time.time_ns()}-{os.getpid()}"
+        path = os.path.join(index_dir, generation)
+        os.makedirs(path)
+        np.save(os.path.join(path, EMBEDDINGS_FILE),
+                np.ascontiguousarray(self.embeddings, dtype=np.float32))
+        with open(os.path.join(path, CHUNKS_FILE), "w") as chunks_file:
+            json.dump({"manifest": self.manifest, "chunks": self.chunks},
+                      chunks_file, default=str)
+
+        previous = _read_current(index_dir)
+        _write_atomically(os.path.join(index_dir, CURRENT_FILE),
+                          lambda f: f.write(generation), mode="w")
+        self.path = path
+        _prune_generations(index_dir, keep={generation, previous})
+
+    @classmethod
+    def load(cls, index_dir):
+        """Loads the current generation, memory-mapping the embeddings.
+        Returns None if there is no usable index in the directory."""
+        generation = _read_current(index_dir)
+        if generation is None:
+            return None
+        return cls.load_generation(os.path.join(index_dir, generation))
+
+    @classmethod
+    def load_generation(cls, path):
+        """Loads one generation directory, or returns None if unusable."""
+        try:
+            with open(os.path.join(path, CHUNKS_FILE)) as chunks_file:
+                sidecar = json.load(chunks_file)
+            embeddings = np.load(os.path.join(path, EMBEDDINGS_FILE),
+                                 mmap_mode="r")
+        except (OSError, ValueError) as e:
+            print("Could not read policy index: ", e, file=sys.stderr)
+            return None
+
+        manifest = sidecar.get("manifest", {})
+        if (manifest.get("version") != INDEX_FORMAT_VERSION
+                or embeddings.ndim != 2
+                or embeddings.shape[0] != manifest.get("count")
+                or len(sidecar.get("chunks", [])) != manifest.get("count")):
+            return None
+        return cls(embeddings, sidecar["chunks"], manifest, path)
+
+    def matches(self, sources, model_name):
+        """True if the index was built from exactly these sources and model."""
+        return (self.manifest.get("sources") == sources
+                and self.manifest.get("model_name") == model_name)
+
+    def fingerprint(self):
+        """Identifies the chunks and embeddings that derived indexes
+        (IVF lists, BM25 postings) and cached results were built from."""
+        sources = json.dumps(self.manifest.get("sources"), sort_keys=True)
+        return "|".join([hashlib.sha256(sources.encode()).hexdigest()]
+                        + [str(self.manifest.get(key)) for key in
+                           ("model_name", "count", "dim")])
+
+    def document(self, chunk_id):
+        chunk = self.chunks[chunk_id]
+        return Document(page_content=chunk["page_content"],
+                        metadata=chunk["metadata"])
+
+    def search_by_vector(self, query_vector, k=3):
+        """Returns the ids and cosine scores of the k closest chunks."""
+        if len(self.chunks) == 0:
+            return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.float32)
+        return self.search_backend.search(normalize_rows(query_vector), k)
+
+    def similarity_search(self, query, embedding_model, k=3):
+        """Same contract as InMemoryVectorStore.similarity_search."""
+        query_vector = embedding_model.embed_query(query)
+        ids, _ = self.search_by_vector(query_vector, k)
+        return [self.document(int(chunk_id)) for chunk_id in ids]
+
+    def hybrid_search(self, query, embedding_model, k=3, candidates=20):
+        """Fuses the top vector and BM25 candidates with reciprocal rank
+        fusion and returns the k best documents. Falls back to vector
+        search if there is no keyword index."""
+        if self.keyword_index is None:
+            return self.similarity_search(query, embedding_model, k)
+
+        vector_ids, _ = self.search_by_vector(
+            embedding_model.embed_query(query), candidates)
+        keyword_ids, _ = self.keyword_index.search(query, candidates)
+        fused_ids = reciprocal_rank_fusion([vector_ids, keyword_ids])
+        return [self.document(chunk_id) for chunk_id in fused_ids[:k]]
+
+
+def _read_current(index_dir):
+    try:
+        with open(os.path.join(index_dir, CURRENT_FILE)) as current_file:
+            return current_file.read().strip() or None
+    except OSError:
+        return None
+
+
+def _prune_generations(index_dir, keep):
+    cutoff = time.time() - GENERATION_GRACE_SECONDS
+    for entry in os.scandir(index_dir):
+        if (entry.is_dir() and entry.name.startswith("gen-")
+                and entry.name not in keep
+                and entry.stat().st_mtime < cutoff):
+            shutil.rmtree(entry.path, ignore_errors=True)
+
+
+def load_or_build_index(policy_dir, index_dir, model_name, get_embedding_model,
+                        sources=None, previous=None, workers=None):
+    """Returns the saved index if it is current for the policy PDFs and
+    model, otherwise (re)builds it incrementally, saves and returns it.
+
+    get_embedding_model is a callable, so the embedding model is only
+    loaded when something actually needs to be embedded."""
+    if sources is None:
+        sources = PolicySourceScanner(policy_dir).scan()
+    if previous is not None and previous.matches(sources, model_name):
+        return previous
+
+    index = PolicyIndex.load(index_dir)
+    if index is not None and index.matches(sources, model_name):
+        print("Loaded policy index from ", index.path, file=sys.stderr)
+        return index
+
+    index = PolicyIndex.build(policy_dir, sources, get_embedding_model,
+                              model_name, previous=previous or index,
+                              workers=workers)
+    index.save(index_dir)
+    # Re-open from disk so the embeddings are memory-mapped like a warm start
+    return PolicyIndex.load_generation(index.path) or index
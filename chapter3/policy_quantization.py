@@ -0,0 +1,172 @@
+import os
+import sys
+
+import numpy as np
+
+# -----------------------------------------------------------------------
+# Quantized embedding storage for the policy index.
+#
+# The float32 embeddings take 4 bytes per dimension. With "float16"
+# storage the rows are kept at half precision (2 bytes), with "int8"
+# storage each row is scalar quantized to int8 with its own scale
+# (1 byte per dimension plus 4 bytes per row):
+#
+#     row ~= codes * scale,  scale = max(|row|) / 127
+#
+# The quantized arrays are saved next to the float32 embeddings and
+# memory-mapped, so a query scan only pages in the small arrays. The
+# float32 rows stay on disk and are only read to re-rank the top
+# candidates exactly (see RerankedSearch).
+#
+# float16 only saves memory, it does not make queries faster: numpy has
+# no half precision matrix product, so every query converts all rows back
+# to float32, and the conversion costs far more than the product itself.
+# Measured on 100k x 384 embeddings, a float16 scan takes about 8-12x as
+# long as a float32 one, while an int8 scan (a cheap integer conversion)
+# is about as fast as float32. Prefer int8 (with a re-rank) unless the
+# int8 recall is not good enough.
+#
+# QuantizedVectors supports the two operations the search backends use
+# (vectors @ query and vectors[ids]), so ExactSearch and IVFFlatIndex
+# work on it unchanged.
+# -----------------------------------------------------------------------
+
+STORAGE_TYPES = ("float32", "float16", "int8")
+
+
+def quantize_int8(embeddings, batch_size=8192):
+    """Returns (int8 codes, float32 per-row scales)."""
+    count = embeddings.shape[0]
+    codes = np.empty(embeddings.shape, dtype=np.int8)
+    scales = np.empty(count, dtype=np.float32)
+    for start in range(0, count, batch_size):
+        batch = np.asarray(embeddings[start:start + batch_size], dtype=np.float32)
+        batch_scales = np.abs(batch).max(axis=1) / 127.0
+        batch_scales[batch_scales == 0] = 1.0
+        codes[start:start + batch_size] = np.rint(batch / batch_scales[:, None])
+        scales[start:start + batch_size] = batch_scales
+    return codes, scales
+
+
+class QuantizedVectors:
+    """float16 or int8 (with per-row scales) copy of the embeddings."""
+
+    def __init__(self, codes, scales=None, batch_size=1024):
+        self.codes = codes
+        self.scales = scales
+        self.batch_size = batch_size
+
+    @property
+    def storage(self):
+        return "int8" if self.scales is not None else "float16"
+
+    @property
+    def shape(self):
+        return self.codes.shape
+
+    @property
+    def nbytes(self):
+        return self.codes.nbytes + (self.scales.nbytes if self.scales is not None else 0)
+
+    @classmethod
+    def quantize(cls, embeddings, storage):
+        if storage == "int8":
+            return cls(*quantize_int8(embeddings))
+        if storage == "float16":
+            return cls(np.asarray(embeddings, dtype=np.float16))
+        raise ValueError(f"Unknown quantized storage: {storage}")
+
+    def __getitem__(self, ids):
+        """Dequantized float32 rows."""
+        rows = np.asarray(self.codes[ids], dtype=np.float32)
+        if self.scales is not None:
+            rows *= np.asarray(self.scales[ids])[..., None]
+        return rows
+
+    def __matmul__(self, query_vector):
+        # Dequantize in batches, so a scan never materializes a full
+        # float32 copy of the embeddings. The conversion is repeated for
+        # every query, which is what makes float16 scans slow (see above).
+        count = self.codes.shape[0]
+        scores = np.empty(count, dtype=np.float32)
+        for start in range(0, count, self.batch_size):
+            batch = np.asarray(self.codes[start:start + self.batch_size],
+                               dtype=np.float32)
+            scores[start:start + self.batch_size] = batch @ query_vector
+        if self.scales is not None:
+            scores *= self.scales
+        return scores
+
+    def save(self, index_dir):
+        codes_path, scales_path = _paths(index_dir, self.storage)
+        _save_npy(codes_path, self.codes)
+        if self.scales is not None:
+            _save_npy(scales_path, self.scales)
+
+    @classmethod
+    def load(cls, index_dir, storage, shape):
+        """Memory-maps saved quantized vectors, or returns None if they
+        are missing or do not match the embeddings' shape."""
+        codes_path, scales_path = _paths(index_dir, storage)
+        try:
+            codes = np.load(codes_path, mmap_mode="r")
+            scales = np.load(scales_path, mmap_mode="r") \
+                if storage == "int8" else None
+        except (OSError, ValueError):
+            return None
+        if codes.shape != tuple(shape) \
+                or (scales is not None and scales.shape != (shape[0],)):
+            return None
+        return cls(codes, scales)
+
+
+def _paths(index_dir, storage):
+    return (os.path.join(index_dir, f"embeddings.{storage}.npy"),
+            os.path.join(index_dir, f"embeddings.{storage}.scales.npy"))
+
+
+def _save_npy(path, array):
+    tmp_path = f"{path}.tmp-{os.getpid()}.npy"
+    np.save(tmp_path, np.ascontiguousarray(array))
+    os.replace(tmp_path, path)
+
+
+class RerankedSearch:
+    """Re-scores the top candidates of a quantized backend with the exact
+    float32 embeddings, so quantization error does not change the order
+    of the final top k."""
+
+    def __init__(self, backend, embeddings, rerank=20):
+        self.backend = backend
+        self.embeddings = embeddings
+        self.rerank = rerank
+
+    @property
+    def name(self):
+        return f"{self.backend.name}+rerank"
+
+    def search(self, query_vector, k):
+        candidates, _ = self.backend.search(query_vector, max(k, self.rerank))
+        if candidates.size == 0:
+            return candidates, np.empty(0, dtype=np.float32)
+        candidates = np.sort(candidates)  # sequential reads from the memory map
+        scores = np.asarray(self.embeddings[candidates]) @ query_vector
+        top = np.argsort(-scores)[:k]
+        return candidates[top], scores[top]
+
+
+def load_or_quantize(index, index_dir, storage):
+    """Returns the vectors to search for a PolicyIndex: the float32
+    embeddings themselves, or their saved (or newly saved) quantized copy."""
+    if storage == "float32":
+        return index.embeddings
+    if storage not in STORAGE_TYPES:
+        raise ValueError(f"Unknown vector storage: {storage}")
+
+    vectors = QuantizedVectors.load(index_dir, storage, index.embeddings.shape)
+    if vectors is None:
+        print(f"Quantizing {index.embeddings.shape[0]} embeddings to {storage}",
+              file=sys.stderr)
+        QuantizedVectors.quantize(index.embeddings, storage).save(index_dir)
+        vectors = QuantizedVectors.load(index_dir, storage, index.embeddings.shape)
+    return vectors
@@ -0,0 +1,109 @@
+import argparse
+import time
+import tracemalloc
+
+import numpy as np
+
+from policy_ann import ExactSearch
+from policy_ann_benchmark import make_corpus, make_queries, time_queries
+from policy_quantization import QuantizedVectors, RerankedSearch
+
+# -----------------------------------------------------------------------
+# Memory / latency / recall benchmark for quantized embedding storage.
+#
+# Compares the InMemoryVectorStore the policy server used to use with
+# the float32 index and its float16 and int8 copies (with and without
+# an exact float32 re-rank of the top candidates). Recall@k is measured
+# against the exact float32 ranking.
+#
+# InMemoryVectorStore keeps every vector as a Python list of floats and
+# is very slow to query, so it is only run for sizes up to
+# --in-memory-max chunks.
+#
+# Usage: python chapter3/policy_quantization_benchmark.py --sizes 10000 100000
+# -----------------------------------------------------------------------
+
+
+class PrecomputedEmbeddings:
+    """Embeddings stand-in that returns the synthetic corpus vectors."""
+
+    def __init__(self, corpus):
+        self.corpus = corpus
+
+    def embed_documents(self, texts):
+        return [self.embed_query(text) for text in texts]
+
+    def embed_query(self, text):
+        # "chunk-N" is row N of the corpus
+        return self.corpus[int(text.split("-")[1])].tolist()
+
+
+def run_in_memory_store(corpus, queries, k, exact_results):
+    from langchain_core.vectorstores import InMemoryVectorStore
+
+    tracemalloc.start()
+    store = InMemoryVectorStore(PrecomputedEmbeddings(corpus))
+    store.add_texts([f"chunk-{i}" for i in range(corpus.shape[0])],
+                    metadatas=[{"row": i} for i in range(corpus.shape[0])])
+    memory = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+
+    results = []
+    start = time.perf_counter()
+    for query in queries:
+        documents = store.similarity_search_by_vector(query.tolist(), k)
+        results.append({document.metadata["row"] for document in documents})
+    elapsed_ms = (time.perf_counter() - start) * 1000 / len(queries)
+    report("InMemoryVectorStore", memory, elapsed_ms,
+           recall(results, exact_results[:len(queries)], k), k)
+
+
+def recall(results, exact_results, k):
+    return np.mean([len(a & e) / k for a, e in zip(results, exact_results)])
+
+
+def report(label, memory, elapsed_ms, recall_at_k, k):
+    print(f"{label:<22}: {memory / 2**20:9.1f} MiB  {elapsed_ms:8.3f} ms/query  "
+          f"recall@{k} {recall_at_k:.3f}")
+
+
+def run(sizes, dim, query_count, k, rerank, in_memory_max, seed):
+    rng = np.random.default_rng(seed)
+    for size in sizes:
+        corpus = make_corpus(size, dim, rng)
+        queries = make_queries(corpus, query_count, rng)
+        print(f"\n--- {size} chunks, dim {dim}, {query_count} queries, k={k}")
+
+        exact_results, exact_ms = time_queries(ExactSearch(corpus), queries, k)
+        report("float32", corpus.nbytes, exact_ms, 1.0, k)
+
+        if size <= in_memory_max:
+            # At most 50 queries: every query converts the whole store
+            run_in_memory_store(corpus, queries[:50], k, exact_results)
+
+        for storage in ("float16", "int8"):
+            vectors = QuantizedVectors.quantize(corpus, storage)
+            results, elapsed_ms = time_queries(ExactSearch(vectors), queries, k)
+            report(storage, vectors.nbytes, elapsed_ms,
+                   recall(results, exact_results, k), k)
+
+            # The re-rank reads rerank float32 rows per query from the
+            # memory-mapped embeddings, which are not counted as resident.
+            reranked = RerankedSearch(ExactSearch(vectors), corpus, rerank)
+            results, elapsed_ms = time_queries(reranked, queries, k)
+            report(f"{storage}+rerank {rerank}", vectors.nbytes, elapsed_ms,
+                   recall(results, exact_results, k), k)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--sizes", type=int, nargs="+", default=[10000, 100000])
+    parser.add_argument("--dim", type=int, default=384)
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--k", type=int, default=3)
+    parser.add_argument("--rerank", type=int, default=20)
+    parser.add_argument("--in-memory-max", type=int, default=20000)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+    run(args.sizes, args.dim, args.queries, args.k, args.rerank,
+        args.in_memory_max, args.seed)
@@ -0,0 +1,139 @@
+import re
+import threading
+import time
+from collections import OrderedDict
+
+# -----------------------------------------------------------------------
+# Query cache for the query_policies tool.
+#
+# The router keeps sending the same few policy questions ("remote work",
+# "sick leave", "vacation days"), so both the query embedding (the
+# sentence-transformer forward pass) and the top-k result are cached,
+# keyed on the normalized query text.
+#
+# Query embeddings only depend on the embedding model, so they survive
+# index rebuilds. Results depend on the indexed chunks, so they are
+# dropped automatically as soon as the index fingerprint changes.
+# -----------------------------------------------------------------------
+
+_NON_WORD = re.compile(r"[^\w\s]")
+
+
+def normalize_query(query):
+    """Lowercases, drops punctuation and collapses whitespace, so
+    "Remote work?" and "remote  work" share a cache entry."""
+    return " ".join(_NON_WORD.sub(" ", query.lower()).split())
+
+
+class LRUCache:
+    """Thread safe LRU cache with an optional per-entry time to live."""
+
+    def __init__(self, max_entries=1024, ttl_seconds=None):
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                value, stored_at = entry
+                if self.ttl_seconds is None \
+                        or time.monotonic() - stored_at < self.ttl_seconds:
+                    self._entries.move_to_end(key)
+                    self.hits += 1
+                    return value
+                del self._entries[key]
+                self.expirations += 1
+            self.misses += 1
+            return None
+
+    def put(self, key, value):
+        with self._lock:
+            self._entries[key] = (value, time.monotonic())
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "entries": len(self._entries),
+                "max_entries": self.max_entries,
+                "ttl_seconds": self.ttl_seconds,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_ratio": round(self.hits / lookups, 4) if lookups else 0.0,
+                "evictions": self.evictions,
+                "expirations": self.expirations,
+            }
+
+
+class CachedQueryEmbeddings:
+    """Wraps an embedding model so embed_query goes through the cache."""
+
+    def __init__(self, embedding_model, cache):
+        self.embedding_model = embedding_model
+        self.cache = cache
+
+    def embed_query(self, query):
+        key = normalize_query(query)
+        vector = self.cache.get(key)
+        if vector is None:
+            vector = self.embedding_model.embed_query(query)
+            self.cache.put(key, vector)
+        return vector
+
+    def embed_documents(self, texts):
+        return self.embedding_model.embed_documents(texts)
+
+
+class QueryCache:
+    """Query embedding cache plus top-k result cache."""
+
+    def __init__(self, max_entries=1024, ttl_seconds=3600):
+        self.embeddings = LRUCache(max_entries, ttl_seconds)
+        self.results = LRUCache(max_entries, ttl_seconds)
+        self.index_fingerprint = None
+        self.invalidations = 0
+        self._lock = threading.Lock()
+
+    def _check_index(self, index_fingerprint):
+        # A new fingerprint means the index was rebuilt or swapped, so
+        # every cached result may be stale.
+        with self._lock:
+            if index_fingerprint != self.index_fingerprint:
+                if self.index_fingerprint is not None:
+                    self.results.clear()
+                    self.invalidations += 1
+                self.index_fingerprint = index_fingerprint
+
+    def get_results(self, query, k, index_fingerprint):
+        self._check_index(index_fingerprint)
+        return self.results.get((normalize_query(query), k))
+
+    def put_results(self, query, k, index_fingerprint, results):
+        self._check_index(index_fingerprint)
+        self.results.put((normalize_query(query), k), results)
+
+    def wrap(self, embedding_model):
+        return CachedQueryEmbeddings(embedding_model, self.embeddings)
+
+    def stats(self):
+        return {
+            "query_embeddings": self.embeddings.stats(),
+            "results": self.results.stats(),
+            "index_fingerprint": self.index_fingerprint,
+            "invalidations": self.invalidations,
+        }
@@ -0,0 +1,92 @@
+import sys
+import threading
+
+from policy_index import PolicySourceScanner, load_or_build_index
+
+# -----------------------------------------------------------------------
+# Keeps the HR policy server's index in sync with the policy directory.
+#
+# A background thread polls the directory; when PDFs are added, changed
+# or removed, the index is rebuilt incrementally (only the affected
+# files are re-embedded) and the new index is swapped in with a single
+# reference assignment. Queries that already started keep using the
+# index they picked up, so serving never pauses during a rebuild.
+# -----------------------------------------------------------------------
+
+
+class PolicyIndexManager:
+    """Owns the live PolicyIndex and swaps in rebuilt ones."""
+
+    def __init__(self, policy_dir, index_dir, model_name, get_embedding_model,
+                 prepare_index=None, workers=None):
+        self.policy_dir = policy_dir
+        self.index_dir = index_dir
+        self.model_name = model_name
+        self.get_embedding_model = get_embedding_model
+        # Called with each new index before it goes live, to attach the
+        # search backend and keyword index
+        self.prepare_index = prepare_index
+        # Size of the PDF ingestion process pool (None: one per CPU)
+        self.workers = workers
+        self.scanner = PolicySourceScanner(policy_dir)
+        self.index = None
+        self._refresh_lock = threading.Lock()
+        self._stop = threading.Event()
+        self._watcher = None
+        self.refresh()
+
+    def refresh(self):
+        """Re-indexes the policy directory if it changed.
+        Returns True if a new index was swapped in."""
+        with self._refresh_lock:
+            sources = self.scanner.scan()
+            current = self.index
+            if current is not None and current.matches(sources, self.model_name):
+                return False
+
+            new_index = load_or_build_index(self.policy_dir,
+                                            self.index_dir,
+                                            self.model_name,
+                                            self.get_embedding_model,
+                                            sources=sources,
+                                            previous=current,
+                                            workers=self.workers)
+            if self.prepare_index is not None:
+                self.prepare_index(new_index)
+
+            if current is not None:
+                old_sources = current.manifest.get("sources", {})
+                print("Policy documents changed - added:",
+                      sorted(sources.keys() - old_sources.keys()),
+                      "changed:",
+                      sorted(name for name in sources.keys() & old_sources.keys()
+                             if sources[name] != old_sources[name]),
+                      "removed:",
+                      sorted(old_sources.keys() - sources.keys()),
+                      file=sys.stderr)
+            # Atomic swap: new queries see the new index from here on
+            self.index = new_index
+            return True
+
+    def _watch(self, interval):
+        while not self._stop.wait(interval):
+            try:
+                self.refresh()
+            except Exception as e:
+                # Keep serving the current index; retry on the next poll
+                print("Policy re-indexing failed: ", e, file=sys.stderr)
+
+    def start_watching(self, interval=30.0):
+        """Polls the policy directory every interval seconds."""
+        if self._watcher is None:
+            self._watcher = threading.Thread(target=self._watch,
+                                             args=(interval,),
+                                             name="policy-index-watcher",
+                                             daemon=True)
+            self._watcher.start()
+
+    def stop_watching(self):
+        self._stop.set()
+        if self._watcher is not None:
+            self._watcher.join()
+            self._watcher = None
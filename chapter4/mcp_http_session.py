@@ -0,0 +1,239 @@
+import asyncio
+
+from mcp import ClientSession, types
+from mcp.client.streamable_http import streamablehttp_client
+
+from langchain_mcp_adapters.tools import load_mcp_tools
+from langchain_mcp_adapters.prompts import load_mcp_prompt
+
+#-----------------------------------------------------------------------
+# Long-lived streamable HTTP sessions to MCP servers.
+#
+# Opening a streamable HTTP session costs several round-trips before any
+# real work (connect, initialize, initialized notification, tools/list),
+# so instead of one session per agent run, every run borrows the session
+# of a process wide MCPSessionHolder for the server URL:
+#
+# - The session stays open and is shared by concurrent callers (MCP
+#   requests are multiplexed over it by request id).
+# - The tool list is loaded once and cached until the server sends a
+#   tools/list_changed notification, or the session is reconnected.
+# - When a call fails and the server no longer answers a ping, the
+#   session is reconnected and the call retried once (tool calls are not
+#   retried, they may have run on the server).
+# - The holder has the list_tools/call_tool/get_prompt methods of a
+#   ClientSession, and the tools it loads call through it, so they keep
+#   working across reconnects and can be cached with the agent graph.
+#-----------------------------------------------------------------------
+
+
+class HttpSessionConnection:
+    """One streamable HTTP connection and its initialized ClientSession.
+
+    streamablehttp_client and ClientSession are anyio context managers that
+    must be entered and exited in the same task, so the connection is owned
+    by a background task that opens them, waits until it is asked to close,
+    and then tears them down."""
+
+    def __init__(self, url, message_handler=None):
+        self.url = url
+        self.message_handler = message_handler
+        self.session = None
+        self._ready = asyncio.Event()
+        self._closing = asyncio.Event()
+        self._error = None
+        self._task = None
+
+    async def start(self, timeout):
+        self._task = asyncio.create_task(self._run())
+        try:
+            await asyncio.wait_for(self._ready.wait(), timeout)
+        except asyncio.TimeoutError:
+            await self.close()
+            raise ConnectionError(f"Timed out connecting to {self.url}")
+        if self._error is not None:
+            raise self._error
+
+    async def _run(self):
+        try:
+            async with streamablehttp_client(self.url) as (read, write, _):
+                async with ClientSession(
+                        read, write,
+                        message_handler=self.message_handler) as session:
+                    await session.initialize()
+                    self.session = session
+                    self._ready.set()
+                    await self._closing.wait()
+        except Exception as e:
+            self._error = e
+        finally:
+            self.session = None
+            self._ready.set()
+
+    @property
+    def alive(self):
+        return self.session is not None and not self._task.done()
+
+    async def is_healthy(self, timeout):
+        """Pings the server; False if the connection is gone or the server
+        does not answer."""
+        if not self.alive:
+            return False
+        try:
+            await asyncio.wait_for(self.session.send_ping(), timeout)
+            return True
+        except Exception:
+            return False
+
+    async def close(self, timeout=5.0):
+        self._closing.set()
+        if self._task is None:
+            return
+        try:
+            await asyncio.wait_for(asyncio.shield(self._task), timeout)
+        except Exception:
+            self._task.cancel()
+
+
+class MCPSessionHolder:
+    """Keeps one open streamable HTTP session to an MCP server URL.
+
+    - The session is opened on first use and shared by all callers.
+    - get_tools() caches the server's tools and returns the same list
+      until the cache is invalidated (tools/list_changed notification or
+      reconnect; tools_version is bumped), so callers can cache what they
+      build from the tools.
+    - call() runs an operation on the session, reconnecting (and
+      retrying once, unless retry=False) if the session has died.
+    - close() closes the session; the next use opens a new one.
+    """
+
+    def __init__(self, url, connect_timeout=30.0, ping_timeout=5.0):
+        self.url = url
+        self.connect_timeout = connect_timeout
+        self.ping_timeout = ping_timeout
+        self.tools_version = 0
+        self.connections = 0
+        self._connection = None
+        self._tools = None
+        self._lock = None
+        self._loop = None
+
+    def _bind_to_running_loop(self):
+        # The session belongs to the event loop that opened it and can
+        # only be closed from it. A holder without a connection (e.g.
+        # after close()) can move to a new loop (e.g. a second
+        # asyncio.run); one with a connection refuses, rather than
+        # orphaning the session and its background task.
+        loop = asyncio.get_running_loop()
+        if loop is self._loop:
+            return
+        if self._connection is not None:
+            raise RuntimeError("MCP session holder is in use by another "
+                               "event loop; close() it on that loop first")
+        self._loop = loop
+        self._lock = asyncio.Lock()
+        self.invalidate_tools()
+
+    async def _on_message(self, message):
+        # ServerNotification wraps the notification in .root
+        notification = getattr(message, "root", message)
+        if isinstance(notification, types.ToolListChangedNotification):
+            print("MCP tool list changed: ", self.url)
+            self.invalidate_tools()
+
+    def invalidate_tools(self):
+        self._tools = None
+        self.tools_version += 1
+
+    async def session(self):
+        """The open ClientSession, connecting first if there is none."""
+        self._bind_to_running_loop()
+        connection = self._connection
+        if connection is not None and connection.alive:
+            return connection.session
+        async with self._lock:
+            if self._connection is not None and self._connection.alive:
+                return self._connection.session
+            if self._connection is not None:
+                await self._connection.close()
+            print("Opening MCP session: ", self.url)
+            connection = HttpSessionConnection(self.url, self._on_message)
+            await connection.start(self.connect_timeout)
+            self._connection = connection
+            self.connections += 1
+            # The server may have been restarted with other tools
+            self.invalidate_tools()
+            return connection.session
+
+    async def _reconnect_if_dead(self, session):
+        """Closes the connection of session if it is dead, so the next
+        session() call reconnects. Returns True if it was dead."""
+        async with self._lock:
+            connection = self._connection
+            if connection is None or connection.session is not session:
+                # Another caller already replaced it
+                return True
+            if await connection.is_healthy(self.ping_timeout):
+                return False
+            print("Reconnecting dead MCP session: ", self.url)
+            self._connection = None
+            await connection.close()
+            return True
+
+    async def call(self, operation, retry=True):
+        """Returns await operation(session). If it fails because the
+        session died, reconnects and retries once. Pass retry=False for
+        operations that are not safe to repeat."""
+        session = await self.session()
+        try:
+            return await operation(session)
+        except Exception:
+            if not await self._reconnect_if_dead(session) or not retry:
+                raise
+        return await operation(await self.session())
+
+    async def list_tools(self, *args, **kwargs):
+        return await self.call(
+            lambda session: session.list_tools(*args, **kwargs))
+
+    async def call_tool(self, *args, **kwargs):
+        return await self.call(
+            lambda session: session.call_tool(*args, **kwargs), retry=False)
+
+    async def get_prompt(self, *args, **kwargs):
+        return await self.call(
+            lambda session: session.get_prompt(*args, **kwargs))
+
+    async def get_tools(self):
+        """The server's tools as LangChain tools, loaded once per tool list."""
+        await self.session()
+        tools = self._tools
+        if tools is None:
+            version = self.tools_version
+            tools = await load_mcp_tools(self)
+            # A list_changed notification or reconnect while loading
+            # leaves the cache empty, so the next call loads again
+            if version == self.tools_version:
+                self._tools = tools
+        return tools
+
+    async def load_prompt(self, name, arguments=None):
+        return await load_mcp_prompt(self, name, arguments=arguments)
+
+    async def close(self):
+        if self._connection is not None:
+            await self._connection.close()
+            self._connection = None
+        self.invalidate_tools()
+
+
+_holders = {}
+
+
+def get_session_holder(url):
+    """Process wide MCPSessionHolder for an MCP server URL."""
+    holder = _holders.get(url)
+    if holder is None:
+        holder = _holders[url] = MCPSessionHolder(url)
+    return holder
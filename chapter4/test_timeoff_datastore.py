@@ -0,0 +1,84 @@
+import pytest
+
+from timeoff_datastore import TimeOffDatastore
+
+#-----------------------------------------------------------------------
+# Regression tests for TimeOffDatastore
+# Run from the repository root with: python -m pytest chapter4
+#-----------------------------------------------------------------------
+
+
+@pytest.fixture
+def datastore():
+    ds = TimeOffDatastore()
+    yield ds
+    ds.close()
+
+
+def test_bulk_import_counts_malformed_rows_as_rejected(datastore):
+    results = datastore.add_timeoff_requests([
+        ("Alice", "2025-05-05", 2),
+        5,
+        None,
+        ["Bob"],
+        (["Bob"], "2025-05-05", 1),
+        ("Bob", "not a day", 1),
+    ])
+
+    assert [result["status"] for result in results] == [
+        "accepted", "rejected", "rejected", "rejected", "rejected", "rejected"]
+    assert [result["employee_name"] for result in results] == [
+        "Alice", None, None, "Bob", None, "Bob"]
+    assert all(result["reason"] == "Invalid row" for result in results[1:])
+    assert datastore.get_timeoff_balance("Alice") == 13
+    assert datastore.get_timeoff_balance("Bob") == 12
+
+
+def write_roster(path, rows):
+    path.write_text("name,allowed_days,consumed_days\n" + "".join(
+        f"{name},{allowed},{consumed}\n" for name, allowed, consumed in rows))
+    return str(path)
+
+
+def test_roster_reload_keeps_filed_requests(tmp_path):
+    roster = write_roster(tmp_path / "roster.csv", [("Dana", 20, 5)])
+    ds = TimeOffDatastore(str(tmp_path / "timeoff.db"), seed=False)
+    try:
+        ds.load_roster(roster)
+        ds.add_timeoff_request("Dana", "2025-05-05", 5)
+        assert ds.get_timeoff_balance("Dana") == 10
+
+        ds.load_roster(roster)
+
+        assert ds.get_timeoff_balance("Dana") == 10
+        assert len(ds.get_timeoff_history("Dana")["items"]) == 1
+    finally:
+        ds.close()
+
+
+def test_roster_reload_adjusts_the_ledger_balance(tmp_path):
+    ds = TimeOffDatastore(str(tmp_path / "timeoff.db"), seed=False,
+                          snapshot_interval=2)
+    try:
+        ds.load_roster(write_roster(tmp_path / "roster.csv", [("Dana", 20, 5)]))
+        ds.add_timeoff_request("Dana", "2025-05-05", 5)
+
+        # The same roster, and an update that does not change the balance
+        ds.load_roster(write_roster(tmp_path / "same.csv", [("Dana", 20, 5)]))
+        with ds.writing() as conn:
+            conn.execute("UPDATE employee SET allowed_days = allowed_days "
+                         "WHERE name = 'Dana'")
+            conn.commit()
+        assert [event["event_type"] for event in
+                ds.get_balance_ledger("Dana")["items"]] == ["opening", "timeoff"]
+
+        # A new allowance is an adjustment on top of the filed request
+        ds.load_roster(write_roster(tmp_path / "raise.csv", [("Dana", 22, 0)]))
+        events = ds.get_balance_ledger("Dana")["items"]
+        assert (events[-1]["event_type"], events[-1]["days"]) == ("allowance", 2)
+        assert ds.get_timeoff_balance("Dana") == 12
+
+        ds.rebuild_balance_snapshots()
+        assert ds.get_timeoff_balance("Dana") == 12
+    finally:
+        ds.close()
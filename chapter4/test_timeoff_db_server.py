@@ -0,0 +1,96 @@
+import asyncio
+import json
+
+import pytest
+
+import timeoff_db_server
+from timeoff_async_datastore import AsyncTimeOffDatastore
+from timeoff_datastore import TimeOffDatastore
+
+#-----------------------------------------------------------------------
+# Regression tests for the timeoff MCP tools, called directly on a fresh
+# in-memory datastore
+# Run from the repository root with: python -m pytest chapter4
+#-----------------------------------------------------------------------
+
+
+def call_tool(tool, *args):
+    # The FastMCP decorator may wrap the function in a tool object
+    return asyncio.run(getattr(tool, "fn", tool)(*args))
+
+
+@pytest.fixture(autouse=True)
+def datastore(monkeypatch):
+    ds = TimeOffDatastore()
+    monkeypatch.setattr(timeoff_db_server, "timeoff_db", ds)
+    monkeypatch.setattr(timeoff_db_server, "timeoff_async_db",
+                        AsyncTimeOffDatastore(ds))
+    yield ds
+    ds.close()
+
+
+def test_import_caps_the_rejected_rows_in_the_response():
+    rows = 50
+    csv_data = "employee_name,start_day,days\n" + "".join(
+        f"Nobody{row},2025-05-05,1\n" for row in range(rows))
+
+    summary = json.loads(call_tool(timeoff_db_server.import_timeoff_requests,
+                                   csv_data))
+
+    assert summary["accepted"] == 0
+    assert summary["rejected"] == rows
+    assert summary["rejected_by_reason"] == {"Employee not found": rows}
+    assert len(summary["rejected_rows"]) == timeoff_db_server.MAX_REJECTED_ROWS
+    assert summary["rejected_rows_omitted"] == \
+        rows - timeoff_db_server.MAX_REJECTED_ROWS
+
+
+@pytest.mark.parametrize("employee_name, expected", [
+    ("Charles", "Charlie"),
+    ("Alice Smith", "Alice"),
+    ("Bobby", "Bob"),
+    ("Alise", "Alice"),
+])
+def test_request_timeoff_rejects_near_miss_names(datastore, employee_name,
+                                                 expected):
+    balances = {name: datastore.get_timeoff_balance(name)
+                for name in ("Alice", "Bob", "Charlie")}
+
+    response = call_tool(timeoff_db_server.request_timeoff,
+                         employee_name, "2025-05-05", 1)
+
+    assert response.startswith("Timeoff request rejected")
+    assert expected in response
+    assert {name: datastore.get_timeoff_balance(name)
+            for name in balances} == balances
+
+
+@pytest.mark.parametrize("employee_name, expected", [
+    ("Bobby", "Bob"),
+    ("Alice Smith", "Alice"),
+])
+@pytest.mark.parametrize("tool", [
+    timeoff_db_server.get_timeoff_balance,
+    timeoff_db_server.get_timeoff_history,
+    timeoff_db_server.get_balance_ledger,
+])
+def test_read_tools_suggest_near_miss_names(tool, employee_name, expected):
+    response = call_tool(tool, employee_name)
+
+    assert response.startswith(f"Employee '{employee_name}' not found")
+    assert f"Did you mean one of: {expected}" in response
+
+
+def test_check_coverage_suggests_near_miss_names():
+    response = call_tool(timeoff_db_server.check_coverage, "2025-05-05",
+                         "2025-05-09", "", "Bobby")
+
+    assert response.startswith("Employee 'Bobby' not found. Did you mean")
+
+
+def test_request_timeoff_accepts_normalized_names(datastore):
+    response = call_tool(timeoff_db_server.request_timeoff,
+                         " alice, ", "2025-05-05", 2)
+
+    assert response == "Successfully added timeoff request"
+    assert datastore.get_timeoff_balance("Alice") == 13
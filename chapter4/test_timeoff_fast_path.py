@@ -0,0 +1,113 @@
+import asyncio
+
+import pytest
+
+from timeoff_fast_path import TimeoffFastPath, render_answer
+
+#-----------------------------------------------------------------------
+# Regression tests for the timeoff fast path: which prompts it answers
+# without the LLM agent, and how it words the tool results
+# Run from the repository root with: python -m pytest chapter4
+#-----------------------------------------------------------------------
+
+
+@pytest.mark.parametrize("prompt", [
+    "What is my vacation balance?",
+    "what's my time off balance",
+    "  Show me my current PTO balance!  ",
+    "How many vacation days do I have left?",
+])
+def test_matches_balance_prompts(prompt):
+    assert TimeoffFastPath().match(prompt) == ("get_timeoff_balance", {})
+
+
+@pytest.mark.parametrize("prompt", [
+    "File a time off request for 5 days starting from 2025-05-05",
+    "Please book vacation starting on 2025-05-05 for 5 days.",
+])
+def test_matches_request_prompts(prompt):
+    assert TimeoffFastPath().match(prompt) == (
+        "request_timeoff", {"start_day": "2025-05-05", "days": 5})
+
+
+@pytest.mark.parametrize("prompt", [
+    # Another employee
+    "What is Bob's vacation balance?",
+    "File a time off request for Bob for 5 days starting from 2025-05-05",
+    # A date that is not YYYY-MM-DD
+    "File a time off request for 5 days starting from May 5",
+    "File a time off request for 5 days starting from 05/05/2025",
+    # A second question
+    "What is my vacation balance and when does it reset?",
+    "File a time off request for 5 days starting from 2025-05-05 and "
+    "tell me my balance",
+    # Not a calendar day
+    "File a time off request for 5 days starting from 2025-02-30",
+    # No days
+    "File a time off request for 0 days starting from 2025-05-05",
+])
+def test_leaves_other_prompts_to_the_agent(prompt):
+    assert TimeoffFastPath().match(prompt) is None
+
+
+def test_disabled_fast_path_matches_nothing():
+    fast_path = TimeoffFastPath(enabled=False)
+
+    assert fast_path.match("What is my vacation balance?") is None
+    assert fast_path.stats()["prompts"] == 1
+    assert fast_path.stats()["hits"] == 0
+
+
+def test_answer_calls_the_tool_for_the_user():
+    calls = []
+
+    async def call_tool(name, arguments):
+        calls.append((name, arguments))
+        return "Successfully added timeoff request"
+
+    fast_path = TimeoffFastPath()
+    answer = asyncio.run(fast_path.answer(
+        "Alice", "File a time off request for 1 day starting from 2025-05-05",
+        call_tool))
+
+    assert calls == [("request_timeoff", {"employee_name": "Alice",
+                                          "start_day": "2025-05-05",
+                                          "days": 1})]
+    assert answer == ("Your time off request for 1 day starting 2025-05-05 "
+                      "has been filed.")
+    assert fast_path.stats()["hits_by_tool"] == {"request_timeoff": 1}
+
+
+def test_answer_returns_none_without_calling_the_tool():
+    async def call_tool(name, arguments):
+        raise AssertionError("the tool should not be called")
+
+    assert asyncio.run(TimeoffFastPath().answer(
+        "Alice", "What is Bob's vacation balance?", call_tool)) is None
+
+
+@pytest.mark.parametrize("result, expected", [
+    ("13", "You have 13 days of time off left."),
+    ("1", "You have 1 day of time off left."),
+    ("-2", "You have -2 days of time off left."),
+])
+def test_renders_the_balance(result, expected):
+    assert render_answer("get_timeoff_balance", {}, result) == expected
+
+
+def test_renders_a_filed_request():
+    assert render_answer("request_timeoff",
+                         {"start_day": "2025-05-05", "days": 5},
+                         "Successfully added timeoff request") == (
+        "Your time off request for 5 days starting 2025-05-05 has been filed.")
+
+
+@pytest.mark.parametrize("tool_name, arguments, result", [
+    ("get_timeoff_balance", {},
+     "Employee 'Alise' not found. Did you mean one of: Alice?"),
+    ("get_timeoff_balance", {}, "Employee name 'Al' is ambiguous"),
+    ("request_timeoff", {"start_day": "2025-05-05", "days": 50},
+     "Timeoff request rejected: only 15 days left"),
+])
+def test_passes_tool_errors_through(tool_name, arguments, result):
+    assert render_answer(tool_name, arguments, result) == result
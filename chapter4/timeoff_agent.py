@@ -1,8 +1,5 @@
-from mcp import ClientSession, StdioServerParameters
-from mcp.client.streamable_http import streamablehttp_client
-
-from langchain_mcp_adapters.tools import load_mcp_tools
-from langchain_mcp_adapters.prompts import load_mcp_prompt
+from mcp_http_session import get_session_holder
+from timeoff_fast_path import TimeoffFastPath
 
 # -- See note at the bottom of the file for more info on this fix by copilot --
 # Workaround shim: some versions of langgraph.prebuilt.create_react_agent
@@ -28,14 +25,19 @@ except Exception:
     # and let the original import/call produce the normal error for visibility.
     pass
 
-from langgraph.prebuilt import create_react_agent
 # previously was: from langchain_openai import AzureChatOpenAI
 from langchain_openai import ChatOpenAI
 
 import asyncio
 import os
+import sys
 from dotenv import load_dotenv
 
+# The compiled agent graph cache is shared with the HR policy agent
+sys.path.append(os.path.abspath(os.path.join(
+    os.path.dirname(__file__), '../chapter3')))
+from agent_graph_cache import AgentGraphCache
+
 # -----------------------------------------------------------------------
 # Setup the LLM for the HR Timeoff Agent
 # This uses the Azure OpenAI service with a specific deployment
@@ -58,41 +60,62 @@ model = ChatOpenAI(
 # to manage timeoff requests.
 # -----------------------------------------------------------------------
 
+# Make sure the right URL to the MCP Server is passed.
+# and MCP server is running and accessible
+#
+# The url originally ended in "/mcp", but copilot changes to avoid the following error I was getting:
+# Response: Error initializing session - Error: unhandled errors in a TaskGroup(1 sub-exception)
+# It was probably due to the version updates in the packages
+mcp_server_url = os.getenv("TIMEOFF_MCP_SERVER_URL", "http://localhost:8000/")
 
-async def run_timeoff_agent(user: str, prompt: str,) -> str:
+# One open session to the MCP server, shared by every agent run (and by
+# concurrent A2A requests). The tools are only listed again when the
+# server reports that they changed, or after a reconnect.
+timeoff_session = get_session_holder(mcp_server_url)
+
+# The agent graph is compiled once per tool list and reused; the tools
+# call through timeoff_session, so the graph is not tied to one session.
+timeoff_agents = AgentGraphCache(model)
+
+# Balance questions and filing requests with an ISO start date are
+# answered with one direct tool call, without the LLM (set
+# TIMEOFF_FAST_PATH=0 to send every prompt to the agent).
+timeoff_fast_path = TimeoffFastPath(
+    enabled=os.getenv("TIMEOFF_FAST_PATH", "1") != "0")
 
-    # Make sure the right URL to the MCP Server is passed.
-    # and MCP server is running and accessible
-    #
-    # The url originally ended in "/mcp", but copilot changes to avoid the following error I was getting:
-    # Response: Error initializing session - Error: unhandled errors in a TaskGroup(1 sub-exception)
-    # It was probably due to the version updates in the packages
-    mcp_server_url = "http://localhost:8000/"
+
+async def call_timeoff_tool(tool_name, arguments):
+    result = await timeoff_session.call_tool(tool_name, arguments)
+    return "".join(content.text for content in result.content
+                   if content.type == "text")
+
+
+async def run_timeoff_agent(user: str, prompt: str,) -> str:
 
     try:
-        async with streamablehttp_client(mcp_server_url) as (read, write, _):
-            async with ClientSession(read, write) as session:
-                print("initializing session")
-                await session.initialize()
+        response = await timeoff_fast_path.answer(user, prompt,
+                                                  call_timeoff_tool)
+        print("Fast path: ", "hit" if response is not None else "miss",
+              timeoff_fast_path.stats())
+        if response is not None:
+            return response
 
-                timeoff_tools = await load_mcp_tools(session)
-                print("\nTools loaded :")
-                for tool in timeoff_tools:
-                    print("Tool : ", tool.name, " - ", tool.description)
+        timeoff_tools = await timeoff_session.get_tools()
+        print("\nTools loaded :")
+        for tool in timeoff_tools:
+            print("Tool : ", tool.name, " - ", tool.description)
 
-                timeoff_prompt = await load_mcp_prompt(session,
-                                                       "get_llm_prompt",
-                                                       arguments={"user": user, "prompt": prompt})
-                print("\nPrompt loaded :", timeoff_prompt)
+        timeoff_prompt = await timeoff_session.load_prompt(
+            "get_llm_prompt", arguments={"user": user, "prompt": prompt})
+        print("\nPrompt loaded :", timeoff_prompt)
 
-                print("\nCreating agent instance")
-                agent = create_react_agent(model, timeoff_tools)
+        agent = timeoff_agents.get(timeoff_tools)
 
-                print("\nAnswering prompt : ", prompt)
-                agent_response = await agent.ainvoke(
-                    {"messages": timeoff_prompt})
+        print("\nAnswering prompt : ", prompt)
+        agent_response = await agent.ainvoke(
+            {"messages": timeoff_prompt})
 
-                return agent_response["messages"][-1].content
+        return agent_response["messages"][-1].content
     except Exception as e:
         # Print full traceback to help diagnose TaskGroup sub-exceptions
         import traceback
@@ -102,21 +125,22 @@ async def run_timeoff_agent(user: str, prompt: str,) -> str:
         return "Error"
 
 
+async def main():
+    try:
+        # The three prompts share one MCP session
+        for prompt in ["What is my time off balance?",
+                       "File a time off request for 5 days starting from 2025-05-05",
+                       "What is my time off balance now?"]:
+            response = await run_timeoff_agent("Alice", prompt)
+            print("\nResponse: ", response)
+        print("\nFast path: ", timeoff_fast_path.stats())
+    finally:
+        await timeoff_session.close()
+
+
 if __name__ == "__main__":
     #
-    response = asyncio.run(
-        run_timeoff_agent("Alice",
-                          "What is my time off balance?"))
-    print("\nResponse: ", response)
-    response = asyncio.run(
-        run_timeoff_agent("Alice",
-                          "File a time off request for 5 days starting from 2025-05-05"))
-    print("\nResponse: ", response)
-
-    response = asyncio.run(
-        run_timeoff_agent("Alice",
-                          "What is my time off balance now?"))
-    print("\nResponse: ", response)
+    asyncio.run(main())
 
 # I got "Error: unhandled errors in a TaskGroup (1 sub-exception)" error when creating the agent instance
 # The sub exception shown by the traceback was:  TypeError: StateGraph.add_node() got an unexpected keyword argument 'input_schema'
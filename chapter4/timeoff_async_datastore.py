@@ -0,0 +1,101 @@
+import asyncio
+import functools
+from concurrent.futures import ThreadPoolExecutor
+
+#-----------------------------------------------------------------------
+# Async front end for the TimeOffDatastore, used by the MCP tools.
+#
+# sqlite calls block, so running them on the server's event loop would
+# stall every other MCP session while one query or write runs. Reads run
+# on a bounded thread pool (each thread has its own read connection in
+# file mode), and writes run on one dedicated writer thread, so they
+# never compete for the writer connection.
+#-----------------------------------------------------------------------
+class AsyncTimeOffDatastore:
+    def __init__(self, datastore, max_readers=8):
+        self.datastore = datastore
+        self._read_executor = ThreadPoolExecutor(
+            max_workers=max_readers, thread_name_prefix="timeoff-read")
+        self._write_executor = ThreadPoolExecutor(
+            max_workers=1, thread_name_prefix="timeoff-write")
+
+    async def _run(self, executor, function, *args):
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(
+            executor, functools.partial(function, *args))
+
+    async def read(self, function, *args):
+        return await self._run(self._read_executor, function, *args)
+
+    async def write(self, function, *args):
+        return await self._run(self._write_executor, function, *args)
+
+    # Resolve a name to an employee (with fuzzy=True, also a misspelled
+    # one)
+    async def resolve_employee(self, employee_name, fuzzy=False):
+        return await self.read(self.datastore.resolve_employee, employee_name,
+                               5, fuzzy)
+
+    # Get timeoff balance for an employee id
+    async def get_timeoff_balance_by_id(self, employee_id):
+        return await self.read(self.datastore.get_timeoff_balance_by_id,
+                               employee_id)
+
+    # Get timeoff balance for a specific employee
+    async def get_timeoff_balance(self, employee_name):
+        return await self.read(self.datastore.get_timeoff_balance,
+                               employee_name)
+
+    # Get the balance an employee had at the end of a day
+    async def get_timeoff_balance_as_of(self, employee_name, as_of_day):
+        return await self.read(self.datastore.get_timeoff_balance_as_of,
+                               employee_name, as_of_day)
+
+    # Get one page of an employee's balance ledger
+    async def get_balance_ledger(self, employee_name, limit=50, cursor=None):
+        return await self.read(self.datastore.get_balance_ledger,
+                               employee_name, limit, cursor)
+
+    # Get one page of an employee's timeoff history
+    async def get_timeoff_history(self, employee_name, start_day=None,
+                                  end_day=None, limit=50, cursor=None):
+        return await self.read(self.datastore.get_timeoff_history,
+                               employee_name, start_day, end_day, limit, cursor)
+
+    # Get one page of the timeoff taken by all employees in a date range
+    async def get_timeoff_in_range(self, start_day, end_day, limit=50,
+                                   cursor=None):
+        return await self.read(self.datastore.get_timeoff_in_range,
+                               start_day, end_day, limit, cursor)
+
+    # Find who is out in a date range
+    async def get_coverage(self, start_day, end_day, department=None,
+                           employee_name=None):
+        return await self.read(self.datastore.get_coverage, start_day,
+                               end_day, department, employee_name)
+
+    # Add a timeoff request for an employee
+    async def add_timeoff_request(self, employee_name, start_day, total_days):
+        return await self.write(self.datastore.add_timeoff_request,
+                                employee_name, start_day, total_days)
+
+    # Add a timeoff request for an employee id
+    async def add_timeoff_request_by_id(self, employee_id, start_day,
+                                        total_days):
+        return await self.write(self.datastore.add_timeoff_request_by_id,
+                                employee_id, start_day, total_days)
+
+    # Add a correction to an employee's balance
+    async def add_balance_correction(self, employee_name, days, note=None):
+        return await self.write(self.datastore.add_balance_correction,
+                                employee_name, days, note)
+
+    # Add many timeoff requests in one transaction
+    async def add_timeoff_requests(self, requests):
+        return await self.write(self.datastore.add_timeoff_requests, requests)
+
+    # Wait for running queries, then close the connections
+    def close(self):
+        self._read_executor.shutdown(wait=True)
+        self._write_executor.shutdown(wait=True)
+        self.datastore.close()
@@ -1,107 +1,1087 @@
+import csv
+import json
 import sqlite3
-from datetime import datetime
+import threading
+import time
+from contextlib import contextmanager
+from datetime import date, datetime, timedelta
+from itertools import islice
+
+from timeoff_cache import LRUCache
+from timeoff_names import name_trigrams, normalize_name, trigram_similarity
+
+# Fuzzy name resolution: candidates need at least this trigram
+# similarity, and with resolve_employee(fuzzy=True) the best one is
+# picked without asking when it is at least NAME_RESOLVE_SIMILARITY and
+# ahead of the runner-up by NAME_RESOLVE_MARGIN.
+NAME_CANDIDATE_SIMILARITY = 0.2
+NAME_RESOLVE_SIMILARITY = 0.3
+NAME_RESOLVE_MARGIN = 0.15
+
+# Balance ledger events that set the balance (an employee's opening
+# balance); every other event (timeoff, correction, allowance) adds its
+# days to it
+BALANCE_SET_EVENTS = ("opening",)
+
+#-----------------------------------------------------------------------
+# Raised when a timeoff request is for more days than the employee has
+# left. It is a ValueError, like the other invalid request errors.
+#-----------------------------------------------------------------------
+class InsufficientBalanceError(ValueError):
+    def __init__(self, employee_name, requested_days, available_days):
+        super().__init__(
+            f"Not enough timeoff balance: {employee_name} requested "
+            f"{requested_days} days but has {available_days} days left")
+        self.employee_name = employee_name
+        self.requested_days = requested_days
+        self.available_days = available_days
+
+#-----------------------------------------------------------------------
+# Reads timeoff requests from a CSV stream with the header
+# employee_name,start_day,days and yields (name, start_day, days) rows
+# for TimeOffDatastore.add_timeoff_requests. Values are passed through
+# as text; the datastore validates each row.
+#-----------------------------------------------------------------------
+def read_timeoff_requests_csv(lines):
+    for record in csv.DictReader(lines):
+        yield (record.get("employee_name"), record.get("start_day"),
+               record.get("days"))
+
+#-----------------------------------------------------------------------
+# Reads an employee roster export (CSV with a header row, or JSON lines)
+# one record at a time, so memory use does not grow with the roster.
+# Each record has name, allowed_days and optionally consumed_days (days
+# taken before the import, only used for new employees) and
+# department. Yields (name, allowed_days, consumed_days, department), or
+# None for a bad record.
+#-----------------------------------------------------------------------
+def read_roster(roster_file, file_format="csv"):
+    if file_format == "csv":
+        records = csv.DictReader(roster_file)
+    elif file_format == "jsonl":
+        records = (_parse_json_line(line) for line in roster_file
+                   if line.strip())
+    else:
+        raise ValueError(f"Unknown roster format: {file_format}")
+
+    for record in records:
+        try:
+            name = record["name"].strip()
+            allowed = int(record["allowed_days"])
+            consumed = int(record.get("consumed_days") or 0)
+            department = (record.get("department") or "").strip() or None
+        except (TypeError, KeyError, ValueError, AttributeError):
+            yield None
+            continue
+        yield (name, allowed, consumed, department) if name else None
+
+def _parse_json_line(line):
+    try:
+        return json.loads(line)
+    except ValueError:
+        return None
+
+def _chunks(iterable, chunk_size):
+    iterator = iter(iterable)
+    while chunk := list(islice(iterator, chunk_size)):
+        yield chunk
+
+# History page cursors are "<start_day>|<id>" of the last row returned
+def _parse_cursor(cursor):
+    if not cursor:
+        return "", 0
+    try:
+        after_day, after_id = cursor.rsplit("|", 1)
+        return after_day, int(after_id)
+    except ValueError:
+        raise ValueError(f"Invalid cursor: {cursor}")
+
+# Balance of an employee from the ledger, counting only the events
+# recorded before the ISO day or timestamp `before`: the latest snapshot
+# plus the events after it. Returns (balance, number of events after the
+# snapshot); the balance is None if the employee had no events yet.
+def _ledger_balance(conn, employee_id, before=None):
+    before = before or "9999-12-31"
+    snapshot = conn.execute('''
+        SELECT ledger_id, balance FROM balance_snapshot
+        WHERE employee_id = ? AND recorded_at < ?
+        ORDER BY ledger_id DESC
+        LIMIT 1
+    ''', (employee_id, before)).fetchone()
+    after_id, balance = snapshot or (0, None)
+    tail = conn.execute('''
+        SELECT event_type, days FROM balance_ledger
+        WHERE employee_id = ? AND id > ? AND recorded_at < ?
+        ORDER BY id
+    ''', (employee_id, after_id, before)).fetchall()
+    for event_type, days in tail:
+        if event_type in BALANCE_SET_EVENTS:
+            balance = days
+        else:
+            balance = (balance or 0) + days
+    return balance, len(tail)
+
+# Employee name of a bulk request row, or None when the row is not a
+# (name, start_day, days) sequence with a name
+def _request_row_name(row):
+    if isinstance(row, (list, tuple)) and row and isinstance(row[0], str):
+        return row[0]
+    return None
+
+def _history_page(items, limit):
+    # The queries fetch one row more than limit to know if there is more
+    next_cursor = None
+    if len(items) > limit:
+        items = items[:limit]
+        next_cursor = f"{items[-1]['start_day']}|{items[-1]['id']}"
+    return {"items": items, "next_cursor": next_cursor}
 
 #-----------------------------------------------------------------------
 # Class that provides initialization and CRUD operations for a time-off
 # database using SQLite
+#
+# With the default ":memory:" path there is a single connection, and
+# every read and write goes through it under a lock.
+#
+# With a file path the database is opened in WAL mode: writes go through
+# one writer connection (serialized by a lock), and each thread gets
+# its own read-only connection, so concurrent balance lookups do not
+# wait for each other or for a writer.
+#
+# Balances are cached in a bounded LRU cache (balance_cache_size=0
+# disables it). add_timeoff_request writes the new balance through to
+# the cache, bulk imports and roster loads clear it. When several server
+# processes share one database file, set balance_cache_ttl so changes
+# made by the other processes are picked up.
+#
+# Balances are event sourced: every change is appended to the
+# balance_ledger table (opening balance, allowance change, timeoff
+# request, correction) and never updated. Every snapshot_interval events an
+# employee's balance is written to balance_snapshot, so a current or
+# "as of" balance is the latest snapshot plus a short tail of events.
+#
+# Employee names are indexed normalized and as trigrams, so the name
+# variants an LLM sends resolve to an employee id in one lookup (see
+# resolve_employee).
 #-----------------------------------------------------------------------
 class TimeOffDatastore:
+    # Secondary indexes: {name: (table, columns)}. They are created by
+    # create_indexes(), and dropped and rebuilt around a roster load.
+    # The history indexes serve the keyset paginated history queries;
+    # the rowid (timeoff_history.id) is implicitly the last column of
+    # every index, so ORDER BY start_day, id is read straight off them.
+    SECONDARY_INDEXES = {
+        "idx_timeoff_history_employee_day": ("timeoff_history",
+                                             "employee_id, start_day"),
+        "idx_timeoff_history_day": ("timeoff_history", "start_day"),
+        "idx_employee_department": ("employee", "department"),
+        "idx_employee_name_normalized": ("employee_name", "normalized_name"),
+        "idx_employee_trigram": ("employee_trigram", "trigram, employee_id"),
+        "idx_balance_ledger_employee": ("balance_ledger", "employee_id"),
+    }
+
+    # Tables a roster load writes to; their secondary indexes are dropped
+    # during the load and rebuilt once at the end
+    ROSTER_TABLES = ("employee", "employee_name", "employee_trigram")
+
     #Initialize the database connection, create tables and seed data
-    def __init__(self, db_path=":memory:"):
+    #(pass seed=False when the employees are loaded from a roster)
+    def __init__(self, db_path=":memory:", seed=True, balance_cache_size=4096,
+                 balance_cache_ttl=None, snapshot_interval=32):
         print("Initializing TimeOffDatastore")
-        self.conn = sqlite3.connect(db_path)
+        self.db_path = db_path
+        # Balance snapshot every snapshot_interval ledger events of an
+        # employee (0 disables snapshots, every read replays the ledger)
+        self.snapshot_interval = snapshot_interval
+        self.balance_cache = LRUCache(balance_cache_size, balance_cache_ttl) \
+            if balance_cache_size > 0 else None
+        # Employee ids never change for a name, so exact name -> id
+        # lookups are cached without expiry. Fuzzy resolutions are
+        # cleared whenever employees are added.
+        self._employee_ids = LRUCache(max(balance_cache_size, 1))
+        self._resolutions = LRUCache(max(balance_cache_size, 1))
+        # Bumped by every write, so a lookup that raced with a write does
+        # not cache the balance it read before the write committed
+        self._balance_version = 0
+        self._balance_cache_lock = threading.Lock()
+        self._lookup_lock = threading.Lock()
+        self._lookups = 0
+        self._lookup_seconds = 0.0
+        self.in_memory = db_path == ":memory:"
+        self._write_lock = threading.Lock()
+        self._local = threading.local()
+        self._readers = []
+        self._readers_lock = threading.Lock()
+
+        # The writer connection is shared by all threads (under the lock)
+        self.conn = sqlite3.connect(db_path, timeout=30,
+                                    check_same_thread=False)
+        if not self.in_memory:
+            self.conn.execute("PRAGMA journal_mode=WAL")
+            # In WAL mode NORMAL is still safe against corruption, it
+            # only skips the fsync on every commit.
+            self.conn.execute("PRAGMA synchronous=NORMAL")
         print("Creating tables and seeding data")
         self.create_tables()
-        self.seed_data()
+        self.create_indexes()
+        if seed:
+            self.seed_data()
+        self.index_employee_names()
+
+    # Per-thread read-only connection (file mode only)
+    def _reader_connection(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.db_path, timeout=30,
+                                   check_same_thread=False)
+            conn.execute("PRAGMA query_only=ON")
+            self._local.conn = conn
+            with self._readers_lock:
+                self._readers.append(conn)
+        return conn
+
+    # Connection to run read queries on
+    @contextmanager
+    def reading(self):
+        if self.in_memory:
+            with self._write_lock:
+                yield self.conn
+        else:
+            yield self._reader_connection()
+
+    # Connection to run write transactions on
+    @contextmanager
+    def writing(self):
+        with self._write_lock:
+            yield self.conn
+
+    # Close the writer and all reader connections
+    def close(self):
+        with self._readers_lock:
+            for conn in self._readers:
+                conn.close()
+            self._readers.clear()
+        with self._write_lock:
+            self.conn.close()
 
     # Create tables for employee and timeoff history
     def create_tables(self):
-        cursor = self.conn.cursor()
+        with self.writing() as conn:
+            cursor = conn.cursor()
 
-        # employee table tracks time off balance also
-        cursor.execute('''
-            CREATE TABLE IF NOT EXISTS employee (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                name TEXT UNIQUE NOT NULL,
-                allowed_days INTEGER NOT NULL,
-                consumed_days INTEGER NOT NULL DEFAULT 0
-            )
-        ''')
-
-        # timeoff_history table tracks time off requests
-        cursor.execute('''
-            CREATE TABLE IF NOT EXISTS timeoff_history (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                employee_id INTEGER NOT NULL,
-                start_day TEXT NOT NULL,
-                total_days INTEGER NOT NULL,
-                FOREIGN KEY(employee_id) REFERENCES employee(id)
-            )
-        ''')
-        self.conn.commit()
+            # employee table tracks time off balance also
+            # consumed_days is the days consumed when the employee was
+            # added (seeded or imported from a roster), i.e. part of the
+            # opening balance. Filed requests do not update it: they are
+            # in timeoff_history and balance_ledger, and the current
+            # balance is read from the ledger (see _ledger_balance).
+            cursor.execute('''
+                CREATE TABLE IF NOT EXISTS employee (
+                    id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    name TEXT UNIQUE NOT NULL,
+                    allowed_days INTEGER NOT NULL,
+                    consumed_days INTEGER NOT NULL DEFAULT 0,
+                    department TEXT
+                )
+            ''')
+            # Databases created before the department column existed
+            columns = [row[1] for row in cursor.execute(
+                "PRAGMA table_info(employee)")]
+            if "department" not in columns:
+                cursor.execute("ALTER TABLE employee ADD COLUMN department TEXT")
+
+            # Normalized name and name trigrams of every employee, for
+            # fuzzy name resolution (filled by index_employee_names)
+            cursor.execute('''
+                CREATE TABLE IF NOT EXISTS employee_name (
+                    employee_id INTEGER PRIMARY KEY,
+                    normalized_name TEXT NOT NULL,
+                    trigram_count INTEGER NOT NULL
+                )
+            ''')
+            # Trigram postings; idx_employee_trigram is a secondary index
+            # (rather than a primary key) so a roster load can build it in
+            # one sorted pass at the end
+            cursor.execute('''
+                CREATE TABLE IF NOT EXISTS employee_trigram (
+                    trigram TEXT NOT NULL,
+                    employee_id INTEGER NOT NULL
+                )
+            ''')
+
+            # timeoff_history table tracks time off requests
+            cursor.execute('''
+                CREATE TABLE IF NOT EXISTS timeoff_history (
+                    id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    employee_id INTEGER NOT NULL,
+                    start_day TEXT NOT NULL,
+                    total_days INTEGER NOT NULL,
+                    FOREIGN KEY(employee_id) REFERENCES employee(id)
+                )
+            ''')
+
+            # Interval index over the days every request covers,
+            # [start_day, start_day + total_days), as inclusive julian day
+            # numbers. The R*Tree finds the requests overlapping a date
+            # range without scanning the history. Triggers keep it in
+            # sync with timeoff_history, whichever code path writes it.
+            cursor.execute('''
+                CREATE VIRTUAL TABLE IF NOT EXISTS timeoff_interval
+                USING rtree_i32(id, first_day, last_day)
+            ''')
+            cursor.execute('''
+                CREATE TRIGGER IF NOT EXISTS timeoff_history_interval_insert
+                AFTER INSERT ON timeoff_history
+                BEGIN
+                    INSERT INTO timeoff_interval (id, first_day, last_day)
+                    VALUES (NEW.id,
+                            CAST(julianday(NEW.start_day) AS INTEGER),
+                            CAST(julianday(NEW.start_day) AS INTEGER)
+                                + NEW.total_days - 1);
+                END
+            ''')
+            cursor.execute('''
+                CREATE TRIGGER IF NOT EXISTS timeoff_history_interval_delete
+                AFTER DELETE ON timeoff_history
+                BEGIN
+                    DELETE FROM timeoff_interval WHERE id = OLD.id;
+                END
+            ''')
+            # Append-only ledger of balance changes. days is the new
+            # balance for the BALANCE_SET_EVENTS and the change (negative
+            # for timeoff) for the others; history_id links a timeoff
+            # event to its request. recorded_at is UTC.
+            cursor.execute('''
+                CREATE TABLE IF NOT EXISTS balance_ledger (
+                    id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    employee_id INTEGER NOT NULL,
+                    event_type TEXT NOT NULL,
+                    days INTEGER NOT NULL,
+                    history_id INTEGER,
+                    note TEXT,
+                    recorded_at TEXT NOT NULL
+                        DEFAULT (strftime('%Y-%m-%d %H:%M:%f', 'now')),
+                    FOREIGN KEY(employee_id) REFERENCES employee(id),
+                    FOREIGN KEY(history_id) REFERENCES timeoff_history(id)
+                )
+            ''')
+            for operation in ("UPDATE", "DELETE"):
+                cursor.execute(f'''
+                    CREATE TRIGGER IF NOT EXISTS balance_ledger_no_{operation.lower()}
+                    BEFORE {operation} ON balance_ledger
+                    BEGIN
+                        SELECT RAISE(ABORT, 'balance_ledger is append-only');
+                    END
+                ''')
+            # Balance of an employee after the ledger event ledger_id
+            cursor.execute('''
+                CREATE TABLE IF NOT EXISTS balance_snapshot (
+                    employee_id INTEGER NOT NULL,
+                    ledger_id INTEGER NOT NULL,
+                    balance INTEGER NOT NULL,
+                    recorded_at TEXT NOT NULL,
+                    PRIMARY KEY (employee_id, ledger_id)
+                ) WITHOUT ROWID
+            ''')
+            # New employees set the balance, and changes to their allowed
+            # or consumed days (e.g. a roster import) adjust it by the
+            # difference, whichever code path writes the employee. An
+            # adjustment keeps the timeoff events before it, and updates
+            # that do not change the balance record nothing.
+            cursor.execute('''
+                CREATE TRIGGER IF NOT EXISTS employee_ledger_insert
+                AFTER INSERT ON employee
+                BEGIN
+                    INSERT INTO balance_ledger (employee_id, event_type, days)
+                    VALUES (NEW.id, 'opening',
+                            NEW.allowed_days - NEW.consumed_days);
+                END
+            ''')
+            cursor.execute('''
+                CREATE TRIGGER IF NOT EXISTS employee_ledger_update
+                AFTER UPDATE OF allowed_days, consumed_days ON employee
+                WHEN NEW.allowed_days - NEW.consumed_days
+                     IS NOT OLD.allowed_days - OLD.consumed_days
+                BEGIN
+                    INSERT INTO balance_ledger (employee_id, event_type, days)
+                    VALUES (NEW.id, 'allowance',
+                            (NEW.allowed_days - NEW.consumed_days)
+                            - (OLD.allowed_days - OLD.consumed_days));
+                END
+            ''')
+            # Databases created before the ledger existed: their consumed
+            # days include the filed requests, so the opening balance is
+            # the current balance
+            cursor.execute('''
+                INSERT INTO balance_ledger (employee_id, event_type, days)
+                SELECT id, 'opening', allowed_days - consumed_days
+                FROM employee
+                WHERE id NOT IN (SELECT employee_id FROM balance_ledger)
+                ORDER BY id
+            ''')
+
+            # Backfill history written before the interval index existed
+            history_count = cursor.execute(
+                "SELECT count(*) FROM timeoff_history").fetchone()[0]
+            interval_count = cursor.execute(
+                "SELECT count(*) FROM timeoff_interval").fetchone()[0]
+            if history_count != interval_count:
+                cursor.execute("DELETE FROM timeoff_interval")
+                cursor.execute('''
+                    INSERT INTO timeoff_interval (id, first_day, last_day)
+                    SELECT id, CAST(julianday(start_day) AS INTEGER),
+                           CAST(julianday(start_day) AS INTEGER) + total_days - 1
+                    FROM timeoff_history
+                ''')
+            conn.commit()
 
     # Seed the database with initial data
     def seed_data(self):
-        cursor = self.conn.cursor()
-        # Insert sample employees if not already present
-        employees = [
-            ("Alice", 20, 5),
-            ("Bob", 15, 3),
-            ("Charlie", 25, 10)
-        ]
-        for name, allowed, consumed in employees:
-            cursor.execute('''
-                INSERT OR IGNORE INTO employee (name, allowed_days, consumed_days)
-                VALUES (?, ?, ?)
-            ''', (name, allowed, consumed))
-        self.conn.commit()
+        with self.writing() as conn:
+            cursor = conn.cursor()
+            # Insert sample employees if not already present
+            employees = [
+                ("Alice", 20, 5, "Engineering"),
+                ("Bob", 15, 3, "Engineering"),
+                ("Charlie", 25, 10, "Sales")
+            ]
+            cursor.executemany('''
+                INSERT OR IGNORE INTO employee
+                    (name, allowed_days, consumed_days, department)
+                VALUES (?, ?, ?, ?)
+            ''', employees)
+            conn.commit()
+
+    # Create the secondary indexes (optionally only those of one table)
+    def create_indexes(self, table=None):
+        with self.writing() as conn:
+            for name, (index_table, columns) in self.SECONDARY_INDEXES.items():
+                if table in (None, index_table):
+                    conn.execute(f"CREATE INDEX IF NOT EXISTS {name} "
+                                 f"ON {index_table}({columns})")
+            conn.commit()
+
+    # Drop the secondary indexes (optionally only those of one table)
+    def drop_indexes(self, table=None):
+        with self.writing() as conn:
+            for name, (index_table, _) in self.SECONDARY_INDEXES.items():
+                if table in (None, index_table):
+                    conn.execute(f"DROP INDEX IF EXISTS {name}")
+            conn.commit()
+
+    # Add the names of employees that are not in the name index yet,
+    # chunk_size employees per transaction. Returns how many were added.
+    def index_employee_names(self, chunk_size=5000):
+        last_id = indexed = 0
+        while True:
+            with self.writing() as conn:
+                rows = conn.execute('''
+                    SELECT e.id, e.name FROM employee e
+                    LEFT JOIN employee_name n ON n.employee_id = e.id
+                    WHERE e.id > ? AND n.employee_id IS NULL
+                    ORDER BY e.id
+                    LIMIT ?
+                ''', (last_id, chunk_size)).fetchall()
+                if not rows:
+                    break
+                names, trigrams = [], []
+                for employee_id, name in rows:
+                    normalized = normalize_name(name)
+                    grams = name_trigrams(normalized)
+                    names.append((employee_id, normalized, len(grams)))
+                    trigrams.extend((gram, employee_id) for gram in grams)
+                conn.executemany('''
+                    INSERT OR REPLACE INTO employee_name
+                        (employee_id, normalized_name, trigram_count)
+                    VALUES (?, ?, ?)
+                ''', names)
+                conn.executemany('''
+                    INSERT INTO employee_trigram (trigram, employee_id)
+                    VALUES (?, ?)
+                ''', trigrams)
+                conn.commit()
+            last_id = rows[-1][0]
+            indexed += len(rows)
+        if indexed:
+            # New names can make an earlier resolution ambiguous
+            self._resolutions.clear()
+        return indexed
+
+    # Resolve a name as typed (or as sent by an LLM) to an employee
+    # An exact or normalized name match (case, spaces, accents and
+    # punctuation ignored) resolves directly through an index. Otherwise
+    # the employees sharing the most name trigrams are ranked by
+    # similarity. By default a near miss ("Charles" for Charlie) is
+    # "not_found" with the ranked candidates, so it never resolves to
+    # someone else; with fuzzy=True a clear best match is resolved.
+    # Returns {"status": "resolved", "ambiguous" or
+    # "not_found", "employee_id", "employee_name", "candidates"}, where
+    # candidates are the ranked alternatives when it is not resolved.
+    def resolve_employee(self, employee_name, limit=5, fuzzy=False):
+        result = self._resolutions.get((employee_name, fuzzy))
+        if result is not None:
+            return result
+
+        result = {"status": "not_found", "employee_id": None,
+                  "employee_name": None, "candidates": []}
+        normalized = normalize_name(employee_name)
+        if normalized:
+            with self.reading() as conn:
+                candidates = [(employee_id, name, 1.0) for employee_id, name in
+                              conn.execute('''
+                    SELECT e.id, e.name FROM employee_name n
+                    JOIN employee e ON e.id = n.employee_id
+                    WHERE n.normalized_name = ?
+                    ORDER BY e.id
+                    LIMIT ?
+                ''', (normalized, limit))]
+                if not candidates:
+                    candidates = self._similar_names(conn, normalized, limit)
+
+            exact = bool(candidates) and candidates[0][2] == 1.0
+            if len(candidates) == 1 and exact or \
+                    fuzzy and candidates and \
+                    candidates[0][2] >= NAME_RESOLVE_SIMILARITY and \
+                    (len(candidates) == 1
+                     or candidates[0][2] - candidates[1][2] >= NAME_RESOLVE_MARGIN):
+                result["status"] = "resolved"
+                result["employee_id"], result["employee_name"], _ = candidates[0]
+            elif candidates:
+                result["status"] = "ambiguous" if fuzzy or exact else "not_found"
+                result["candidates"] = [
+                    {"employee_id": employee_id, "employee_name": name,
+                     "similarity": round(similarity, 3)}
+                    for employee_id, name, similarity in candidates]
+        self._resolutions.put((employee_name, fuzzy), result)
+        return result
+
+    def _similar_names(self, conn, normalized, limit):
+        grams = sorted(name_trigrams(normalized))
+        # An employee sharing fewer trigrams than this cannot reach the
+        # candidate similarity, so it is filtered out in the query
+        min_shared = max(1, int(NAME_CANDIDATE_SIMILARITY * len(grams)))
+        rows = conn.execute(f'''
+            SELECT s.employee_id, e.name, n.trigram_count, s.shared
+            FROM (SELECT employee_id, count(*) AS shared
+                  FROM employee_trigram
+                  WHERE trigram IN ({",".join("?" * len(grams))})
+                  GROUP BY employee_id
+                  HAVING count(*) >= ?) s
+            JOIN employee_name n ON n.employee_id = s.employee_id
+            JOIN employee e ON e.id = s.employee_id
+        ''', grams + [min_shared]).fetchall()
+        ranked = sorted(
+            ((employee_id, name,
+              trigram_similarity(shared, len(grams), trigram_count))
+             for employee_id, name, trigram_count, shared in rows),
+            key=lambda candidate: (-candidate[2], candidate[0]))
+        return [candidate for candidate in ranked[:limit]
+                if candidate[2] >= NAME_CANDIDATE_SIMILARITY]
+
+    # Id of the employee with exactly this name, or None
+    def get_employee_id(self, employee_name):
+        employee_id = self._employee_ids.get(employee_name)
+        if employee_id is None:
+            with self.reading() as conn:
+                row = conn.execute('''
+                    SELECT id FROM employee WHERE name = ?
+                ''', (employee_name,)).fetchone()
+            if row:
+                employee_id = row[0]
+                self._employee_ids.put(employee_name, employee_id)
+        return employee_id
+
+    # True if there is at least one employee
+    def has_employees(self):
+        with self.reading() as conn:
+            return conn.execute(
+                "SELECT 1 FROM employee LIMIT 1").fetchone() is not None
+
+    # Load (insert or update) employees from a roster export
+    # New employees get their allowed and consumed days from the roster.
+    # For existing employees only allowed_days and the department are
+    # updated: their consumption is built up from the filed requests, so
+    # the roster's consumed_days (an older export) must not overwrite it.
+    # Rows that change nothing are not written at all.
+    # The file is streamed in chunks of chunk_size records, each upserted
+    # with one executemany, so a roster of any size loads with flat
+    # memory use. New names are then added to the name index. The
+    # secondary indexes of the employee and name index tables are dropped
+    # for the load and rebuilt once at the end, which is much faster than
+    # updating them row by row. Returns the load stats.
+    def load_roster(self, path, file_format=None, chunk_size=5000):
+        if file_format is None:
+            file_format = "jsonl" if path.lower().endswith(
+                (".jsonl", ".ndjson")) else "csv"
+
+        start = time.perf_counter()
+        loaded = skipped = 0
+        for table in self.ROSTER_TABLES:
+            self.drop_indexes(table)
+        try:
+            with open(path, newline="", encoding="utf-8") as roster_file:
+                for chunk in _chunks(read_roster(roster_file, file_format),
+                                     chunk_size):
+                    rows = [row for row in chunk if row is not None]
+                    skipped += len(chunk) - len(rows)
+                    with self.writing() as conn:
+                        conn.executemany('''
+                            INSERT INTO employee
+                                (name, allowed_days, consumed_days, department)
+                            VALUES (?, ?, ?, ?)
+                            ON CONFLICT(name) DO UPDATE SET
+                                allowed_days = excluded.allowed_days,
+                                department = coalesce(excluded.department,
+                                                      employee.department)
+                            WHERE employee.allowed_days
+                                      IS NOT excluded.allowed_days
+                               OR employee.department IS NOT
+                                      coalesce(excluded.department,
+                                               employee.department)
+                        ''', rows)
+                        conn.commit()
+                    loaded += len(rows)
+            self.index_employee_names()
+        finally:
+            for table in self.ROSTER_TABLES:
+                self.create_indexes(table)
+            self._clear_balance_cache()
+
+        seconds = time.perf_counter() - start
+        stats = {"rows": loaded, "skipped": skipped,
+                 "seconds": round(seconds, 3),
+                 "rows_per_sec": round(loaded / seconds) if seconds else 0}
+        print(f"Loaded {loaded} employees from {path} "
+              f"({skipped} skipped) in {seconds:.2f}s, "
+              f"{stats['rows_per_sec']} rows/sec")
+        return stats
 
     # Get timeoff balance for a specific employee
     def get_timeoff_balance(self, employee_name):
-        cursor = self.conn.cursor()
-        cursor.execute('''
-            SELECT allowed_days, consumed_days FROM employee WHERE name = ?
-        ''', (employee_name,))
-        row = cursor.fetchone()
-        print("Row fetched: ", row)
-        if row:
-            allowed, consumed = row
-            return allowed - consumed
-        else:
+        employee_id = self.get_employee_id(employee_name)
+        if employee_id is None:
+            print("Employee not found: ", employee_name)
             return None
+        return self.get_timeoff_balance_by_id(employee_id)
 
-    # Add a timeoff request for an employee
-    # This function checks if the employee has enough timeoff balance
-    # and updates the timeoff history and employee's consumed days
-    def add_timeoff_request(self, employee_name, start_day, total_days):
-        cursor = self.conn.cursor()
+    # Get timeoff balance for an employee id (None if there is none)
+    def get_timeoff_balance_by_id(self, employee_id):
+        start = time.perf_counter()
+        balance = self.balance_cache.get(employee_id) \
+            if self.balance_cache is not None else None
+        if balance is None:
+            version = self._balance_version
+            with self.reading() as conn:
+                balance, _ = _ledger_balance(conn, employee_id)
+            print("Balance fetched: ", balance)
+            if balance is not None:
+                with self._balance_cache_lock:
+                    if version == self._balance_version \
+                            and self.balance_cache is not None:
+                        self.balance_cache.put(employee_id, balance)
+        with self._lookup_lock:
+            self._lookups += 1
+            self._lookup_seconds += time.perf_counter() - start
+        return balance
+
+    # Get the balance an employee had at the end of as_of_day (an ISO
+    # date, UTC), or None if the employee did not exist yet
+    def get_timeoff_balance_as_of(self, employee_name, as_of_day):
+        try:
+            before = (date.fromisoformat(as_of_day) + timedelta(days=1)).isoformat()
+        except (TypeError, ValueError):
+            raise ValueError(f"Invalid day: {as_of_day} (use YYYY-MM-DD)")
+        employee_id = self.get_employee_id(employee_name)
+        if employee_id is None:
+            return None
+        with self.reading() as conn:
+            balance, _ = _ledger_balance(conn, employee_id, before)
+        return balance
 
-        # Find employee ID and current consumed_days
+    # Get one page of an employee's balance ledger, oldest first. Pass the
+    # returned next_cursor (the last event id) to get the next page.
+    # Returns None if the employee does not exist.
+    def get_balance_ledger(self, employee_name, limit=50, cursor=None):
+        employee_id = self.get_employee_id(employee_name)
+        if employee_id is None:
+            return None
+        try:
+            after_id = int(cursor or 0)
+        except ValueError:
+            raise ValueError(f"Invalid cursor: {cursor}")
+        with self.reading() as conn:
+            rows = conn.execute('''
+                SELECT id, event_type, days, history_id, note, recorded_at
+                FROM balance_ledger
+                WHERE employee_id = ? AND id > ?
+                ORDER BY id
+                LIMIT ?
+            ''', (employee_id, after_id, limit + 1)).fetchall()
+        items = [{"id": ledger_id, "event_type": event_type, "days": days,
+                  "history_id": history_id, "note": note,
+                  "recorded_at": recorded_at}
+                 for ledger_id, event_type, days, history_id, note, recorded_at
+                 in rows[:limit]]
+        return {"items": items,
+                "next_cursor": str(items[-1]["id"]) if len(rows) > limit else None}
+
+    # Append a balance event inside the caller's write transaction, and
+    # snapshot the new balance when the employee has snapshot_interval
+    # events since the last snapshot. tail_length is the number of events
+    # after the last snapshot, as returned by _ledger_balance.
+    def _append_ledger(self, cursor, employee_id, event_type, days, balance,
+                       tail_length, history_id=None, note=None):
         cursor.execute('''
-            SELECT id, allowed_days, consumed_days FROM employee WHERE name = ?
-        ''', (employee_name,))
-        row = cursor.fetchone()
-        print("Row fetched: ", row)
-        if not row:
+            INSERT INTO balance_ledger
+                (employee_id, event_type, days, history_id, note)
+            VALUES (?, ?, ?, ?, ?)
+            RETURNING id, recorded_at
+        ''', (employee_id, event_type, days, history_id, note))
+        ledger_id, recorded_at = cursor.fetchone()
+        if self.snapshot_interval and tail_length + 1 >= self.snapshot_interval:
+            cursor.execute('''
+                INSERT INTO balance_snapshot
+                    (employee_id, ledger_id, balance, recorded_at)
+                VALUES (?, ?, ?, ?)
+            ''', (employee_id, ledger_id, balance, recorded_at))
+        return ledger_id
+
+    # Add a correction of days (positive or negative) to an employee's
+    # balance, e.g. to give back days of a cancelled request. Returns the
+    # new balance.
+    def add_balance_correction(self, employee_name, days, note=None):
+        employee_id = self.get_employee_id(employee_name)
+        if employee_id is None:
             raise ValueError("Employee not found")
-        emp_id, allowed, consumed = row
-        if consumed + total_days > allowed:
-            raise ValueError("Not enough timeoff balance")
+        if not days:
+            raise ValueError("Correction must change the balance")
+        with self.writing() as conn:
+            cursor = conn.cursor()
+            cursor.execute("BEGIN IMMEDIATE")
+            try:
+                balance, tail_length = _ledger_balance(cursor, employee_id)
+                if balance + days < 0:
+                    raise InsufficientBalanceError(employee_name, -days, balance)
+                balance += days
+                self._append_ledger(cursor, employee_id, "correction", days,
+                                    balance, tail_length, note=note)
+                conn.commit()
+            except BaseException:
+                conn.rollback()
+                raise
+            self._cache_balance(employee_id, balance)
+        return balance
 
-        # Insert into timeoff_history
-        cursor.execute('''
-            INSERT INTO timeoff_history (employee_id, start_day, total_days)
-            VALUES (?, ?, ?)
-        ''', (emp_id, start_day, total_days))
+    # Replay the whole ledger and rewrite the balance snapshots (e.g.
+    # after changing snapshot_interval). Returns the number of snapshots.
+    def rebuild_balance_snapshots(self):
+        with self.writing() as conn:
+            cursor = conn.cursor()
+            cursor.execute("BEGIN IMMEDIATE")
+            try:
+                snapshots = []
+                employee_id, balance, count = None, None, 0
+                for event_employee_id, ledger_id, event_type, days, recorded_at \
+                        in conn.execute('''
+                            SELECT employee_id, id, event_type, days, recorded_at
+                            FROM balance_ledger
+                            ORDER BY employee_id, id
+                        '''):
+                    if event_employee_id != employee_id:
+                        employee_id, balance, count = event_employee_id, None, 0
+                    if event_type in BALANCE_SET_EVENTS:
+                        balance = days
+                    else:
+                        balance = (balance or 0) + days
+                    count += 1
+                    if self.snapshot_interval and count % self.snapshot_interval == 0:
+                        snapshots.append((employee_id, ledger_id, balance,
+                                          recorded_at))
+                cursor.execute("DELETE FROM balance_snapshot")
+                cursor.executemany('''
+                    INSERT INTO balance_snapshot
+                        (employee_id, ledger_id, balance, recorded_at)
+                    VALUES (?, ?, ?, ?)
+                ''', snapshots)
+                conn.commit()
+            except BaseException:
+                conn.rollback()
+                raise
+            finally:
+                self._clear_balance_cache()
+        return len(snapshots)
 
-        # Update consumed_days
-        cursor.execute('''
-            UPDATE employee SET consumed_days = consumed_days + ?
-            WHERE id = ?
-        ''', (total_days, emp_id))
-        self.conn.commit()
+    # Called by writers after their commit
+    def _cache_balance(self, employee_id, balance):
+        with self._balance_cache_lock:
+            self._balance_version += 1
+            if self.balance_cache is not None:
+                self.balance_cache.put(employee_id, balance)
+
+    def _clear_balance_cache(self):
+        with self._balance_cache_lock:
+            self._balance_version += 1
+            if self.balance_cache is not None:
+                self.balance_cache.clear()
+
+    # Balance cache hit/miss counters and balance lookup latency
+    def get_balance_metrics(self):
+        with self._lookup_lock:
+            lookups, seconds = self._lookups, self._lookup_seconds
+        return {
+            "cache": self.balance_cache.stats()
+            if self.balance_cache is not None else None,
+            "lookups": lookups,
+            "avg_lookup_ms": round(seconds * 1000 / lookups, 4) if lookups else 0.0,
+        }
+
+    # Get one page of an employee's timeoff history, oldest first
+    # Optionally limited to start days in [start_day, end_day] (ISO
+    # dates, inclusive). Pages are keyset paginated: pass the returned
+    # next_cursor to get the next page, so every page is one index range
+    # scan no matter how deep into the history it is. Returns None if the
+    # employee does not exist.
+    def get_timeoff_history(self, employee_name, start_day=None, end_day=None,
+                            limit=50, cursor=None):
+        with self.reading() as conn:
+            row = conn.execute('''
+                SELECT id FROM employee WHERE name = ?
+            ''', (employee_name,)).fetchone()
+            if not row:
+                return None
+            after_day, after_id = _parse_cursor(cursor)
+            rows = conn.execute('''
+                SELECT id, start_day, total_days FROM timeoff_history
+                WHERE employee_id = ?
+                  AND start_day >= ? AND start_day <= ?
+                  AND (start_day, id) > (?, ?)
+                ORDER BY start_day, id
+                LIMIT ?
+            ''', (row[0], max(start_day or "", after_day),
+                  end_day or "9999-12-31", after_day, after_id,
+                  limit + 1)).fetchall()
+        return _history_page(
+            [{"id": history_id, "start_day": day, "total_days": days}
+             for history_id, day, days in rows], limit)
+
+    # Get one page of the timeoff taken by all employees with a start
+    # day in [start_day, end_day] (ISO dates, inclusive), keyset
+    # paginated like get_timeoff_history
+    def get_timeoff_in_range(self, start_day, end_day, limit=50, cursor=None):
+        # The cursor day is also used as the lower bound of the index
+        # range, so a deep page does not rescan the earlier days.
+        after_day, after_id = _parse_cursor(cursor)
+        with self.reading() as conn:
+            rows = conn.execute('''
+                SELECT h.id, e.name, h.start_day, h.total_days
+                FROM timeoff_history h JOIN employee e ON e.id = h.employee_id
+                WHERE h.start_day >= ? AND h.start_day <= ?
+                  AND (h.start_day, h.id) > (?, ?)
+                ORDER BY h.start_day, h.id
+                LIMIT ?
+            ''', (max(start_day, after_day), end_day, after_day, after_id,
+                  limit + 1)).fetchall()
+        return _history_page(
+            [{"id": history_id, "employee_name": name, "start_day": day,
+              "total_days": days} for history_id, name, day, days in rows],
+            limit)
+
+    # Find who is out on any day in [start_day, end_day] (ISO dates,
+    # inclusive), optionally only in one department. With employee_name,
+    # the department defaults to that employee's and the employee is left
+    # out ("who else is out that week"). The overlap query is an R*Tree
+    # search, so it does not scan the history. Returns None if
+    # employee_name does not exist.
+    def get_coverage(self, start_day, end_day, department=None,
+                     employee_name=None):
+        with self.reading() as conn:
+            employee_id = None
+            if employee_name is not None:
+                row = conn.execute('''
+                    SELECT id, department FROM employee WHERE name = ?
+                ''', (employee_name,)).fetchone()
+                if not row:
+                    return None
+                employee_id = row[0]
+                department = department or row[1]
+
+            # Only add the filters that apply, so the planner can pick the
+            # department index when there is a department filter
+            filters, params = "", [end_day, start_day]
+            if department is not None:
+                filters += " AND e.department = ?"
+                params.append(department)
+            if employee_id is not None:
+                filters += " AND e.id != ?"
+                params.append(employee_id)
+            rows = conn.execute(f'''
+                SELECT e.name, e.department, h.start_day, h.total_days,
+                       date(h.start_day, '+' || (h.total_days - 1) || ' days')
+                FROM timeoff_interval i
+                JOIN timeoff_history h ON h.id = i.id
+                JOIN employee e ON e.id = h.employee_id
+                WHERE i.first_day <= CAST(julianday(?) AS INTEGER)
+                  AND i.last_day >= CAST(julianday(?) AS INTEGER){filters}
+                ORDER BY h.start_day, e.name
+            ''', params).fetchall()
+        return {"start_day": start_day, "end_day": end_day,
+                "department": department,
+                "out": [{"employee_name": name, "department": dept,
+                         "start_day": first, "end_day": last,
+                         "total_days": days}
+                        for name, dept, first, days, last in rows]}
+
+    # Add a timeoff request for an employee
+    def add_timeoff_request(self, employee_name, start_day, total_days):
+        employee_id = self.get_employee_id(employee_name)
+        if employee_id is None:
+            raise ValueError("Employee not found")
+        return self.add_timeoff_request_by_id(employee_id, start_day, total_days)
+
+    # Add a timeoff request for an employee id
+    # The balance check and the appended request and ledger event are
+    # one BEGIN IMMEDIATE transaction, which takes the database write
+    # lock up front, so two writers (threads or server processes) can
+    # never both pass the check.
+    def add_timeoff_request_by_id(self, employee_id, start_day, total_days):
+        if total_days <= 0:
+            raise ValueError("Number of days must be positive")
+        try:
+            start_day = date.fromisoformat(start_day).isoformat()
+        except (TypeError, ValueError):
+            raise ValueError(f"Invalid start day: {start_day} (use YYYY-MM-DD)")
+
+        with self.writing() as conn:
+            cursor = conn.cursor()
+            cursor.execute("BEGIN IMMEDIATE")
+            try:
+                balance, tail_length = _ledger_balance(cursor, employee_id)
+                print("Balance fetched: ", balance)
+                if balance is None:
+                    raise ValueError("Employee not found")
+                if total_days > balance:
+                    # Only the rejection path looks up the name
+                    cursor.execute('''
+                        SELECT name FROM employee WHERE id = ?
+                    ''', (employee_id,))
+                    self._cache_balance(employee_id, balance)
+                    raise InsufficientBalanceError(
+                        cursor.fetchone()[0], total_days, balance)
+
+                # Insert into timeoff_history
+                cursor.execute('''
+                    INSERT INTO timeoff_history (employee_id, start_day, total_days)
+                    VALUES (?, ?, ?)
+                ''', (employee_id, start_day, total_days))
+                balance -= total_days
+                self._append_ledger(cursor, employee_id, "timeoff", -total_days,
+                                    balance, tail_length,
+                                    history_id=cursor.lastrowid)
+                conn.commit()
+            except BaseException:
+                conn.rollback()
+                raise
+            # Write the new balance through, after the commit succeeded
+            self._cache_balance(employee_id, balance)
         return "Successfully added timeoff request"
 
+    # Add many timeoff requests in one transaction
+    # requests is an iterable of (employee_name, start_day, total_days).
+    # Balances are read once for every employee in the batch and checked
+    # in aggregate (in row order), then all accepted rows and their
+    # ledger events are written with executemany. Rows that are invalid
+    # (including rows that are not sequences) or exceed the remaining
+    # balance are skipped. Returns one {"row", "employee_name", "status",
+    # "reason"} result per input row.
+    def add_timeoff_requests(self, requests, lookup_batch_size=500):
+        rows = list(requests)
+        results = []
+        with self.writing() as conn:
+            cursor = conn.cursor()
+            cursor.execute("BEGIN IMMEDIATE")
+            try:
+                # Current balance of every employee named in the batch
+                names = list({name for name in map(_request_row_name, rows)
+                              if name})
+                employees = {}
+                for start in range(0, len(names), lookup_batch_size):
+                    batch = names[start:start + lookup_batch_size]
+                    cursor.execute(f'''
+                        SELECT name, id FROM employee
+                        WHERE name IN ({",".join("?" * len(batch))})
+                    ''', batch)
+                    employees.update((name, [emp_id]) for name, emp_id in cursor)
+                # [id, balance, events since the last snapshot]
+                for employee in employees.values():
+                    employee.extend(_ledger_balance(cursor, employee[0]))
+
+                history_rows = []
+                filed = set()
+                for row_number, row in enumerate(rows, start=1):
+                    status, reason = "accepted", None
+                    try:
+                        employee_name, start_day, total_days = row
+                        if not isinstance(employee_name, str):
+                            raise TypeError("employee_name must be a string")
+                        total_days = int(total_days)
+                        start_day = date.fromisoformat(start_day.strip()).isoformat()
+                    except (TypeError, ValueError, AttributeError):
+                        employee_name = _request_row_name(row)
+                        status, reason = "rejected", "Invalid row"
+                    else:
+                        employee = employees.get(employee_name)
+                        if employee is None:
+                            status, reason = "rejected", "Employee not found"
+                        elif total_days <= 0:
+                            status, reason = "rejected", "Number of days must be positive"
+                        elif total_days > employee[1]:
+                            status, reason = "rejected", str(InsufficientBalanceError(
+                                employee_name, total_days, employee[1]))
+                        else:
+                            employee[1] -= total_days
+                            employee[2] += 1
+                            filed.add(employee[0])
+                            history_rows.append(
+                                (employee[0], start_day, total_days))
+                    results.append({"row": row_number,
+                                    "employee_name": employee_name,
+                                    "status": status,
+                                    "reason": reason})
+
+                last_history_id = cursor.execute(
+                    "SELECT coalesce(max(id), 0) FROM timeoff_history").fetchone()[0]
+                cursor.executemany('''
+                    INSERT INTO timeoff_history (employee_id, start_day, total_days)
+                    VALUES (?, ?, ?)
+                ''', history_rows)
+                cursor.execute('''
+                    INSERT INTO balance_ledger
+                        (employee_id, event_type, days, history_id)
+                    SELECT employee_id, 'timeoff', -total_days, id
+                    FROM timeoff_history WHERE id > ?
+                    ORDER BY id
+                ''', (last_history_id,))
+                # Snapshot the employees whose tail reached the interval
+                if self.snapshot_interval:
+                    cursor.executemany('''
+                        INSERT INTO balance_snapshot
+                            (employee_id, ledger_id, balance, recorded_at)
+                        SELECT employee_id, id, ?, recorded_at
+                        FROM balance_ledger WHERE employee_id = ?
+                        ORDER BY id DESC
+                        LIMIT 1
+                    ''', [(employee[1], employee[0])
+                          for employee in employees.values()
+                          if employee[0] in filed
+                          and employee[2] >= self.snapshot_interval])
+                conn.commit()
+            except BaseException:
+                conn.rollback()
+                raise
+            finally:
+                self._clear_balance_cache()
+        return results
+
 # Example usage:
 if __name__ == "__main__":
     ds = TimeOffDatastore()
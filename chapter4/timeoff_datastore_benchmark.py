@@ -0,0 +1,205 @@
+import argparse
+import contextlib
+import json
+import os
+import random
+import tempfile
+import time
+import tracemalloc
+from concurrent.futures import ThreadPoolExecutor
+
+from timeoff_datastore import TimeOffDatastore
+
+# -----------------------------------------------------------------------
+# Balance lookup throughput of the TimeOffDatastore.
+#
+# Runs get_timeoff_balance from 1, 8 and 32 concurrent client threads
+# against the in-memory datastore (one shared connection), the file
+# backed WAL datastore (one read connection per thread) and the WAL
+# datastore with the balance cache, and reports lookups/sec.
+#
+# It then imports --bulk-rows timeoff requests with add_timeoff_requests
+# (one transaction) and compares that with filing a sample of the same
+# rows one by one through add_timeoff_request, and times get_coverage
+# ("who is out this week") over the imported history against a full
+# scan of timeoff_history.
+#
+# It then files --ledger-events requests for one employee and times an
+# uncached balance lookup (latest snapshot plus tail of ledger events)
+# with balance snapshots and without (a replay of the whole ledger).
+#
+# Finally it loads a generated --roster-rows employee roster from CSV and
+# from JSON lines with load_roster, and reports rows/sec and the peak
+# Python memory of the load.
+#
+# Usage: python chapter4/timeoff_datastore_benchmark.py --employees 10000
+# -----------------------------------------------------------------------
+
+
+def seed_employees(datastore, count):
+    with datastore.writing() as conn:
+        conn.executemany('''
+            INSERT OR IGNORE INTO employee
+                (name, allowed_days, consumed_days, department)
+            VALUES (?, ?, ?, ?)
+        ''', ((f"Employee{i}", 40, i % 20, f"Dept{i % 50}")
+              for i in range(count)))
+        conn.commit()
+
+
+def run_clients(datastore, names, clients, lookups_per_client):
+    def client(seed):
+        rng = random.Random(seed)
+        for _ in range(lookups_per_client):
+            datastore.get_timeoff_balance(rng.choice(names))
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=clients) as pool:
+        list(pool.map(client, range(clients)))
+    return clients * lookups_per_client / (time.perf_counter() - start)
+
+
+def run_bulk_import(datastore, names, rows, sample=2000):
+    requests = [(names[i % len(names)],
+                 f"2025-{i % 12 + 1:02d}-{i % 28 + 1:02d}", 1 + i % 3)
+                for i in range(rows)]
+    start = time.perf_counter()
+    results = datastore.add_timeoff_requests(requests)
+    bulk_per_sec = rows / (time.perf_counter() - start)
+    accepted = sum(result["status"] == "accepted" for result in results)
+
+    start = time.perf_counter()
+    for request in requests[:sample]:
+        try:
+            datastore.add_timeoff_request(*request)
+        except ValueError:
+            pass
+    single_per_sec = min(sample, rows) / (time.perf_counter() - start)
+    return bulk_per_sec, single_per_sec, accepted
+
+
+def run_coverage(datastore, queries=200):
+    weeks = [(f"2025-{i % 12 + 1:02d}-{i % 21 + 1:02d}",
+              f"2025-{i % 12 + 1:02d}-{i % 21 + 7:02d}") for i in range(queries)]
+    start = time.perf_counter()
+    for first, last in weeks:
+        datastore.get_coverage(first, last)
+    indexed_ms = (time.perf_counter() - start) * 1000 / queries
+
+    # The same overlap query as a scan of timeoff_history
+    start = time.perf_counter()
+    with datastore.reading() as conn:
+        for first, last in weeks:
+            conn.execute('''
+                SELECT e.name, h.start_day FROM timeoff_history h NOT INDEXED
+                JOIN employee e ON e.id = h.employee_id
+                WHERE julianday(h.start_day) <= julianday(?)
+                  AND julianday(h.start_day) + h.total_days - 1 >= julianday(?)
+                ORDER BY h.start_day, e.name
+            ''', (last, first)).fetchall()
+    scan_ms = (time.perf_counter() - start) * 1000 / queries
+    return indexed_ms, scan_ms
+
+
+def run_ledger(tmp_dir, events, lookups=2000):
+    for snapshot_interval in (32, 0):
+        with open(os.devnull, "w") as devnull, \
+                contextlib.redirect_stdout(devnull):
+            datastore = TimeOffDatastore(
+                os.path.join(tmp_dir, f"ledger-{snapshot_interval}.db"),
+                seed=False, balance_cache_size=0,
+                snapshot_interval=snapshot_interval)
+            with datastore.writing() as conn:
+                conn.execute('''
+                    INSERT INTO employee (name, allowed_days) VALUES (?, ?)
+                ''', ("Ledger", events))
+                conn.commit()
+            datastore.add_timeoff_requests(
+                ("Ledger", f"2025-{i % 12 + 1:02d}-{i % 28 + 1:02d}", 1)
+                for i in range(events))
+            start = time.perf_counter()
+            for _ in range(lookups):
+                datastore.get_timeoff_balance("Ledger")
+            lookup_ms = (time.perf_counter() - start) * 1000 / lookups
+            datastore.close()
+        label = f"every {snapshot_interval}" if snapshot_interval else "none"
+        print(f"ledger snapshots {label:<8}: {lookup_ms:8.3f} ms/lookup "
+              f"({events} events)")
+
+
+def run_roster_load(tmp_dir, roster_rows):
+    csv_path = os.path.join(tmp_dir, "roster.csv")
+    jsonl_path = os.path.join(tmp_dir, "roster.jsonl")
+    with open(csv_path, "w") as csv_file, open(jsonl_path, "w") as jsonl_file:
+        csv_file.write("name,allowed_days,consumed_days\n")
+        for i in range(roster_rows):
+            csv_file.write(f"Roster{i},{20 + i % 10},{i % 5}\n")
+            jsonl_file.write(json.dumps({"name": f"Roster{i}",
+                                         "allowed_days": 20 + i % 10,
+                                         "consumed_days": i % 5}) + "\n")
+
+    for path in (csv_path, jsonl_path):
+        with open(os.devnull, "w") as devnull, \
+                contextlib.redirect_stdout(devnull):
+            datastore = TimeOffDatastore(
+                os.path.join(tmp_dir, f"roster-{os.path.basename(path)}.db"),
+                seed=False)
+            tracemalloc.start()
+            stats = datastore.load_roster(path)
+            peak = tracemalloc.get_traced_memory()[1]
+            tracemalloc.stop()
+            datastore.close()
+        print(f"roster load {os.path.basename(path):<13}: "
+              f"{stats['rows_per_sec']:10.0f} rows/sec "
+              f"({stats['rows']} rows, peak {peak / 2**20:.1f} MiB)")
+
+
+def run(employees, clients_list, lookups, bulk_rows, ledger_events,
+        roster_rows):
+    names = [f"Employee{i}" for i in range(employees)]
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        for label, db_path, cache_size in [
+                ("in-memory", ":memory:", 0),
+                ("file (WAL)", os.path.join(tmp_dir, "timeoff.db"), 0),
+                ("WAL+cache", os.path.join(tmp_dir, "cached.db"), employees)]:
+            # The datastore prints every fetched row; keep that out of
+            # the measurement.
+            with open(os.devnull, "w") as devnull, \
+                    contextlib.redirect_stdout(devnull):
+                datastore = TimeOffDatastore(db_path,
+                                             balance_cache_size=cache_size)
+                seed_employees(datastore, employees)
+                results = [(clients, run_clients(datastore, names, clients,
+                                                 max(1, lookups // clients)))
+                           for clients in clients_list]
+                bulk_per_sec, single_per_sec, accepted = run_bulk_import(
+                    datastore, names, bulk_rows)
+                indexed_ms, scan_ms = run_coverage(datastore)
+                datastore.close()
+            for clients, per_sec in results:
+                print(f"{label:<11} {clients:>3} clients: "
+                      f"{per_sec:10.0f} lookups/sec")
+            print(f"{label:<11} bulk import: {bulk_per_sec:10.0f} rows/sec "
+                  f"({bulk_rows} rows, {accepted} accepted), "
+                  f"one by one: {single_per_sec:.0f} rows/sec")
+            print(f"{label:<11} coverage   : {indexed_ms:8.3f} ms/query "
+                  f"(R*Tree), {scan_ms:8.3f} ms/query (full scan)")
+
+        if ledger_events:
+            run_ledger(tmp_dir, ledger_events)
+        if roster_rows:
+            run_roster_load(tmp_dir, roster_rows)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--employees", type=int, default=10000)
+    parser.add_argument("--clients", type=int, nargs="+", default=[1, 8, 32])
+    parser.add_argument("--lookups", type=int, default=50000,
+                        help="total lookups per run, split across clients")
+    parser.add_argument("--bulk-rows", type=int, default=100000)
+    parser.add_argument("--ledger-events", type=int, default=10000)
+    parser.add_argument("--roster-rows", type=int, default=200000)
+    args = parser.parse_args()
+    run(args.employees, args.clients, args.lookups, args.bulk_rows,
+        args.ledger_events, args.roster_rows)
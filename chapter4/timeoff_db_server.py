@@ -1,9 +1,14 @@
+import io
+import json
 import os
-import re
+from collections import Counter
+from datetime import date
 from dotenv import load_dotenv
 from fastmcp import FastMCP
 
-from timeoff_datastore import TimeOffDatastore
+from timeoff_datastore import (InsufficientBalanceError, TimeOffDatastore,
+                               read_timeoff_requests_csv)
+from timeoff_async_datastore import AsyncTimeOffDatastore
 
 # -----------------------------------------------------------------------
 # Setup the MCP Server
@@ -13,8 +18,60 @@ timeoff_mcp = FastMCP("Timeoff-MCP-Server")
 
 # -----------------------------------------------------------------------
 # Initialize the Timeoff Datastore
+# Set TIMEOFF_DB_PATH to a file (e.g. timeoff.db) to keep the data across
+# restarts and serve concurrent reads from a WAL mode database.
+# Set TIMEOFF_ROSTER_PATH to an HR roster export (.csv or .jsonl with
+# name, allowed_days and consumed_days) to load the employees from it
+# instead of the sample employees. The roster is only loaded into an
+# empty database; set TIMEOFF_ROSTER_RELOAD=1 to import it into an
+# existing one, which adds new employees and updates allowed days but
+# keeps the days consumed by the requests filed since.
+# Balances are cached in-process (TIMEOFF_BALANCE_CACHE_SIZE entries,
+# 0 disables); set TIMEOFF_BALANCE_CACHE_TTL (seconds) when several
+# server processes share one database file.
 # -----------------------------------------------------------------------
-timeoff_db = TimeOffDatastore()
+timeoff_roster_path = os.getenv("TIMEOFF_ROSTER_PATH")
+timeoff_db = TimeOffDatastore(
+    os.getenv("TIMEOFF_DB_PATH", ":memory:"),
+    seed=not timeoff_roster_path,
+    balance_cache_size=int(os.getenv("TIMEOFF_BALANCE_CACHE_SIZE", "4096")),
+    balance_cache_ttl=float(os.getenv("TIMEOFF_BALANCE_CACHE_TTL", "0")) or None)
+if timeoff_roster_path:
+    if not timeoff_db.has_employees() \
+            or os.getenv("TIMEOFF_ROSTER_RELOAD") == "1":
+        timeoff_db.load_roster(timeoff_roster_path)
+    else:
+        print("Employees already loaded, not reloading the roster "
+              "(set TIMEOFF_ROSTER_RELOAD=1 to import it)")
+
+# The tools are async and run the sqlite calls on worker threads, so a
+# slow query or write does not block the other MCP sessions.
+timeoff_async_db = AsyncTimeOffDatastore(
+    timeoff_db, max_readers=int(os.getenv("TIMEOFF_DB_READERS", "8")))
+
+# Resolve the employee name sent by the LLM to an employee id.
+# Names are matched normalized (case, accents and punctuation such as a
+# trailing 'Alice,' do not matter), for reads and writes alike: a near
+# miss ("Bobby", "Alice Smith") never resolves to a colleague's balance,
+# history or requests. Returns (employee_id, employee_name, None), or
+# (None, None, message) when the name matches nobody or is ambiguous;
+# the message lists the most similar names (by trigram similarity) so
+# the LLM can ask the user or call the tool again with the full name.
+
+
+async def resolve_employee(employee_name):
+    resolution = await timeoff_async_db.resolve_employee(employee_name or "")
+    if resolution["status"] == "resolved":
+        return resolution["employee_id"], resolution["employee_name"], None
+    candidates = ", ".join(candidate["employee_name"]
+                           for candidate in resolution["candidates"])
+    if resolution["status"] == "ambiguous":
+        return None, None, (f"Employee name '{employee_name}' is ambiguous. "
+                            f"Did you mean one of: {candidates}?")
+    if candidates:
+        return None, None, (f"Employee '{employee_name}' not found. "
+                            f"Did you mean one of: {candidates}?")
+    return None, None, f"Employee '{employee_name}' not found"
 
 # Tool to get time off balance for an employee
 
@@ -28,26 +85,37 @@ timeoff_db = TimeOffDatastore()
 # retrieve your information more accurately.
 
 @timeoff_mcp.tool()
-def get_timeoff_balance(employee_name: str) -> str:
+async def get_timeoff_balance(employee_name: str, as_of_day: str = "") -> str:
     """Get the timeoff balance for the employee, given their name.
+    Pass as_of_day (YYYY-MM-DD) to get the balance the employee had at
+    the end of that day instead of the current one.
 
-    Input is sanitized (strip punctuation/trailing commas commonly inserted by LLMs)
-    and the function returns a string result suitable for the MCP tool surface.
+    The name is matched leniently (punctuation/trailing commas commonly inserted by LLMs
+    and case are ignored; a misspelled name returns suggestions) and the function returns
+    a string result suitable for the MCP tool surface.
     """
-    # Sanitize the incoming name: remove punctuation (commas, quotes, etc.) and trim
     print("Getting timeoff balance for employee: ", employee_name)
-    if not employee_name:
+    if not employee_name or not employee_name.strip():
         return "Invalid employee name"
 
-    # remove punctuation characters that often get introduced by the LLM (e.g. 'Alice,')
-    clean_name = re.sub(r"[^\w\s-]", "", employee_name).strip()
-    if not clean_name:
-        return "Invalid employee name"
+    employee_id, clean_name, error = await resolve_employee(employee_name)
+    if error:
+        # Return a clear string response the tool/agent can consume
+        return error
+
+    if as_of_day:
+        try:
+            balance = await timeoff_async_db.get_timeoff_balance_as_of(
+                clean_name, as_of_day)
+        except ValueError as e:
+            return f"Invalid request: {e}"
+        if balance is None:
+            return f"Employee '{clean_name}' had no balance on {as_of_day}"
+        return str(balance)
 
-    balance = timeoff_db.get_timeoff_balance(clean_name)
+    balance = await timeoff_async_db.get_timeoff_balance_by_id(employee_id)
     if balance is None:
-        # Return a clear string response the tool/agent can consume
-        return f"Employee '{clean_name}' not found"
+        return f"Employee '{employee_name}' not found"
 
     # Ensure we return a string (tools often expect serializable simple types)
     return str(balance)
@@ -56,13 +124,173 @@ def get_timeoff_balance(employee_name: str) -> str:
 
 
 @timeoff_mcp.tool()
-def request_timeoff(employee_name: str, start_day: str, days: int) -> str:
+async def request_timeoff(employee_name: str, start_day: str, days: int) -> str:
     """File a  timeoff request for the employee, 
-        given their name, start day and number of days"""
+        given their name, start day and number of days.
+        The name must be the employee's full name (case and punctuation
+        do not matter); a misspelled name is rejected with suggestions."""
 
     print("Requesting timeoff for employee: ", employee_name)
-    return timeoff_db.add_timeoff_request(
-        employee_name, start_day, days)
+    employee_id, _, error = await resolve_employee(employee_name)
+    if error:
+        return f"Timeoff request rejected: {error}"
+    try:
+        return await timeoff_async_db.add_timeoff_request_by_id(
+            employee_id, start_day, days)
+    except InsufficientBalanceError as e:
+        return f"Timeoff request rejected. {e}"
+    except ValueError as e:
+        return f"Timeoff request rejected: {e}"
+
+# Tools to read back the time off history, one page at a time. Pass the
+# returned next_cursor to get the next page (it is null on the last page).
+
+MAX_HISTORY_PAGE_SIZE = 200
+
+
+def _check_history_args(start_day, end_day, limit):
+    # Raises ValueError for dates that are not YYYY-MM-DD
+    for day in (start_day, end_day):
+        if day:
+            date.fromisoformat(day)
+    return max(1, min(limit, MAX_HISTORY_PAGE_SIZE))
+
+
+@timeoff_mcp.tool()
+async def get_timeoff_history(employee_name: str, start_day: str = "",
+                              end_day: str = "", cursor: str = "",
+                              limit: int = 20) -> str:
+    """Get the timeoff requests filed by the employee, oldest first,
+    optionally only those starting between start_day and end_day
+    (YYYY-MM-DD, inclusive). Returns a JSON page with the items and a
+    next_cursor to pass back for the next page."""
+    print("Getting timeoff history for employee: ", employee_name)
+    _, clean_name, error = await resolve_employee(employee_name)
+    if error:
+        return error
+    try:
+        limit = _check_history_args(start_day, end_day, limit)
+        page = await timeoff_async_db.get_timeoff_history(
+            clean_name, start_day or None, end_day or None, limit,
+            cursor or None)
+    except ValueError as e:
+        return f"Invalid request: {e}"
+    if page is None:
+        return f"Employee '{clean_name}' not found"
+    return json.dumps(page)
+
+
+@timeoff_mcp.tool()
+async def get_balance_ledger(employee_name: str, cursor: str = "",
+                             limit: int = 20) -> str:
+    """Get the changes to the employee's timeoff balance, oldest first:
+    the opening balance, allowance changes, filed requests and corrections.
+    Returns a JSON page with the items and a next_cursor to pass back for
+    the next page."""
+    print("Getting balance ledger for employee: ", employee_name)
+    _, clean_name, error = await resolve_employee(employee_name)
+    if error:
+        return error
+    try:
+        page = await timeoff_async_db.get_balance_ledger(
+            clean_name, _check_history_args(None, None, limit), cursor or None)
+    except ValueError as e:
+        return f"Invalid request: {e}"
+    if page is None:
+        return f"Employee '{clean_name}' not found"
+    return json.dumps(page)
+
+
+@timeoff_mcp.tool()
+async def list_timeoff_in_range(start_day: str, end_day: str,
+                                cursor: str = "", limit: int = 50) -> str:
+    """List the timeoff requests of all employees that start between
+    start_day and end_day (YYYY-MM-DD, inclusive), in date order. Returns
+    a JSON page with the items and a next_cursor to pass back for the
+    next page."""
+    print(f"Listing timeoff between {start_day} and {end_day}")
+    try:
+        limit = _check_history_args(start_day, end_day, limit)
+        page = await timeoff_async_db.get_timeoff_in_range(
+            start_day, end_day, limit, cursor or None)
+    except ValueError as e:
+        return f"Invalid request: {e}"
+    return json.dumps(page)
+
+# Tool to find who is out in a date range (e.g. "who else is out that
+# week"), optionally within a department
+
+
+@timeoff_mcp.tool()
+async def check_coverage(start_day: str, end_day: str = "",
+                         department: str = "",
+                         employee_name: str = "") -> str:
+    """Find the employees that are on timeoff on any day between
+    start_day and end_day (YYYY-MM-DD, inclusive; end_day defaults to
+    start_day). Optionally filter by department. If employee_name is
+    given, only that employee's department is checked and the employee
+    is left out, to answer "who else is out". Returns JSON."""
+    print(f"Checking coverage between {start_day} and {end_day}")
+    end_day = end_day or start_day
+    clean_name = None
+    if employee_name:
+        _, clean_name, error = await resolve_employee(employee_name)
+        if error:
+            return error
+    try:
+        _check_history_args(start_day, end_day, 1)
+        if not start_day or end_day < start_day:
+            raise ValueError("start_day must be given and not after end_day")
+        coverage = await timeoff_async_db.get_coverage(
+            start_day, end_day, department or None, clean_name)
+    except ValueError as e:
+        return f"Invalid request: {e}"
+    if coverage is None:
+        return f"Employee '{clean_name}' not found"
+    return json.dumps(coverage)
+
+# Tool to import many time off requests at once (e.g. the carry-over
+# records at the fiscal-year rollover). Only the first
+# MAX_REJECTED_ROWS rejected rows are listed, so a large bad batch does
+# not echo every row back to the LLM; the rest are counted by reason.
+
+MAX_REJECTED_ROWS = 20
+
+
+@timeoff_mcp.tool()
+async def import_timeoff_requests(csv_data: str) -> str:
+    """Import many timeoff requests at once from CSV text with the header
+    employee_name,start_day,days (start_day as YYYY-MM-DD).
+
+    All accepted rows are written in one transaction. Returns a JSON
+    summary with the number of accepted and rejected rows, the number of
+    rejected rows per reason, and the row number and reason of the first
+    rejected rows."""
+    results = await timeoff_async_db.add_timeoff_requests(
+        read_timeoff_requests_csv(io.StringIO(csv_data)))
+    rejected = [result for result in results if result["status"] == "rejected"]
+    print(f"Imported {len(results) - len(rejected)} timeoff requests, "
+          f"rejected {len(rejected)}")
+    return json.dumps({"accepted": len(results) - len(rejected),
+                       "rejected": len(rejected),
+                       "rejected_by_reason": dict(Counter(
+                           result["reason"] for result in rejected)),
+                       "rejected_rows": rejected[:MAX_REJECTED_ROWS],
+                       "rejected_rows_omitted": max(
+                           0, len(rejected) - MAX_REJECTED_ROWS)})
+
+# Resource that exposes the balance cache hit ratio and lookup latency
+
+
+@timeoff_mcp.resource(
+    uri="timeoff://metrics/balance-cache",
+    name="Timeoff balance cache metrics",
+    description="Hit/miss counters of the balance cache and balance lookup latency",
+    mime_type="application/json",
+)
+def get_balance_cache_metrics() -> str:
+    """Returns the balance cache counters and average lookup latency."""
+    return json.dumps(timeoff_db.get_balance_metrics())
 
 # Get prompt for the LLM to use to answer the query
 
@@ -84,9 +312,9 @@ def get_llm_prompt(user: str, prompt: str) -> str:
 # -----------------------------------------------------------------------
 
 # Test code
-# print("Time off balance for Alice: ", get_timeoff_balance("Alice"))
-# print("Add time off request for Alice: ", request_timeoff("Alice", "2025-05-05",5))
-# print("New Time off balance for Alice: ", get_timeoff_balance("Alice"))
+# print("Time off balance for Alice: ", asyncio.run(get_timeoff_balance("Alice")))
+# print("Add time off request for Alice: ", asyncio.run(request_timeoff("Alice", "2025-05-05",5)))
+# print("New Time off balance for Alice: ", asyncio.run(get_timeoff_balance("Alice")))
 
 if __name__ == "__main__":
     timeoff_mcp.run(transport="streamable-http",
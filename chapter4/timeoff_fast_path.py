@@ -0,0 +1,117 @@
+import re
+import threading
+from datetime import date
+
+#-----------------------------------------------------------------------
+# Deterministic fast path for the most common timeoff prompts.
+#
+# "What is my time off balance?" and "File a time off request for 5 days
+# starting from 2025-05-05" need no reasoning: the tool to call and its
+# arguments follow from the words. A prompt that fully matches one of the
+# patterns below is answered by calling the MCP tool directly and filling
+# in a template, without the two LLM round-trips of the agent (choose the
+# tool, phrase the answer). Anything else (other people, dates that are
+# not YYYY-MM-DD, extra questions, ...) does not match and goes to the LLM
+# agent as before.
+#
+# Used by run_timeoff_agent, and by the router agent (chapter6) to route
+# these prompts to the timeoff agent without asking the LLM.
+#-----------------------------------------------------------------------
+
+_TIMEOFF = r"(?:time ?off|vacation|pto|leave|holiday)"
+
+BALANCE_PATTERNS = [re.compile(pattern) for pattern in (
+    rf"(?:what(?:'s| is)|show(?: me)?|check|get|tell me)(?: my| the)?"
+    rf"(?: current)? {_TIMEOFF}(?: days)? balance(?: now| today| left)?",
+    rf"(?:what(?:'s| is) )?my(?: current)? {_TIMEOFF}(?: days)? balance"
+    rf"(?: now| today)?",
+    rf"how (?:many|much) {_TIMEOFF}(?: days)? (?:do i have|have i got)"
+    rf"(?: left| remaining)?(?: now| today)?",
+)]
+
+REQUEST_PATTERNS = [re.compile(pattern) for pattern in (
+    rf"(?:please )?(?:file|create|submit|book|request|add)(?: a| an| my)?"
+    rf"(?: new)? {_TIMEOFF}(?: request)? for (?P<days>\d{{1,3}}) days?"
+    rf" (?:starting|beginning|from)(?: from| on)? (?P<start_day>\d{{4}}-\d{{2}}-\d{{2}})",
+    rf"(?:please )?(?:file|create|submit|book|request|add)(?: a| an| my)?"
+    rf"(?: new)? {_TIMEOFF}(?: request)? (?:starting|beginning|from)(?: from| on)?"
+    rf" (?P<start_day>\d{{4}}-\d{{2}}-\d{{2}}) for (?P<days>\d{{1,3}}) days?",
+)]
+
+
+def normalize_prompt(prompt):
+    """Lowercases, collapses spaces and drops trailing punctuation."""
+    return " ".join((prompt or "").lower().split()).rstrip(" ?.!")
+
+
+class TimeoffFastPath:
+    """Matches prompts to a tool call and renders the tool result.
+
+    Counts every prompt it sees and the fast path hits, per intent, for
+    stats()."""
+
+    def __init__(self, enabled=True):
+        self.enabled = enabled
+        self._lock = threading.Lock()
+        self._prompts = 0
+        self._hits = {}
+
+    def match(self, prompt):
+        """Returns (tool name, arguments without the employee name), or
+        None if the prompt is not one the fast path can answer."""
+        intent = self._match(normalize_prompt(prompt)) if self.enabled else None
+        with self._lock:
+            self._prompts += 1
+            if intent is not None:
+                self._hits[intent[0]] = self._hits.get(intent[0], 0) + 1
+        return intent
+
+    def _match(self, prompt):
+        if any(pattern.fullmatch(prompt) for pattern in BALANCE_PATTERNS):
+            return "get_timeoff_balance", {}
+        for pattern in REQUEST_PATTERNS:
+            found = pattern.fullmatch(prompt)
+            if found:
+                days = int(found["days"])
+                try:
+                    start_day = date.fromisoformat(found["start_day"]).isoformat()
+                except ValueError:
+                    return None
+                if days > 0:
+                    return "request_timeoff", {"start_day": start_day,
+                                               "days": days}
+        return None
+
+    async def answer(self, user, prompt, call_tool):
+        """Answers the prompt with one tool call, or returns None when it
+        needs the LLM agent. call_tool(name, arguments) is an async
+        function returning the tool's text result."""
+        intent = self.match(prompt)
+        if intent is None:
+            return None
+        tool_name, arguments = intent
+        result = await call_tool(tool_name,
+                                 {"employee_name": user, **arguments})
+        return render_answer(tool_name, arguments, result)
+
+    def stats(self):
+        with self._lock:
+            hits = sum(self._hits.values())
+            return {"prompts": self._prompts,
+                    "hits": hits,
+                    "hit_rate": round(hits / self._prompts, 4)
+                    if self._prompts else 0.0,
+                    "hits_by_tool": dict(self._hits)}
+
+
+def render_answer(tool_name, arguments, result):
+    # Tool errors (unknown or ambiguous employee, rejected request) are
+    # already worded for the user
+    if tool_name == "get_timeoff_balance" and result.strip().lstrip("-").isdigit():
+        days = int(result)
+        return f"You have {days} day{'s' if days != 1 else ''} of time off left."
+    if tool_name == "request_timeoff" and result.startswith("Successfully"):
+        days = arguments["days"]
+        return (f"Your time off request for {days} day{'s' if days != 1 else ''} "
+                f"starting {arguments['start_day']} has been filed.")
+    return result
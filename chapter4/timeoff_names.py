@@ -0,0 +1,40 @@
+import re
+import unicodedata
+
+#-----------------------------------------------------------------------
+# Employee name normalization and trigram similarity, used by the
+# TimeOffDatastore name index to resolve the name variants an LLM sends
+# ("alice,", "ALICE", "Alíce") to an employee, and to suggest the
+# closest names for a misspelled one ("Alise").
+#
+# Trigrams are taken per word, with the word padded like pg_trgm does
+# ("  bob " -> "  b", " bo", "bob", "ob "), so short names still get
+# several trigrams and word starts weigh more.
+#-----------------------------------------------------------------------
+
+_NON_NAME = re.compile(r"[^\w\s-]|_")
+
+
+def normalize_name(name):
+    """Lowercases, strips accents and punctuation and collapses spaces."""
+    stripped = name or ""
+    if not stripped.isascii():
+        decomposed = unicodedata.normalize("NFKD", stripped)
+        stripped = "".join(c for c in decomposed if not unicodedata.combining(c))
+    return " ".join(_NON_NAME.sub(" ", stripped.lower()).replace("-", " ").split())
+
+
+def name_trigrams(normalized_name):
+    """Returns the set of trigrams of a normalized name."""
+    trigrams = set()
+    for word in normalized_name.split():
+        padded = f"  {word} "
+        trigrams.update(padded[i:i + 3] for i in range(len(padded) - 2))
+    return trigrams
+
+
+def trigram_similarity(shared, query_count, candidate_count):
+    """Jaccard similarity of two trigram sets, given their sizes and the
+    number of trigrams they share."""
+    union = query_count + candidate_count - shared
+    return shared / union if union else 0.0
@@ -15,12 +15,20 @@ import operator
 import asyncio
 import os
 from dotenv import load_dotenv
-# Added as part of the copilot fix (see note at the bottom of the file)
-import concurrent.futures
 # previously was: from langchain_openai import AzureChatOpenAI
 from langchain_openai import ChatOpenAI
 import uuid
 import json
+import sys
+
+# Prompts the timeoff agent answers without an LLM are also routed
+# without one
+sys.path.append(os.path.abspath(os.path.join(
+    os.path.dirname(__file__), '../chapter4')))
+from timeoff_fast_path import TimeoffFastPath
+
+from embedding_router import (EmbeddingRouter, UNSUPPORTED_EXAMPLES,
+                              load_route_examples)
 
 # *** Changes to the above comment, this is now going to use navite OpenAI model ***
 # More info and similar changes in: code_of_conduct_client.py in chapter2
@@ -34,65 +42,113 @@ model = ChatOpenAI(
     # max_tokens=512,
 )
 
+POLICY_AGENT_URL = "http://localhost:9001"
+TIMEOFF_AGENT_URL = "http://localhost:9002"
+
+ROUTER_SYSTEM_PROMPT = """ 
+        You are a Router, that analyzes the input query and chooses 3 options:
+        POLICY: If the query is about HR policies, like leave, remote work, etc.
+        TIMEOFF: If the query is about time off requests, both creating requests and checking balances
+        UNSUPPORTED: Any other query that is not related to HR policies or time off requests.
+    
+        The output should only be just one word out of the possible 3 : POLICY, TIMEOFF, UNSUPPORTED.
+        """
+
+# ---------------------------------------------------------------
+# Local router: routes with the centroids of the embedded agent card
+# examples, and leaves only the unclear queries to the LLM
+# ---------------------------------------------------------------
+EMBEDDING_MODEL_NAME = "sentence-transformers/all-MiniLM-L6-v2"
+
+
+async def load_router_examples():
+    route_examples = await load_route_examples(
+        {"POLICY": POLICY_AGENT_URL, "TIMEOFF": TIMEOFF_AGENT_URL})
+    route_examples["UNSUPPORTED"] = UNSUPPORTED_EXAMPLES
+    return route_examples
+
+
+async def create_embedding_router(route_examples=None):
+    from langchain_huggingface import HuggingFaceEmbeddings
+
+    if route_examples is None:
+        route_examples = await load_router_examples()
+    return EmbeddingRouter(
+        HuggingFaceEmbeddings(model_name=EMBEDDING_MODEL_NAME),
+        route_examples,
+        min_margin=float(os.getenv("ROUTER_MIN_MARGIN", "0.05")))
+
 # ---------------------------------------------------------------
 # Generic method to invoke a remote agent with A2A
 # ---------------------------------------------------------------
 
 
-async def execute_a2a_agent(agent_card_url: str,
-                            user: str,
-                            prompt: str) -> str:
+async def send_a2a_message(client: A2AClient,
+                           user: str,
+                           prompt: str) -> str:
 
-    print("Retrieving agent card at ", agent_card_url)
-    async with httpx.AsyncClient(timeout=30) as httpx_client:
+    input_dict = {"user": user, "prompt": prompt}
 
-        client = await A2AClient.get_client_from_agent_card_url(
-            httpx_client, agent_card_url
-        )
-        print("Agent URL received :", client.url)
-
-        input_dict = {"user": user, "prompt": prompt}
-
-        send_message_payload: dict[str, Any] = {
-            "message": {
-                "role": "user",
-                "parts": [
-                    {"kind": "text", "text": json.dumps(input_dict)},
-                ],
-                "messageId": uuid4().hex,
-            },
-        }
-
-        print("prompting agent ", client.url)
-        request = SendMessageRequest(
-            id=str(uuid4()),
-            params=MessageSendParams(**send_message_payload)
-        )
-        response = await client.send_message(request)
+    send_message_payload: dict[str, Any] = {
+        "message": {
+            "role": "user",
+            "parts": [
+                {"kind": "text", "text": json.dumps(input_dict)},
+            ],
+            "messageId": uuid4().hex,
+        },
+    }
 
-        # Extract text from the response object
-        response_json = response.model_dump(mode='json', exclude_none=True)
-        text = response_json.get("result").get("parts")[0].get("text")
-        print("Response from agent = ", text)
-        return text
+    print("prompting agent ", client.url)
+    request = SendMessageRequest(
+        id=str(uuid4()),
+        params=MessageSendParams(**send_message_payload)
+    )
+    response = await client.send_message(request)
+
+    # Extract text from the response object
+    response_json = response.model_dump(mode='json', exclude_none=True)
+    text = response_json.get("result").get("parts")[0].get("text")
+    print("Response from agent = ", text)
+    return text
 
 
 # ---------------------------------------------------------------
 # LangGraph based router (main ) agent that can route a prompt
 # to the appropriate agent
+#
+# The nodes are async and the graph is run with ainvoke, so one
+# router (one compiled graph, one HTTP connection pool) serves many
+# conversations concurrently on one event loop. Pass the user of a
+# conversation in the state ({"messages": [...], "user": "Bob"});
+# it defaults to the user the router was created with.
 # ---------------------------------------------------------------
 class RouterAgentState(TypedDict):
     messages: Annotated[list[AnyMessage], operator.add]
+    user: str
+
+
+# Balance questions and ISO date filing requests go straight to the
+# timeoff agent (set ROUTER_FAST_PATH=0 to route every prompt with the LLM)
+router_fast_path = TimeoffFastPath(
+    enabled=os.getenv("ROUTER_FAST_PATH", "1") != "0")
 
 
 class RouterHRAgent:
 
-    def __init__(self, model, system_prompt, user, debug=False):
+    def __init__(self, model, system_prompt, user, debug=False,
+                 embedding_router=None, httpx_client=None):
 
         self.system_prompt = system_prompt
         self.model = model
         self.debug = debug
         self.user = user
+        self.embedding_router = embedding_router
+        # One HTTP client (and connection pool) for the A2A calls of all
+        # conversations, and one A2A client per agent, so the agent card
+        # is only fetched once
+        self.httpx_client = httpx_client or httpx.AsyncClient(timeout=30)
+        self._a2a_clients = {}
 
         router_graph = StateGraph(RouterAgentState)
         router_graph.add_node("Router", self.call_llm)
@@ -117,77 +173,78 @@ class RouterHRAgent:
         router_graph.set_entry_point("Router")
         self.router_graph = router_graph.compile()
 
-    def call_llm(self, state: RouterAgentState):
+    async def call_llm(self, state: RouterAgentState):
         messages = state["messages"]
 
         if self.debug:
             print(f"Call LLM received {messages}")
 
+        if router_fast_path.match(messages[-1].content):
+            print("Fast path: routing to TIMEOFF without the LLM")
+            return {"messages": [AIMessage(content="TIMEOFF")]}
+
+        if self.embedding_router is not None:
+            # Embedding the query is CPU work, keep it off the event loop
+            route = await asyncio.to_thread(self.embedding_router.route,
+                                            messages[-1].content)
+            if route is not None:
+                print(f"Embedding router: routing to {route} without the LLM")
+                return {"messages": [AIMessage(content=route)]}
+
         # If system prompt exists, add to messages in the front
         if self.system_prompt:
             messages = [SystemMessage(content=self.system_prompt)] + messages
 
         # invoke the model with the message history
-        result = self.model.invoke(messages)
+        result = await self.model.ainvoke(messages)
 
         if self.debug:
             print(f"Call LLM result {result}")
         return {"messages": [result]}
 
-    def policy_agent_node(self, state: RouterAgentState):
+    async def _a2a_client(self, agent_card_url):
+        client = self._a2a_clients.get(agent_card_url)
+        if client is None:
+            print("Retrieving agent card at ", agent_card_url)
+            client = await A2AClient.get_client_from_agent_card_url(
+                self.httpx_client, agent_card_url)
+            self._a2a_clients[agent_card_url] = client
+        return client
+
+    async def call_agent(self, agent_card_url, state: RouterAgentState):
+        prompt = state["messages"][0].content
+        client = await self._a2a_client(agent_card_url)
+        return await send_a2a_message(client, state.get("user") or self.user,
+                                      prompt)
+
+    async def policy_agent_node(self, state: RouterAgentState):
         messages = state["messages"]
         # Call the policy agent
         prompt = messages[0].content
         print(f"Policy agent node received {prompt}")
 
-        # Copilot fix for improper handling of async/await (see note at the bottom of the file)
-        try:
-            loop = asyncio.get_running_loop()
-        except RuntimeError:
-            response = asyncio.run(execute_a2a_agent("http://localhost:9001",
-                                                     self.user, prompt))
-        else:
-            # If we're already in an async context, create a task
-            import concurrent.futures
-            with concurrent.futures.ThreadPoolExecutor() as pool:
-                response = loop.run_in_executor(pool,
-                                                lambda: asyncio.run(execute_a2a_agent("http://localhost:9001",
-                                                                                      self.user, prompt)))
-                response = response.result()
+        response = await self.call_agent(POLICY_AGENT_URL, state)
 
         if self.debug:
             print(f"Policy agent node response : {response}")
 
         return {"messages": [AIMessage(content=response)]}
 
-    def timeoff_agent_node(self, state: RouterAgentState):
+    async def timeoff_agent_node(self, state: RouterAgentState):
         messages = state["messages"]
 
         # Call the timeoff agent
         prompt = messages[0].content
         print(f"Timeoff agent node received {prompt}")
 
-       # Copilot fix for improper handling of async/await (see note at the bottom of the file)
-        try:
-            loop = asyncio.get_running_loop()
-        except RuntimeError:
-            response = asyncio.run(execute_a2a_agent("http://localhost:9002",
-                                                     self.user, prompt))
-        else:
-            # If we're already in an async context, create a task
-            import concurrent.futures
-            with concurrent.futures.ThreadPoolExecutor() as pool:
-                response = loop.run_in_executor(pool,
-                                                lambda: asyncio.run(execute_a2a_agent("http://localhost:9002",
-                                                                                      self.user, prompt)))
-                response = response.result()
+        response = await self.call_agent(TIMEOFF_AGENT_URL, state)
 
         if self.debug:
             print(f"Timeoff agent node response : {response}")
 
         return {"messages": [AIMessage(content=response)]}
 
-    def unsupported_node(self, state: RouterAgentState):
+    async def unsupported_node(self, state: RouterAgentState):
         messages = state["messages"]
 
         print("Unsupported node invoked")
@@ -201,7 +258,7 @@ class RouterHRAgent:
 
         return {"messages": [AIMessage(content=response)]}
 
-    def find_route(self, state: RouterAgentState):
+    async def find_route(self, state: RouterAgentState):
         last_message = state["messages"][-1]
         if self.debug:
             print("Router: Last result from LLM : ", last_message)
@@ -212,68 +269,72 @@ class RouterHRAgent:
         print(f"Destination chosen : {destination}")
         return destination
 
+    # Close the shared HTTP client
+    async def aclose(self):
+        await self.httpx_client.aclose()
 
-if __name__ == "__main__":
 
-    try:
-        # Create the chatbot
-        # Select user
-        user = "Alice"
-        # Setup the system prompt
-        system_prompt = """ 
-        You are a Router, that analyzes the input query and chooses 3 options:
-        POLICY: If the query is about HR policies, like leave, remote work, etc.
-        TIMEOFF: If the query is about time off requests, both creating requests and checking balances
-        UNSUPPORTED: Any other query that is not related to HR policies or time off requests.
-    
-        The output should only be just one word out of the possible 3 : POLICY, TIMEOFF, UNSUPPORTED.
-        """
+async def main():
+    # Create the chatbot
+    # Select user
+    user = "Alice"
+    # Setup the system prompt
+    system_prompt = ROUTER_SYSTEM_PROMPT
 
-        router_hr_agent = RouterHRAgent(model,
-                                        system_prompt,
-                                        user,
-                                        debug=False)
-
-        # To print the graph
-        # graph_image=router_hr_agent.router_graph.get_graph().draw_mermaid_png()
-        # with open("chapter6/router_agent.png", "wb") as f:
-        #     f.write(graph_image)
-
-        # Send a sequence of messages to chatbot and get its response
-        # This simulates the conversation between the user and the Agentic chatbot
-        user_inputs = [
-            "Tell me about payroll processing",
-            "What is the policy for remote work?",
-            "What is my vacation balance?",
-            "File a time off request for 5 days starting from 2025-05-05",
-            "What is vacation balance now?",
-        ]
-
-        # Create a new thread
-        config = {"configurable": {"thread_id": str(uuid.uuid4())}}
+    # Route locally with embeddings, unless ROUTER_MODE=llm or the
+    # agent cards cannot be loaded
+    embedding_router = None
+    if os.getenv("ROUTER_MODE", "embedding") == "embedding":
+        try:
+            embedding_router = await create_embedding_router()
+        except Exception as e:
+            print(f"Embedding router unavailable, routing with the LLM: {e}")
+
+    router_hr_agent = RouterHRAgent(model,
+                                    system_prompt,
+                                    user,
+                                    debug=False,
+                                    embedding_router=embedding_router)
+
+    # To print the graph
+    # graph_image=router_hr_agent.router_graph.get_graph().draw_mermaid_png()
+    # with open("chapter6/router_agent.png", "wb") as f:
+    #     f.write(graph_image)
+
+    # Send a sequence of messages to chatbot and get its response
+    # This simulates the conversation between the user and the Agentic chatbot
+    user_inputs = [
+        "Tell me about payroll processing",
+        "What is the policy for remote work?",
+        "What is my vacation balance?",
+        "File a time off request for 5 days starting from 2025-05-05",
+        "What is vacation balance now?",
+    ]
+
+    # Create a new thread
+    config = {"configurable": {"thread_id": str(uuid.uuid4())}}
 
+    try:
         for input in user_inputs:
             print(f"----------------------------------------\nUSER : {input}")
             # Format the user message
-            user_message = {"messages": [HumanMessage(input)]}
+            user_message = {"messages": [HumanMessage(input)], "user": user}
             # Get response from the agent
-            ai_response = router_hr_agent.router_graph.invoke(
+            ai_response = await router_hr_agent.router_graph.ainvoke(
                 user_message, config=config)
             # Print the response
             print(f"\nAGENT : {ai_response['messages'][-1].content}")
 
+        print(f"\nRouter fast path: {router_fast_path.stats()}")
+        if embedding_router is not None:
+            print(f"Embedding router: {embedding_router.stats()}")
+    finally:
+        await router_hr_agent.aclose()
+
+
+if __name__ == "__main__":
+
+    try:
+        asyncio.run(main())
     except Exception as e:
         print(f"An error occurred: {e}")
-
-# Explanation for Copilot fixes for improper handling of async/await above:
-# The Problem:
-# The 503 "Network communication error" was caused by improper handling of async / await in your node methods.
-#  You were using asyncio.run() inside synchronous functions that are called from LangGraph's synchronous execution
-#  context, which can cause event loop conflicts.
-# The Solution:
-# I updated both policy_agent_node and timeoff_agent_node methods to:
-# Check if there's already a running event loop using asyncio.get_running_loop()
-# If there's no running loop, use asyncio.run() directly
-# If there's already a running loop (which shouldn't happen in this sync context), use ThreadPoolExecutor to handle
-#  the async call in a separate thread
-# This ensures proper handling of the async execute_a2a_agent function regardless of the execution context.
\ No newline at end of file
@@ -12,6 +12,7 @@ from a2a.types import AgentCapabilities, AgentCard, AgentSkill
 import sys
 import os
 import json
+from contextlib import asynccontextmanager
 
 #Import the HR policy Agent implementation in this wrapper
 #First line adds the resulting absolute path to Python’s module search list
@@ -48,6 +49,14 @@ class HRPolicyAgentExecutor(AgentExecutor):
         
         raise Exception("Not implemented")
 
+# Start a warm MCP session before the first request and shut the pooled
+# HR policy server subprocesses down cleanly when the A2A server stops.
+@asynccontextmanager
+async def policy_server_lifespan(app):
+    await hr_policy_agent.hr_policy_session_pool.warm_up()
+    yield
+    await hr_policy_agent.hr_policy_session_pool.close()
+
 if __name__ == "__main__":
 
     policy_skill = AgentSkill(
@@ -59,6 +68,11 @@ if __name__ == "__main__":
             "What is the policy on remote work?",
             "What is the policy on sick leave?",
             "What is the policy on vacation days?",
+            "How many days of parental leave do we get?",
+            "Can unused vacation days be carried over to next year?",
+            "What are the rules for working from home?",
+            "Is there a dress code?",
+            "How do I report harassment at work?",
         ],
     )
 
@@ -85,7 +99,7 @@ if __name__ == "__main__":
 
     # Start the Server
     import uvicorn
-    uvicorn.run(policy_server.build(), 
+    uvicorn.run(policy_server.build(lifespan=policy_server_lifespan), 
                 host="0.0.0.0", 
                 port=9001, 
                 log_level="info")
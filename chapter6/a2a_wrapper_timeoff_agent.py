@@ -12,6 +12,7 @@ from a2a.types import AgentCapabilities, AgentCard, AgentSkill
 import sys
 import os
 import json
+from contextlib import asynccontextmanager
 
 #Import the HR timeoff Agent implementation in this wrapper
 sys.path.append(os.path.abspath(os.path.join(
@@ -48,6 +49,13 @@ class TimeoffAgentExecutor(AgentExecutor):
         
         raise Exception("Not implemented")
 
+# Close the timeoff agent's MCP session to the timeoff server when the
+# A2A server stops, on the event loop that opened it.
+@asynccontextmanager
+async def timeoff_server_lifespan(app):
+    yield
+    await timeoff_agent.timeoff_session.close()
+
 if __name__ == "__main__":
 
     timeoff_skill = AgentSkill(
@@ -58,6 +66,12 @@ if __name__ == "__main__":
         examples=[
             "What is my timeoff balance?",
             "Create a timeoff request for 5 days from 30-June-2025",
+            "How many vacation days do I have left?",
+            "File a time off request for 3 days starting from 2025-07-01",
+            "Book two days off next Monday",
+            "Show my time off history for this year",
+            "Who else is out of office next week?",
+            "What was my time off balance at the start of the year?",
         ],
     )
 
@@ -84,7 +98,7 @@ if __name__ == "__main__":
 
     # Start the Server
     import uvicorn
-    uvicorn.run(timeoff_server.build(), 
+    uvicorn.run(timeoff_server.build(lifespan=timeoff_server_lifespan), 
                 host="0.0.0.0", 
                 port=9002, 
                 log_level="info")
@@ -0,0 +1,100 @@
+import threading
+import time
+
+import httpx
+import numpy as np
+from a2a.client import A2ACardResolver
+
+# ---------------------------------------------------------------
+# Local, embedding based router for the RouterHRAgent
+#
+# Every route (POLICY, TIMEOFF, UNSUPPORTED) is represented by the
+# centroid of the embedded example queries of its agent: the
+# AgentSkill.examples of the agent card, and UNSUPPORTED_EXAMPLES for
+# the queries no agent handles. A query is routed to the most similar
+# centroid without any network call. When the best route is not
+# clearly ahead of the runner-up (or not similar enough to any route)
+# route() returns None, and the caller asks the LLM instead.
+# ---------------------------------------------------------------
+
+UNSUPPORTED_EXAMPLES = [
+    "Tell me about payroll processing",
+    "When is my next paycheck?",
+    "Update my bank account details",
+    "What is the weather today?",
+    "Book a meeting room for tomorrow",
+    "Reset my laptop password",
+    "Who won the game last night?",
+    "Write a poem about the office",
+]
+
+
+async def load_route_examples(agent_card_urls):
+    """Fetches the agent cards of {route: agent URL} and returns
+    {route: examples of all skills of the agent}."""
+    route_examples = {}
+    async with httpx.AsyncClient(timeout=30) as httpx_client:
+        for route, url in agent_card_urls.items():
+            card = await A2ACardResolver(httpx_client, url).get_agent_card()
+            route_examples[route] = [example for skill in card.skills
+                                     for example in (skill.examples or [])]
+    return route_examples
+
+
+class EmbeddingRouter:
+    """Routes a query to the route with the most similar example
+    centroid, or returns None when the decision is not clear."""
+
+    def __init__(self, embeddings, route_examples, min_margin=0.05,
+                 min_similarity=0.25):
+        self.embeddings = embeddings
+        self.min_margin = min_margin
+        self.min_similarity = min_similarity
+        self.routes = [route for route, examples in route_examples.items()
+                       if examples]
+        self.centroids = np.vstack([
+            self._centroid(route_examples[route]) for route in self.routes])
+        self._lock = threading.Lock()
+        self._queries = 0
+        self._fallbacks = 0
+        self._seconds = 0.0
+
+    def _centroid(self, examples):
+        vectors = _normalize(np.asarray(
+            self.embeddings.embed_documents(examples), dtype=np.float32))
+        return _normalize(vectors.mean(axis=0))
+
+    def scores(self, query):
+        """{route: cosine similarity of the query to its centroid}"""
+        vector = _normalize(np.asarray(self.embeddings.embed_query(query),
+                                       dtype=np.float32))
+        return dict(zip(self.routes, (self.centroids @ vector).tolist()))
+
+    def route(self, query):
+        start = time.perf_counter()
+        ranked = sorted(self.scores(query).items(), key=lambda item: -item[1])
+        best, best_score = ranked[0]
+        margin = best_score - ranked[1][1] if len(ranked) > 1 else best_score
+        route = best if best_score >= self.min_similarity \
+            and margin >= self.min_margin else None
+        with self._lock:
+            self._queries += 1
+            self._fallbacks += route is None
+            self._seconds += time.perf_counter() - start
+        return route
+
+    def stats(self):
+        with self._lock:
+            queries = self._queries
+            return {"queries": queries,
+                    "routed_locally": queries - self._fallbacks,
+                    "llm_fallbacks": self._fallbacks,
+                    "local_rate": round((queries - self._fallbacks) / queries, 4)
+                    if queries else 0.0,
+                    "avg_route_ms": round(self._seconds * 1000 / queries, 3)
+                    if queries else 0.0}
+
+
+def _normalize(vectors):
+    norms = np.linalg.norm(vectors, axis=-1, keepdims=True)
+    return vectors / np.where(norms == 0, 1, norms)
@@ -0,0 +1,127 @@
+import argparse
+import asyncio
+import time
+
+from langchain_core.messages import HumanMessage, SystemMessage
+
+from a2a_client_router_agent import (ROUTER_SYSTEM_PROMPT,
+                                     create_embedding_router,
+                                     load_router_examples, model)
+
+# ---------------------------------------------------------------
+# Accuracy / latency benchmark of the embedding router against the
+# LLM router of the RouterHRAgent
+#
+# Routes a set of labelled queries with (check_held_out() makes sure
+# none of them is an agent card or UNSUPPORTED_EXAMPLES example):
+# - the embedding router alone (queries it leaves to the LLM are counted
+#   as fallbacks, its accuracy is over the queries it routed),
+# - the LLM router (the system prompt of the RouterHRAgent),
+# - both, as the RouterHRAgent runs them: embeddings first, the LLM
+#   only for the fallbacks.
+#
+# The agent cards are fetched from the running A2A wrappers, so start
+# them first. --no-llm skips the LLM (no OpenAI calls).
+#
+# Usage: python chapter6/router_benchmark.py
+# ---------------------------------------------------------------
+
+LABELED_QUERIES = [
+    ("What does the handbook say about overtime pay?", "POLICY"),
+    ("Are employees allowed to work remotely from abroad?", "POLICY"),
+    ("How much bereavement leave is allowed?", "POLICY"),
+    ("What is the policy for jury duty?", "POLICY"),
+    ("Do we get paid time off on public holidays?", "POLICY"),
+    ("What is the process for requesting a flexible schedule?", "POLICY"),
+    ("How many sick days can I take without a doctor's note?", "POLICY"),
+    ("Is there a policy on using personal devices for work?", "POLICY"),
+    ("What are the guidelines for business travel expenses?", "POLICY"),
+    ("What is the maternity leave policy?", "POLICY"),
+    ("What is my vacation balance?", "TIMEOFF"),
+    ("How much PTO do I have remaining?", "TIMEOFF"),
+    ("Request leave for 4 days starting 2025-09-15", "TIMEOFF"),
+    ("I want to take next Friday off", "TIMEOFF"),
+    ("Please file 2 days of vacation from August 3rd", "TIMEOFF"),
+    ("What time off have I already taken this year?", "TIMEOFF"),
+    ("Is anyone in my team on vacation next week?", "TIMEOFF"),
+    ("How many days off do I have left now?", "TIMEOFF"),
+    ("Cancel my time off request for next week", "TIMEOFF"),
+    ("Submit a time off request for the week of Christmas", "TIMEOFF"),
+    ("Can you book a flight to Chicago for me?", "UNSUPPORTED"),
+    ("What is the stock price of our company?", "UNSUPPORTED"),
+    ("Order new office supplies", "UNSUPPORTED"),
+    ("How do I connect to the office wifi?", "UNSUPPORTED"),
+    ("Translate this sentence into French", "UNSUPPORTED"),
+    ("When is the next company all hands meeting?", "UNSUPPORTED"),
+    ("Give me a recipe for lasagna", "UNSUPPORTED"),
+    ("My monitor is flickering, can you fix it?", "UNSUPPORTED"),
+    ("What is my current salary?", "UNSUPPORTED"),
+    ("Schedule a call with the sales team", "UNSUPPORTED"),
+]
+
+
+def normalize_query(query):
+    return " ".join(query.lower().split()).rstrip(" ?.!")
+
+
+def check_held_out(route_examples):
+    """Fails if a labelled query is also one of the router's examples."""
+    examples = {normalize_query(example)
+                for route_queries in route_examples.values()
+                for example in route_queries}
+    overlap = [query for query, _ in LABELED_QUERIES
+               if normalize_query(query) in examples]
+    assert not overlap, f"Labelled queries are router examples: {overlap}"
+
+
+def llm_route(query):
+    return model.invoke([SystemMessage(content=ROUTER_SYSTEM_PROMPT),
+                         HumanMessage(query)]).content.strip()
+
+
+def timed(function, query):
+    start = time.perf_counter()
+    result = function(query)
+    return result, (time.perf_counter() - start) * 1000
+
+
+def report(label, correct, total, total_ms, queries, extra=""):
+    accuracy = correct / total if total else 0.0
+    print(f"{label:<18}: accuracy {accuracy:6.1%} ({correct}/{total})  "
+          f"{total_ms / queries:9.2f} ms/query{extra}")
+
+
+def run(use_llm):
+    route_examples = asyncio.run(load_router_examples())
+    check_held_out(route_examples)
+    router = asyncio.run(create_embedding_router(route_examples))
+    queries = len(LABELED_QUERIES)
+    local_correct = local_total = 0
+    local_ms = llm_ms = hybrid_ms = 0.0
+    llm_correct = hybrid_correct = 0
+    for query, expected in LABELED_QUERIES:
+        route, elapsed = timed(router.route, query)
+        local_ms += elapsed
+        if route is not None:
+            local_total += 1
+            local_correct += route == expected
+        if use_llm:
+            llm_result, llm_elapsed = timed(llm_route, query)
+            llm_ms += llm_elapsed
+            llm_correct += llm_result == expected
+            hybrid_ms += elapsed + (llm_elapsed if route is None else 0)
+            hybrid_correct += (route or llm_result) == expected
+
+    print(f"{queries} labelled queries")
+    report("embedding router", local_correct, local_total, local_ms, queries,
+           f"  ({queries - local_total} left to the LLM)")
+    if use_llm:
+        report("LLM router", llm_correct, queries, llm_ms, queries)
+        report("embedding + LLM", hybrid_correct, queries, hybrid_ms, queries)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--no-llm", action="store_true")
+    args = parser.parse_args()
+    run(not args.no_llm)
@@ -0,0 +1,140 @@
+import argparse
+import asyncio
+import contextlib
+import itertools
+import os
+import time
+
+import httpx
+from langchain_core.language_models.fake_chat_models import GenericFakeChatModel
+from langchain_core.messages import AIMessage, HumanMessage
+
+from a2a.server.agent_execution import AgentExecutor, RequestContext
+from a2a.server.apps import A2AStarletteApplication
+from a2a.server.events import EventQueue
+from a2a.server.request_handlers import DefaultRequestHandler
+from a2a.server.tasks import InMemoryTaskStore
+from a2a.types import AgentCapabilities, AgentCard, AgentSkill
+from a2a.utils import new_agent_text_message
+
+# ---------------------------------------------------------------
+# Concurrent conversations handled by one RouterHRAgent
+#
+# Runs many conversations (sessions) through one router graph with
+# ainvoke on one event loop, and reports sessions/sec for several
+# concurrency levels. Only the router is measured:
+# - the policy and timeoff agents are replaced by an in-process A2A
+#   agent that answers after --agent-latency-ms, served to the router's
+#   httpx client through an ASGI transport (no sockets, no LLM),
+# - the routing LLM is a fake model that always answers POLICY
+#   (balance and filing prompts take the fast path to TIMEOFF).
+#
+# Usage: python chapter6/router_concurrency_benchmark.py --sessions 256
+# ---------------------------------------------------------------
+
+# The router module creates its model at import time; it is not called
+os.environ.setdefault("OPENAI_API_KEY", "sk-benchmark")
+
+with open(os.devnull, "w") as devnull, contextlib.redirect_stdout(devnull):
+    from a2a_client_router_agent import ROUTER_SYSTEM_PROMPT, RouterHRAgent
+
+CONVERSATION = [
+    "What is the policy for remote work?",
+    "What is my vacation balance?",
+    "File a time off request for 5 days starting from 2025-05-05",
+    "What is my vacation balance now?",
+]
+
+
+class SimulatedAgentExecutor(AgentExecutor):
+    "Answers every prompt after a fixed delay."
+
+    def __init__(self, latency):
+        self.latency = latency
+
+    async def execute(self, context: RequestContext,
+                      event_queue: EventQueue) -> None:
+        await asyncio.sleep(self.latency)
+        await event_queue.enqueue_event(
+            new_agent_text_message(f"Answer to {context.get_user_input()}"))
+
+    async def cancel(self, context: RequestContext,
+                     event_queue: EventQueue) -> None:
+        raise Exception("Not implemented")
+
+
+def simulated_agent_client(latency):
+    agent_card = AgentCard(
+        name="Simulated HR Agent",
+        description="Answers after a fixed delay.",
+        url="http://localhost:9001/",
+        version="1.0.0",
+        defaultInputModes=["text"],
+        defaultOutputModes=["text"],
+        capabilities=AgentCapabilities(streaming=True),
+        skills=[AgentSkill(id="SimulatedSkill", name="Simulated Skill",
+                           description="Answers after a fixed delay.",
+                           tags=["HR"])],
+    )
+    app = A2AStarletteApplication(
+        agent_card=agent_card,
+        http_handler=DefaultRequestHandler(
+            agent_executor=SimulatedAgentExecutor(latency),
+            task_store=InMemoryTaskStore()),
+    ).build()
+    return httpx.AsyncClient(transport=httpx.ASGITransport(app=app),
+                             timeout=30)
+
+
+async def run_session(router, user):
+    for prompt in CONVERSATION:
+        await router.router_graph.ainvoke(
+            {"messages": [HumanMessage(prompt)], "user": user})
+
+
+async def run_sessions(router, sessions, concurrency):
+    limit = asyncio.Semaphore(concurrency)
+
+    async def limited(number):
+        async with limit:
+            await run_session(router, f"Employee{number}")
+
+    start = time.perf_counter()
+    await asyncio.gather(*(limited(number) for number in range(sessions)))
+    return time.perf_counter() - start
+
+
+async def run(sessions, concurrency_levels, agent_latency_ms):
+    model = GenericFakeChatModel(
+        messages=itertools.cycle([AIMessage(content="POLICY")]))
+    router = RouterHRAgent(model, ROUTER_SYSTEM_PROMPT, "Alice",
+                           httpx_client=simulated_agent_client(
+                               agent_latency_ms / 1000))
+    try:
+        with open(os.devnull, "w") as devnull, \
+                contextlib.redirect_stdout(devnull):
+            # Warm up: fetch the agent cards, compile lazy imports
+            await run_session(router, "Employee0")
+            results = [(concurrency,
+                        await run_sessions(router, sessions, concurrency))
+                       for concurrency in concurrency_levels]
+    finally:
+        await router.aclose()
+
+    turns = sessions * len(CONVERSATION)
+    print(f"{sessions} sessions of {len(CONVERSATION)} turns, "
+          f"agent latency {agent_latency_ms} ms")
+    for concurrency, seconds in results:
+        print(f"concurrency {concurrency:4d}: {sessions / seconds:9.1f} "
+              f"sessions/sec  {turns / seconds:9.1f} turns/sec  "
+              f"({seconds:.2f} s)")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--sessions", type=int, default=256)
+    parser.add_argument("--concurrency", type=int, nargs="+",
+                        default=[1, 8, 32, 128])
+    parser.add_argument("--agent-latency-ms", type=float, default=50.0)
+    args = parser.parse_args()
+    asyncio.run(run(args.sessions, args.concurrency, args.agent_latency_ms))